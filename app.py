@@ -5,10 +5,20 @@ Extracts recipes from TikTok/social media videos using AI
 Features:
 - Pipeline processing (connection warming during metadata extraction)
 - Async OpenAI API calls
-- yt-dlp Python library (faster than subprocess)
+- yt-dlp Python library (faster than subprocess), metadata-only and reused per thread (metadata.py)
 - Smart caching
 - Performance logging
 - Real-time streaming progress updates
+- Token streaming with incremental title/ingredient/instruction events
+- Recipes extracted once per video; per-location costs in a separate small call
+- Macros computed locally (nutrition.py) rather than generated by GPT
+- Caption clean-up before the GPT call; captions that are only noise are skipped
+- Whisper transcription of the audio when a video has no usable caption (transcription.py)
+- Recipes kept in a searchable library (library.py); known videos answered from it
+- Thumbnails fetched once and served resized from a disk cache (thumbnails.py)
+- OpenAI calls admitted by a rate-limit scheduler (ratelimit.py) with retries
+- Fast startup: heavy libraries and the OpenAI client loaded on first use;
+  preload() sets them up once before gunicorn forks its workers (gunicorn.conf.py)
 """
 
 import sys
@@ -16,10 +26,22 @@ import os
 import json
 import time
 import asyncio
+import threading
 import warnings
-from typing import Tuple, Dict, Any
-import yt_dlp
-from openai import AsyncOpenAI
+from typing import Tuple, Dict, Any, Callable, List, Optional
+import cache
+import metrics
+import metadata
+import nutrition
+import captions
+import library
+import transcription
+import thumbnails
+from connections import get_pool
+from ratelimit import estimate_tokens, get_scheduler
+from streaming_json import IncrementalJSONParser
+from singleflight import SingleFlight, wait_for_peer
+from canonical import canonicalize_url, canonical_from_info, recipe_cache_key, cost_cache_key
 
 # Suppress warnings for cleaner output
 warnings.filterwarnings("ignore")
@@ -31,36 +53,115 @@ try:
 except ImportError:
     print("Warning: python-dotenv not available. Make sure to set environment variables manually.", file=sys.stderr)
 
-# Set up the async OpenAI client
-client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# The async OpenAI client, created by get_client() on first use: importing
+# openai takes longer than the rest of this module, and runs answered from the
+# caches or the library never need it. Benchmarks assign a stub here instead
+client = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
 
-# Caching for performance
-metadata_cache = {}
-recipe_cache = {}
+def get_client():
+    """The OpenAI client on this process's keep-alive pool (see connections.py)"""
+    global client, _client_pid
+    with _client_lock:
+        # A client made before fork (gunicorn --preload) holds the parent's pool
+        if client is None or (_client_pid is not None and _client_pid != os.getpid()):
+            from openai import AsyncOpenAI
+            # Retries are left to the rate-limit scheduler (see ratelimit.py),
+            # which backs off with jitter and pauses other callers on a 429
+            client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=get_pool().http_client,
+                                 max_retries=0)
+            _client_pid = os.getpid()
+        return client
+
+def preload():
+    """Do the slow, read-only setup once in a parent process before it forks workers
+
+    Imports openai and yt-dlp (with the extractors for the supported sites) and
+    loads the nutrition table, so workers share those pages copy-on-write instead
+    of each paying for them on its first request. Starts no threads and opens no
+    connections or databases: everything per-process is still made after fork.
+    """
+    import openai  # noqa: F401
+    import yt_dlp.extractor.tiktok  # noqa: F401
+    import yt_dlp.extractor.instagram  # noqa: F401
+    import yt_dlp.extractor.youtube  # noqa: F401
+    metadata._yt_dlp()
+    nutrition.get_table()
+
+# Model and prompt revision; both are part of the recipe cache key, so bump
+# PROMPT_VERSION whenever the prompt below changes shape
+GPT_MODEL = "gpt-3.5-turbo"
+PROMPT_VERSION = "3"
+# Library entries from another model or prompt are searchable but not served
+LIBRARY_VERSION = f"{GPT_MODEL}/{PROMPT_VERSION}"
+
+# Per-location ingredient pricing is a separate, much smaller call
+COST_MODEL = os.environ.get("COST_MODEL", GPT_MODEL)
+COST_PROMPT_VERSION = "1"
+
+# In-flight request coalescing: whole requests, yt-dlp runs and GPT calls.
+# COALESCE_ACROSS_WORKERS=1 also takes a lock in the shared cache tier so
+# only one worker generates a given recipe.
+video_flights = SingleFlight("extraction")
+metadata_flights = SingleFlight("metadata")
+recipe_flights = SingleFlight("recipe")
+cost_flights = SingleFlight("costs")
+transcript_flights = SingleFlight("transcript")
+thumbnail_flights = SingleFlight("thumbnail")
+FLIGHTS = (video_flights, metadata_flights, recipe_flights, cost_flights, transcript_flights, thumbnail_flights)
+COALESCE_ACROSS_WORKERS = os.environ.get("COALESCE_ACROSS_WORKERS", "0") == "1"
+CROSS_WORKER_LOCK_TTL = 60
+
+def _runtime_gauges():
+    """Point-in-time gauges for /metrics: connection pool and in-flight work"""
+    pool = get_pool().stats()
+    yield ("openai_pool_open_connections", "Open pooled OpenAI connections", {}, pool["open_connections"])
+    yield ("openai_pool_reuse_ratio", "Share of OpenAI requests on a reused connection", {}, pool["reuse_ratio"])
+    if pool["avg_handshake_ms"] is not None:
+        yield ("openai_pool_handshake_seconds", "Average OpenAI connection handshake time", {},
+               pool["avg_handshake_ms"] / 1000)
+    for flights in FLIGHTS:
+        yield ("recipe_inflight", "Coalesced work currently in flight", {"kind": flights.name}, len(flights.flights))
+        yield ("recipe_coalesced", "Callers that joined in-flight work", {"kind": flights.name}, flights.coalesced)
+
+metrics.REGISTRY.register_collector(_runtime_gauges)
+
+# Caching for performance (memory LRU in front of a shared tier, see cache.py)
+metadata_cache = cache.namespace("metadata", "METADATA_CACHE_TTL", 6 * 60 * 60)
+recipe_cache = cache.namespace("recipe", "RECIPE_CACHE_TTL", 7 * 24 * 60 * 60)
+cost_cache = cache.namespace("costs", "COST_CACHE_TTL", 7 * 24 * 60 * 60)
+transcript_cache = cache.namespace("transcript", "TRANSCRIPT_CACHE_TTL", 30 * 24 * 60 * 60)
 
 class RecipeProcessor:
     """Main recipe processing class with pipeline optimization and streaming"""
     
-    def __init__(self, streaming_mode=False):
-        self.ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True,
-            'extract_flat': False,
-        }
+    def __init__(self, streaming_mode=False, event_sink: Optional[Callable[[Dict[str, Any]], None]] = None):
         self.connection_warmed = False
         self.streaming_mode = streaming_mode
+        # In-process callers (server.py) receive events directly instead of SSE on stdout
+        self.event_sink = event_sink
+    
+    def emit_event(self, event: Dict[str, Any]):
+        """Deliver a streaming event to the sink, or print it as SSE"""
+        if self.event_sink is not None:
+            self.event_sink(event)
+        else:
+            print_sse(event)
+    
+    @staticmethod
+    def progress_event(message: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+        return {
+            "type": "progress",
+            "message": message,
+            "timestamp": time.time(),
+            "data": data or {}
+        }
     
     def emit_progress(self, message: str, data: Dict[str, Any] = None):
         """Emit progress update (streaming or stderr)"""
         if self.streaming_mode:
-            progress = {
-                "type": "progress",
-                "message": message,
-                "timestamp": time.time(),
-                "data": data or {}
-            }
-            print(f"data: {json.dumps(progress)}\n", flush=True)
+            self.emit_event(self.progress_event(message, data))
         else:
             print(message, file=sys.stderr)
     
@@ -72,34 +173,51 @@ class RecipeProcessor:
                 "recipe": recipe,
                 "timestamp": time.time()
             }
-            print(f"data: {json.dumps(result)}\n", flush=True)
+            self.emit_event(result)
         else:
             print(json.dumps(recipe))
     
+    def partial_event(self, path: Tuple, value: Any, title_hint: str = "") -> Optional[Dict[str, Any]]:
+        """Build the event for a recipe piece the streamed JSON just completed"""
+        if path == ('title',):
+            if (not value or value == "Recipe Name") and title_hint:
+                value = title_hint
+            return {"type": "title", "title": value, "timestamp": time.time()}
+        elif len(path) == 2 and path[0] == 'ingredients' and isinstance(value, dict):
+            return {"type": "ingredient", "index": path[1], "ingredient": value, "timestamp": time.time()}
+        elif len(path) == 2 and path[0] == 'instructions' and isinstance(value, str):
+            return {"type": "instruction", "index": path[1], "instruction": value, "timestamp": time.time()}
+        elif path == ('ingredients',):
+            return self.progress_event("🍽️ Calculating nutrition & costs...")
+        return None
+    
     async def warm_connection(self):
-        """Warm up OpenAI connection to reduce latency"""
+        """Make sure a pooled OpenAI connection is open before the GPT call"""
         if self.connection_warmed:
             return
         
+        pool = get_pool()
+        if not pool.needs_warm():
+            # The worker-wide pool already holds a live connection
+            self.connection_warmed = True
+            if self.streaming_mode:
+                self.emit_progress("✅ AI connection ready")
+            return
+        
         if self.streaming_mode:
             self.emit_progress("🔥 Warming AI connection...")
         
-        try:
-            # Make a minimal API call to establish connection
-            await client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
+        # Non-generating request: opens TCP/TLS without paying for tokens
+        with metrics.current_trace().span("connection_warmup"):
+            warmed = await pool.warm(get_client())
+        if warmed:
             self.connection_warmed = True
             if self.streaming_mode:
                 self.emit_progress("✅ AI connection ready")
             else:
                 print(f"🔥 Connection warmed", file=sys.stderr)
-        except Exception as e:
-            if self.streaming_mode:
-                self.emit_progress(f"⚠️ Connection warming failed: {str(e)}")
-            # Ignore errors, this is just for warming up
+        elif self.streaming_mode:
+            self.emit_progress("⚠️ Connection warming failed")
     
     async def extract_metadata(self, url: str) -> Tuple[str, str, Dict[str, Any]]:
         """Extract video metadata using yt-dlp with connection warming"""
@@ -107,39 +225,65 @@ class RecipeProcessor:
         if self.streaming_mode:
             self.emit_progress("🔄 Extracting video metadata...")
         
-        # Check cache first
-        if url in metadata_cache:
+        trace = metrics.current_trace()
+        
+        # Check cache first (keyed by canonical video, not by share URL variant)
+        with trace.span("url_normalization"):
+            canonical = canonicalize_url(url)
+        trace.attributes["canonical_key"] = canonical.key
+        with trace.span("metadata_cache_lookup"):
+            cached = await metadata_cache.get_async(canonical.key)
+        trace.cache_lookup("metadata", cached is not None)
+        if cached is not None:
             if self.streaming_mode:
                 self.emit_progress("💾 Using cached metadata")
             else:
                 print(f"💾 Cache hit for metadata", file=sys.stderr)
-            return metadata_cache[url]
+            return tuple(cached)
         
         def extract_sync():
             """Synchronous metadata extraction"""
             try:
-                with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                    info_dict = ydl.extract_info(url, download=False)
-                    
-                    description = info_dict.get('description', '') or ''
-                    thumbnail = info_dict.get('thumbnail', '') or ''
-                    title = info_dict.get('title', '') or ''
-                    
-                    return description, thumbnail, {
-                        'title': title,
-                        'uploader': info_dict.get('uploader', ''),
-                        'duration': info_dict.get('duration', 0),
-                    }
+                # Metadata-only profile on this thread's long-lived YoutubeDL
+                info_dict = metadata.get_extractor().extract(url)
+                
+                description = info_dict.get('description', '') or ''
+                thumbnail = info_dict.get('thumbnail', '') or ''
+                title = info_dict.get('title', '') or ''
+                
+                resolved = canonical_from_info(info_dict) or canonical
+                return description, thumbnail, {
+                    'title': title,
+                    'uploader': info_dict.get('uploader', ''),
+                    'duration': info_dict.get('duration', 0),
+                    'extractor': resolved.extractor,
+                    'video_id': resolved.video_id,
+                    'canonical_key': resolved.key,
+                }
             except Exception as e:
                 print(f"❌ Metadata extraction failed: {e}", file=sys.stderr)
                 return "", "", {}
         
+        async def fetch(publish):
+            """Run yt-dlp once per video, however many callers are waiting"""
+            loop = asyncio.get_running_loop()
+            with trace.span("ytdlp_extraction"):
+                result = await loop.run_in_executor(None, extract_sync)
+            
+            # Cache the result (failed extractions are retried next time)
+            if result[0]:
+                await metadata_cache.set_async(canonical.key, result)
+                # Short links only learn their video ID from yt-dlp; alias it too
+                resolved_key = result[2].get('canonical_key')
+                if resolved_key and resolved_key != canonical.key:
+                    await metadata_cache.set_async(resolved_key, result)
+            return result
+        
         # Start connection warming in parallel with metadata extraction
         warmup_task = asyncio.create_task(self.warm_connection())
         
-        # Run metadata extraction in thread pool
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, extract_sync)
+        # Run metadata extraction in thread pool (coalesced per canonical video)
+        result = await metadata_flights.run(canonical.key, fetch)
         
         # Ensure connection is warmed
         await warmup_task
@@ -154,79 +298,433 @@ class RecipeProcessor:
         elif self.streaming_mode:
             self.emit_progress("❌ No video description found")
         
-        # Cache the result
-        metadata_cache[url] = result
         return result
     
+    async def transcribe_audio(self, url: str, extra_info: Dict[str, Any]) -> str:
+        """Transcript of the video's narration, cached by video ID and made once per video"""
+        canonical_key = extra_info.get('canonical_key') or canonicalize_url(url).key
+        key = f"{canonical_key}|{transcription.get_transcriber().model}"
+        trace = metrics.current_trace()
+        
+        cached = await transcript_cache.get_async(key)
+        trace.cache_lookup("transcript", cached is not None)
+        if cached is not None:
+            self.emit_progress("💾 Using cached transcript")
+            return cached
+        
+        self.emit_progress("🎙️ No recipe text in the caption, transcribing the audio...")
+        
+        async def transcribe(publish):
+            with trace.span("transcription"):
+                text = await transcription.get_transcriber().transcribe(url, extra_info.get('duration') or 0)
+            if text:
+                await transcript_cache.set_async(key, text)
+            return text
+        
+        text = await transcript_flights.run(key, transcribe)
+        print(f"🎙️ Transcript: {len(text)} characters", file=sys.stderr)
+        return text
+    
+    async def store_thumbnail(self, thumbnail_url: str, extra_info: Dict[str, Any]) -> Optional[str]:
+        """Copy the thumbnail into the local store while its signed URL still works"""
+        video = thumbnails.thumb_id(extra_info)
+        if not video:
+            return None
+        
+        def ingest() -> bool:
+            # The store is opened here too, so a bad THUMB_CACHE_DIR fails softly
+            try:
+                return thumbnails.get_store().ingest(video, thumbnail_url)
+            except Exception as e:
+                print(f"⚠️ Thumbnail store unavailable: {e}", file=sys.stderr)
+                return False
+        
+        async def fetch(publish):
+            loop = asyncio.get_running_loop()
+            with metrics.current_trace().span("thumbnail"):
+                return await loop.run_in_executor(None, ingest)
+        
+        stored = await thumbnail_flights.run(video, fetch)
+        return video if stored else None
+    
+    async def thumbnail_fields(self, thumbnail_task: Optional["asyncio.Future[Optional[str]]"],
+                               thumbnail_url: str) -> Dict[str, str]:
+        """Image fields for a new recipe: the CDN URL, plus the local proxy if it has a copy"""
+        video = None
+        if thumbnail_task is not None:
+            try:
+                # Cancelling this wait leaves the shared download running (see singleflight.py)
+                video = await asyncio.wait_for(thumbnail_task, thumbnails.WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                print(f"⏳ Thumbnail still downloading; answering with the CDN URL", file=sys.stderr)
+        return await self.image_fields(video, thumbnail_url)
+    
+    async def image_fields(self, video: Optional[str], thumbnail_url: str) -> Dict[str, str]:
+        """image_url stays the CDN URL, which works without this server (CLI,
+        batch output); image_proxy_url and image_srcset point at the stored
+        sizes when the local store has a copy
+        """
+        fields = {"image_url": thumbnail_url} if thumbnail_url else {}
+        if video:
+            try:
+                fields.update(await cache.run_io(lambda: thumbnails.get_store().urls(video)))
+            except Exception as e:
+                print(f"⚠️ Thumbnail store unavailable: {e}", file=sys.stderr)
+        return fields
+    
+    async def library_thumbnail(self, url: str, stored: "library.StoredRecipe") -> Dict[str, str]:
+        """Image fields for a library hit, made again each time
+        
+        A copy evicted from the local store is fetched again, from a fresh
+        thumbnail URL since the stored one is signed and may have expired;
+        the wait is bounded as for a new recipe.
+        """
+        video, thumbnail_url = stored.thumb, stored.thumbnail_url
+        if not video:
+            return await self.image_fields(None, thumbnail_url)
+        try:
+            present = await cache.run_io(lambda: thumbnails.get_store().has(video))
+        except Exception as e:
+            print(f"⚠️ Thumbnail store unavailable: {e}", file=sys.stderr)
+            present = False
+        if present:
+            return await self.image_fields(video, thumbnail_url)
+        
+        async def refresh(publish):
+            # A processor of its own: this can outlive the request that started it
+            _, fresh_url, extra_info = await RecipeProcessor().extract_metadata(url)
+            if not fresh_url:
+                return None, thumbnail_url
+            return await self.store_thumbnail(fresh_url, extra_info), fresh_url
+        
+        try:
+            # Cancelling this wait leaves the refresh running (see singleflight.py)
+            video, thumbnail_url = await asyncio.wait_for(thumbnail_flights.run(f"{video}|refresh", refresh),
+                                                          thumbnails.WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"⏳ Thumbnail still downloading; answering with the stored CDN URL", file=sys.stderr)
+            video = None
+        return await self.image_fields(video, thumbnail_url)
+    
+    async def library_lookup(self, url: str) -> Optional["library.StoredRecipe"]:
+        """A stored recipe for this video from the current model and prompt (library.py)"""
+        canonical = canonicalize_url(url)
+        if not canonical.video_id or not library.lookup_enabled():
+            return None
+        trace = metrics.current_trace()
+        trace.attributes["canonical_key"] = canonical.key
+        try:
+            with trace.span("library_lookup"):
+                stored = await cache.run_io(lambda: library.get_library().get(canonical.key, LIBRARY_VERSION))
+        except Exception as e:
+            print(f"⚠️ Recipe library unavailable: {e}", file=sys.stderr)
+            return None
+        trace.cache_lookup("library", stored is not None)
+        if stored is not None:
+            if self.streaming_mode:
+                self.emit_progress("📚 Found in the recipe library")
+            else:
+                print(f"📚 Library hit for {canonical.key}", file=sys.stderr)
+        return stored
+    
+    async def save_to_library(self, url: str, extra_info: Dict[str, Any], recipe: Dict[str, Any],
+                              thumbnail_url: str):
+        """File a new recipe under its resolved video key and the key it was requested by"""
+        if not extra_info.get('video_id'):
+            return
+        keys = [extra_info['canonical_key'], canonicalize_url(url).key]
+        info = dict(extra_info, thumbnail_url=thumbnail_url)
+        try:
+            await cache.run_io(lambda: library.get_library().save(keys, url, info, recipe, LIBRARY_VERSION))
+        except Exception as e:
+            # The request already has its recipe; it just won't be searchable
+            print(f"⚠️ Could not save recipe to library: {e}", file=sys.stderr)
+    
+    def recipe_key(self, description: str, extra_info: Dict[str, Any]) -> str:
+        """Content-addressed recipe cache key for this GPT input (location-independent)"""
+        return recipe_cache_key(description, extra_info.get('title', ''), GPT_MODEL, PROMPT_VERSION)
+    
     async def process_with_gpt(self, description: str, location: str, extra_info: Dict[str, Any]) -> Dict[str, Any]:
-        """Process recipe using GPT with optimized prompt"""
+        """Extract the recipe once per video, then add costs for this location"""
+        recipe_data = await self.extract_recipe(description, extra_info)
+        costs = await self.estimate_costs(recipe_data, location)
+        return apply_costs(recipe_data, costs)
+    
+    async def extract_recipe(self, description: str, extra_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Stage one: the location-independent recipe (ingredients, steps, macros)"""
+        
+        # Use title from metadata for better context
+        title_hint = extra_info.get('title', '')
         
         # Check recipe cache
-        cache_key = f"{description[:50]}_{location}"
-        if cache_key in recipe_cache:
+        cache_key = self.recipe_key(description, extra_info)
+        trace = metrics.current_trace()
+        with trace.span("recipe_cache_lookup"):
+            cached = await recipe_cache.get_async(cache_key)
+        trace.cache_lookup("recipe", cached is not None)
+        if cached is not None:
             if self.streaming_mode:
                 self.emit_progress("💾 Using cached recipe")
             else:
                 print(f"💾 Cache hit for recipe", file=sys.stderr)
-            return recipe_cache[cache_key]
+            return cached
         
-        if self.streaming_mode:
-            self.emit_progress("🤖 Processing with AI...")
-            self.emit_progress("📝 Analyzing ingredients...")
+        # Identical GPT inputs in flight are generated once; streaming callers
+        # attach to the shared progress and partial-recipe events
+        sink = self.emit_event if self.streaming_mode else None
+        recipe_data = await recipe_flights.run(
+            cache_key,
+            lambda publish: self.generate_recipe(description, title_hint, cache_key, publish),
+            sink=sink,
+        )
+        return recipe_data
+    
+    async def estimate_costs(self, recipe_data: Dict[str, Any], location: str) -> Optional[Dict[str, Any]]:
+        """Stage two: per-location ingredient costs, cached separately from the recipe"""
+        ingredients = [(i.get('name', ''), i.get('amount', '')) for i in recipe_data.get('ingredients', [])
+                       if isinstance(i, dict)]
+        if not ingredients:
+            return None
+        
+        cache_key = cost_cache_key(ingredients, location, COST_MODEL, COST_PROMPT_VERSION)
+        trace = metrics.current_trace()
+        with trace.span("cost_cache_lookup"):
+            cached = await cost_cache.get_async(cache_key)
+        trace.cache_lookup("costs", cached is not None)
+        if cached is not None:
+            if self.streaming_mode:
+                self.emit_progress("💾 Using cached costs")
+            else:
+                print(f"💾 Cache hit for costs", file=sys.stderr)
+            return cached
+        
+        sink = self.emit_event if self.streaming_mode else None
+        try:
+            return await cost_flights.run(
+                cache_key,
+                lambda publish: self.generate_costs(ingredients, location, cache_key, publish),
+                sink=sink,
+            )
+        except Exception as e:
+            # The recipe is still useful without prices
+            print(f"⚠️ Cost estimation failed: {e}", file=sys.stderr)
+            if self.streaming_mode:
+                self.emit_progress("⚠️ Cost estimation unavailable")
+            return None
+    
+    async def generate_costs(self, ingredients: List[Tuple[str, str]], location: str, cache_key: str,
+                             publish: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Short GPT call pricing just the ingredient list for one location"""
+        publish(self.progress_event(f"💰 Estimating costs for {location}..."))
+        
+        lines = "\n".join(f"{n}. {amount} {name}".replace("  ", " ") for n, (name, amount) in enumerate(ingredients, 1))
+        prompt = f"""Location: {location}
+Estimate the local grocery cost of the amount used of each ingredient:
+{lines}
+
+Return JSON with one cost per ingredient, in order:
+{{"costs":["2.00 (local currency)"],"total_cost_estimate":"5-7 (local currency)"}}"""
+        
+        messages = [{
+            "role": "system",
+            "content": "Estimate grocery costs. Return only valid JSON."
+        }, {
+            "role": "user",
+            "content": prompt
+        }]
+        max_tokens = 60 + 12 * len(ingredients)
+        
+        trace = metrics.current_trace()
+        with trace.span("gpt_costs"):
+            response = await get_scheduler().call(
+                lambda: get_client().chat.completions.create(
+                    model=COST_MODEL,
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=max_tokens,
+                ),
+                tokens=estimate_tokens(messages, max_tokens),
+            )
+        if getattr(response, 'usage', None) is not None:
+            trace.usage(COST_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+        
+        data = json.loads(response.choices[0].message.content.strip())
+        costs = [str(cost) for cost in data.get('costs', [])][:len(ingredients)]
+        costs += [""] * (len(ingredients) - len(costs))
+        result = {"costs": costs, "total_cost_estimate": str(data.get('total_cost_estimate', ''))}
+        
+        await cost_cache.set_async(cache_key, result)
+        return result
+    
+    async def generate_recipe(self, description: str, title_hint: str,
+                              cache_key: str, publish: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """Run the GPT call, publishing progress and partial-recipe events"""
+        
+        # Optionally let one worker on the host (or cluster) do the work
+        lock_key = f"recipe-lock:{cache_key}"
+        locked = COALESCE_ACROSS_WORKERS and await cache.get_store().acquire_lock_async(lock_key, CROSS_WORKER_LOCK_TTL)
+        if COALESCE_ACROSS_WORKERS and not locked:
+            publish(self.progress_event("⏳ Waiting for identical extraction in another worker..."))
+            recipe_data = await wait_for_peer(lambda: recipe_cache.get_async(cache_key), CROSS_WORKER_LOCK_TTL)
+            if recipe_data is not None:
+                return recipe_data
+        
+        try:
+            return await self._generate_recipe(description, title_hint, cache_key, publish)
+        finally:
+            if locked:
+                await cache.get_store().release_lock_async(lock_key)
+    
+    async def _generate_recipe(self, description: str, title_hint: str,
+                               cache_key: str, publish: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        publish(self.progress_event("🤖 Processing with AI..."))
+        publish(self.progress_event("📝 Analyzing ingredients..."))
         
-        # Use title from metadata for better context
-        title_hint = extra_info.get('title', '')
         context = f"Title: {title_hint}\n" if title_hint else ""
         
-        # Optimized prompt for speed and accuracy
+        # Optimized prompt for speed and accuracy; no location, so one
+        # extraction serves every city (costs are added per location later),
+        # and no macros, which nutrition.py computes from names and amounts
         prompt = f"""{context}Extract recipe from: "{description}"
-Location: {location}
 
-Return JSON with this exact structure:
-{{"title":"Recipe Name","servings":4,"prep_time_minutes":10,"cook_time_minutes":15,"equipment":["bowl","spatula"],"ingredients":[{{"name":"ingredient","amount":"1 cup","cost":"2.00 (local currency)","protein_g":5,"carbs_g":10,"fat_g":2,"calories":80}}],"instructions":["step1","step2"],"notes":"Measurements and costs are approximate","total_cost_estimate":"5-7 (local currency)","total_macros":{{"protein_g":20,"carbs_g":40,"fat_g":10,"calories":320}},"dietary_substitutions":{{"gluten_free":"substitute","vegan":"substitute"}}}}"""
+Return JSON with this exact structure (amounts as quantity and unit, e.g. "200 g", "2 tbsp", "3 cloves"):
+{{"title":"Recipe Name","servings":4,"prep_time_minutes":10,"cook_time_minutes":15,"equipment":["bowl","spatula"],"ingredients":[{{"name":"ingredient","amount":"1 cup"}}],"instructions":["step1","step2"],"notes":"Measurements and costs are approximate","dietary_substitutions":{{"gluten_free":"substitute","vegan":"substitute"}}}}"""
+        
+        messages = [{
+            "role": "system", 
+            "content": "Extract recipe data. Return only valid JSON."
+        }, {
+            "role": "user", 
+            "content": prompt
+        }]
+        
+        trace = metrics.current_trace()
+        gpt_start = time.monotonic()
+        first_token = None
+        usage = None
         
         try:
-            # Connection should already be warm from pipeline
-            response = await client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{
-                    "role": "system", 
-                    "content": "Extract recipe data. Return only valid JSON."
-                }, {
-                    "role": "user", 
-                    "content": prompt
-                }],
-                temperature=0,
-                max_tokens=1200
+            # Connection should already be warm from pipeline; stream tokens so
+            # recipe pieces can be shown before the whole completion arrives.
+            # Only opening the stream is retried; a stream that breaks midway fails.
+            stream = await get_scheduler().call(
+                lambda: get_client().chat.completions.create(
+                    model=GPT_MODEL,
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=800,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                tokens=estimate_tokens(messages, 800),
             )
             
-            if self.streaming_mode:
-                self.emit_progress("🍽️ Calculating nutrition & costs...")
+            parser = IncrementalJSONParser()
+            chunks = []
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token is None:
+                    first_token = time.monotonic()
+                    trace.record("gpt_first_token", first_token - gpt_start)
+                chunks.append(delta)
+                for path, value in parser.feed(delta):
+                    event = self.partial_event(path, value, title_hint)
+                    if event is not None:
+                        publish(event)
+            
+            trace.record("gpt_total", time.monotonic() - gpt_start)
+            if usage is not None:
+                trace.usage(GPT_MODEL, usage.prompt_tokens, usage.completion_tokens)
             
-            content = response.choices[0].message.content.strip()
-            recipe_data = json.loads(content)
+            content = "".join(chunks).strip()
+            with trace.span("json_parse"):
+                recipe_data = json.loads(content)
+            with trace.span("nutrition"):
+                recipe_data = nutrition.annotate(recipe_data)
             
             # Use metadata title if GPT didn't provide a good one
             if not recipe_data.get('title') or recipe_data['title'] == "Recipe Name":
                 if title_hint:
                     recipe_data['title'] = title_hint
             
-            if self.streaming_mode:
-                self.emit_progress("✅ Recipe extraction complete!")
+            publish(self.progress_event("✅ Recipe extraction complete!"))
             
             # Cache the result
-            recipe_cache[cache_key] = recipe_data
+            await recipe_cache.set_async(cache_key, recipe_data)
             return recipe_data
             
         except Exception as e:
             print(f"❌ GPT processing failed: {e}", file=sys.stderr)
             raise
 
-async def process_video(url: str, location: str, streaming_mode: bool = False) -> Dict[str, Any]:
+def apply_costs(recipe_data: Dict[str, Any], costs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-location costs into a copy of the location-independent recipe"""
+    recipe = dict(recipe_data)
+    prices = (costs or {}).get('costs', [])
+    ingredients = []
+    for index, ingredient in enumerate(recipe.get('ingredients', [])):
+        if isinstance(ingredient, dict):
+            # Keep the original field order: name, amount, cost, macros
+            priced = {key: ingredient[key] for key in ('name', 'amount') if key in ingredient}
+            priced['cost'] = prices[index] if index < len(prices) else ""
+            priced.update((key, value) for key, value in ingredient.items() if key not in priced)
+            ingredient = priced
+        ingredients.append(ingredient)
+    recipe['ingredients'] = ingredients
+    recipe['total_cost_estimate'] = (costs or {}).get('total_cost_estimate', "")
+    return recipe
+
+def print_sse(event: Dict[str, Any]):
+    """Write one event to stdout as a Server-Sent Event"""
+    print(f"data: {json.dumps(event)}\n", flush=True)
+
+def _logging_sink(publish: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+    """Publish events and mirror progress messages to stderr for non-streaming callers"""
+    def sink(event: Dict[str, Any]):
+        publish(event)
+        if event.get("type") == "progress":
+            print(event["message"], file=sys.stderr)
+    return sink
+
+async def process_video(url: str, location: str, streaming_mode: bool = False,
+                        event_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+                        processor: Optional[RecipeProcessor] = None,
+                        request_id: Optional[str] = None) -> Dict[str, Any]:
     """Main processing function with pipeline optimization and optional streaming"""
     
+    trace = metrics.RequestTrace(request_id)
+    with metrics.use_trace(trace):
+        if processor is not None:
+            recipe = await _process_video(url, location, processor)
+            coalesced = False
+        else:
+            # Identical concurrent requests share one extraction and its event stream
+            key = f"{canonicalize_url(url).key}|{' '.join(location.split()).casefold()}"
+            
+            async def work(publish):
+                sink = publish if streaming_mode else _logging_sink(publish)
+                return await _process_video(url, location, RecipeProcessor(streaming_mode=True, event_sink=sink))
+            
+            sink = (event_sink or print_sse) if streaming_mode else None
+            coalesced = key in video_flights.flights
+            recipe = dict(await video_flights.run(key, work, sink=sink))
+    
+    if "error" in recipe:
+        outcome = "rejected" if trace.attributes.get("rejected") else "error"
+    else:
+        outcome = "coalesced" if coalesced else "ok"
+    trace.finish(outcome, url=url, error=recipe.get("error"))
+    return recipe
+
+async def _process_video(url: str, location: str, processor: RecipeProcessor) -> Dict[str, Any]:
     start_time = time.time()
-    processor = RecipeProcessor(streaming_mode=streaming_mode)
+    streaming_mode = processor.streaming_mode
     
     if streaming_mode:
         processor.emit_progress(f"🚀 Starting recipe extraction...")
@@ -234,26 +732,16 @@ async def process_video(url: str, location: str, streaming_mode: bool = False) -
         print(f"🚀 Starting recipe extraction for: {url}", file=sys.stderr)
     
     try:
-        # Step 1: Extract metadata (with connection warming in parallel)
-        metadata_start = time.time()
-        description, thumbnail_url, extra_info = await processor.extract_metadata(url)
-        metadata_time = time.time() - metadata_start
-        
-        print(f"📊 Metadata + warmup took: {metadata_time:.2f}s", file=sys.stderr)
-        print(f"📊 Description length: {len(description)} characters", file=sys.stderr)
-        
-        if not description:
-            raise ValueError("No description found in video metadata")
-        
-        # Step 2: Process with GPT (connection already warm)
-        gpt_start = time.time()
-        recipe = await processor.process_with_gpt(description, location, extra_info)
-        gpt_time = time.time() - gpt_start
-        print(f"🤖 GPT processing took: {gpt_time:.2f}s", file=sys.stderr)
-        
-        # Add thumbnail
-        if thumbnail_url:
-            recipe["image_url"] = thumbnail_url
+        # Step 0: a video extracted before is answered from the library, with
+        # no yt-dlp or recipe call; only its costs are looked up for this location
+        stored = await processor.library_lookup(url)
+        if stored is not None:
+            costs, image = await asyncio.gather(processor.estimate_costs(stored.recipe, location),
+                                                processor.library_thumbnail(url, stored))
+            recipe = apply_costs(stored.recipe, costs)
+            recipe.update(image)
+        else:
+            recipe = await _extract_new(url, location, processor)
         
         total_time = time.time() - start_time
         
@@ -267,6 +755,8 @@ async def process_video(url: str, location: str, streaming_mode: bool = False) -
         
     except Exception as e:
         print(f"❌ Processing failed: {e}", file=sys.stderr)
+        if streaming_mode:
+            processor.emit_event({"type": "error", "message": f"Processing failed: {str(e)}"})
         return {
             "title": "",
             "ingredients": [],
@@ -275,8 +765,65 @@ async def process_video(url: str, location: str, streaming_mode: bool = False) -
             "error": str(e)
         }
 
+async def _extract_new(url: str, location: str, processor: RecipeProcessor) -> Dict[str, Any]:
+    """Steps 1-2 for a video the library doesn't have yet: metadata, caption, GPT, thumbnail"""
+    # Step 1: Extract metadata (with connection warming in parallel)
+    metadata_start = time.time()
+    description, thumbnail_url, extra_info = await processor.extract_metadata(url)
+    metadata_time = time.time() - metadata_start
+    
+    print(f"📊 Metadata + warmup took: {metadata_time:.2f}s", file=sys.stderr)
+    print(f"📊 Description length: {len(description)} characters", file=sys.stderr)
+    
+    # Step 1b: strip hashtags/mentions/CTAs; only a caption with nothing left skips GPT
+    trace = metrics.current_trace()
+    with trace.span("caption_preprocess"):
+        caption = captions.prepare(description, extra_info.get('title', ''))
+    
+    if caption.rejected and extra_info and transcription.available():
+        # Narrated recipes often have no caption, or only hashtags; use what's said instead
+        transcript = await processor.transcribe_audio(url, extra_info)
+        if transcript:
+            with trace.span("caption_preprocess"):
+                caption = captions.prepare(transcript, extra_info.get('title', ''))
+    
+    if not caption.raw_chars:
+        raise ValueError("No description found in video metadata")
+    trace.caption(caption.tokens_saved, caption.rejected)
+    print(f"✂️ Caption cleaned: {caption.raw_chars} → {caption.clean_chars} characters "
+          f"(~{caption.tokens_saved} prompt tokens saved)", file=sys.stderr)
+    if caption.rejected:
+        raise ValueError(f"This video doesn't look like a recipe ({caption.rejected})")
+    description = caption.text
+    
+    # The thumbnail download overlaps the GPT call
+    thumbnail_task = asyncio.ensure_future(processor.store_thumbnail(thumbnail_url, extra_info)) \
+        if thumbnail_url else None
+    
+    # Step 2: Process with GPT (connection already warm)
+    gpt_start = time.time()
+    recipe = await processor.process_with_gpt(description, location, extra_info)
+    gpt_time = time.time() - gpt_start
+    print(f"🤖 GPT processing took: {gpt_time:.2f}s", file=sys.stderr)
+    
+    # Add thumbnail: the local proxy when it has a copy, else the CDN URL
+    recipe.update(await processor.thumbnail_fields(thumbnail_task, thumbnail_url))
+    
+    await processor.save_to_library(url, extra_info, recipe, thumbnail_url)
+    return recipe
+
 async def main():
     """Main async function"""
+    # Batch mode: python app.py --batch file.jsonl (NDJSON results on stdout)
+    if "--batch" in sys.argv:
+        from batch import run_batch_file
+        index = sys.argv.index("--batch")
+        if index + 1 >= len(sys.argv):
+            print(json.dumps({"type": "error", "error": "Usage: python app.py --batch <file.jsonl>"}))
+            sys.exit(1)
+        summary = await run_batch_file(sys.argv[index + 1])
+        sys.exit(0 if summary["failed"] == 0 else 1)
+    
     # Check for streaming mode flag
     streaming_mode = "--stream" in sys.argv
     if streaming_mode:
@@ -341,4 +888,6 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Helper modules import "app"; make that resolve to this script instead of a second copy
+    sys.modules.setdefault("app", sys.modules[__name__])
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""
+AI TikTok Recipe Parser - ASGI Server
+Async serving mode: handlers await process_video directly on the server's event loop
+
+Unlike the Flask app in server.py, an open /extract-stream connection here is
+just a suspended coroutine, so a single worker can hold thousands of SSE
+streams instead of one per sync worker.
+
+Run with:
+    uvicorn asgi:app --port 3000
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import contextlib
+import concurrent.futures
+from typing import Any, Dict
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as recipe_app
+import batch
+import jobs
+import health
+import library
+import transcription
+import thumbnails
+import metrics
+from cache import run_io
+from connections import get_pool
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web', 'dist')
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Cache-Control'
+}
+
+# Closes an event queue once the producing task is done
+_STREAM_END = object()
+
+
+async def _read_request(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, None, JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+    url = data.get('url')
+    location = data.get('zipcode')
+    if not url:
+        return None, None, JSONResponse({"error": "No URL provided"}, status_code=400)
+    if not location:
+        return None, None, JSONResponse({"error": "No location provided"}, status_code=400)
+    return url, location, None
+
+
+async def extract(request: Request):
+    url, location, error = await _read_request(request)
+    if error is not None:
+        return error
+    request_id = request.headers.get('X-Request-ID') or metrics.new_request_id()
+    try:
+        recipe = await recipe_app.process_video(url, location, request_id=request_id)
+        return JSONResponse(recipe, headers={'X-Request-ID': request_id})
+    except Exception as ex:
+        return JSONResponse({"error": f"Unexpected error: {str(ex)}"}, status_code=500)
+
+
+async def extract_stream(request: Request):
+    """Streaming endpoint with real-time progress updates"""
+    url, location, error = await _read_request(request)
+    if error is not None:
+        return error
+
+    request_id = request.headers.get('X-Request-ID') or metrics.new_request_id()
+    events: "asyncio.Queue[Any]" = asyncio.Queue()
+    task = asyncio.ensure_future(recipe_app.process_video(
+        url, location, streaming_mode=True, event_sink=events.put_nowait, request_id=request_id))
+    task.add_done_callback(lambda _: events.put_nowait(_STREAM_END))
+
+    async def generate_stream():
+        while True:
+            event = await events.get()
+            if event is _STREAM_END:
+                break
+            yield f"data: {json.dumps(event)}\n\n"
+        if not task.cancelled() and task.exception() is not None:
+            error_data = {
+                "type": "error",
+                "message": f"Stream processing failed: {str(task.exception())}"
+            }
+            yield f"data: {json.dumps(error_data)}\n\n"
+
+    return StreamingResponse(generate_stream(), media_type='text/event-stream',
+                             headers={**SSE_HEADERS, 'X-Request-ID': request_id})
+
+
+async def extract_batch(request: Request):
+    """Batch endpoint streaming one NDJSON record per URL as each finishes"""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+    items = data.get('items')
+    if items is None and data.get('urls') is not None:
+        items = [{"url": url} for url in data['urls']]
+    default_location = data.get('zipcode') or data.get('location')
+
+    if not isinstance(items, list) or not items:
+        return JSONResponse({"error": "No items provided"}, status_code=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return JSONResponse({"error": f"Too many items (max {BATCH_MAX_ITEMS})"}, status_code=400)
+    if not all(isinstance(item, dict) for item in items):
+        return JSONResponse({"error": "Each item must be an object"}, status_code=400)
+
+    records: "asyncio.Queue[Any]" = asyncio.Queue()
+    task = asyncio.ensure_future(batch.run_batch(items, records.put_nowait, default_location=default_location))
+    task.add_done_callback(lambda _: records.put_nowait(_STREAM_END))
+
+    async def generate_records():
+        while True:
+            record = await records.get()
+            if record is _STREAM_END:
+                break
+            yield json.dumps(record) + "\n"
+        if not task.cancelled() and task.exception() is not None:
+            yield json.dumps({"type": "error", "error": f"Batch failed: {str(task.exception())}"}) + "\n"
+
+    return StreamingResponse(generate_records(), media_type='application/x-ndjson',
+                             headers={'Cache-Control': 'no-cache'})
+
+
+async def create_job(request: Request):
+    """Queue an extraction and return its job ID without waiting for it"""
+    url, location, error = await _read_request(request)
+    if error is not None:
+        return error
+    runner = jobs.get_runner()
+    runner.start(asyncio.get_running_loop())
+    job, created = await run_io(runner.store.create, url, location)
+    if created:
+        runner.wake()
+    return JSONResponse(jobs.job_links(job), status_code=202 if job['status'] not in jobs.TERMINAL else 200)
+
+
+async def get_job(request: Request):
+    job = await run_io(jobs.get_runner().store.get, request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(jobs.job_links(job))
+
+
+async def job_events(request: Request):
+    """SSE stream of a job's events; resumable with Last-Event-ID"""
+    job_id = request.path_params['job_id']
+    runner = jobs.get_runner()
+    if await run_io(runner.store.status, job_id) is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    last_event_id = jobs.parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id'))
+    return StreamingResponse(runner.subscribe_sse_async(job_id, last_event_id), media_type='text/event-stream',
+                             headers={**SSE_HEADERS, 'Access-Control-Allow-Headers': 'Cache-Control, Last-Event-ID'})
+
+
+async def thumbnail(request: Request):
+    """Resized thumbnail from the local store (?w= width, ?format=webp|jpeg)"""
+    fmt = thumbnails.negotiate_format(request.headers.get('Accept', ''), request.query_params.get('format'))
+    width = thumbnails.parse_width(request.query_params.get('w'))
+    # An SQLite lookup, maybe an LRU touch, and a file read: on the storage I/O threads
+    store = await run_io(thumbnails.get_store)
+    thumb = await run_io(store.get, request.path_params['video_id'], width, fmt)
+    if thumb is None:
+        return JSONResponse({"error": "Thumbnail not found"}, status_code=404)
+    headers = {'ETag': thumb.etag, 'Cache-Control': f'public, max-age={store.max_age}', 'Vary': 'Accept'}
+    if thumb.etag in request.headers.get('If-None-Match', ''):
+        return Response(status_code=304, headers=headers)
+    return Response(thumb.data, media_type=thumb.mimetype, headers=headers)
+
+
+async def search_recipes(request: Request):
+    query = (request.query_params.get('q') or '').strip()
+    if not query:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+    limit, offset = library.parse_page(request.query_params.get('limit'), request.query_params.get('offset'))
+    start = time.perf_counter()
+    # Index reads can take tens of milliseconds on a large library; keep them off the loop
+    results, more = await run_io(lambda: library.get_library().search(query, limit, offset))
+    return JSONResponse(library.page(results, more, limit, offset, time.perf_counter() - start, query=query))
+
+
+async def recipes_by_ingredient(request: Request):
+    names = library.parse_ingredients(request.query_params.getlist('i') + request.query_params.getlist('ingredients'))
+    if not names:
+        return JSONResponse({"error": "No ingredients provided"}, status_code=400)
+    limit, offset = library.parse_page(request.query_params.get('limit'), request.query_params.get('offset'))
+    start = time.perf_counter()
+    results, more = await run_io(lambda: library.get_library().by_ingredients(names, limit, offset))
+    return JSONResponse(library.page(results, more, limit, offset, time.perf_counter() - start,
+                                     ingredients=names))
+
+
+async def health_check(request: Request):
+    # The database counts are read on the storage I/O threads
+    return JSONResponse({**health.runtime(), **await run_io(health.storage)})
+
+
+async def metrics_endpoint(request: Request):
+    """Prometheus scrape endpoint (per worker process)"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+async def serve_react(request: Request):
+    path = request.path_params.get('path', '')
+    candidate = os.path.normpath(os.path.join(STATIC_FOLDER, path))
+    if path and candidate.startswith(STATIC_FOLDER) and os.path.isfile(candidate):
+        return FileResponse(candidate)
+    return FileResponse(os.path.join(STATIC_FOLDER, 'index.html'))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    # yt-dlp is blocking, so give it a sized pool on this loop, then open
+    # the OpenAI connection before the first request arrives
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=int(os.environ.get("METADATA_WORKERS", 8)),
+        thread_name_prefix="recipe-metadata",
+    )
+    loop.set_default_executor(executor)
+    # The rest is optional: a failure is logged and the app still starts
+    try:
+        await get_pool().warm(recipe_app.get_client())
+    except Exception as e:
+        print(f"⚠️ Connection warming skipped: {e}", file=sys.stderr)
+    try:
+        # Job workers share this loop; queued jobs from before a restart resume
+        # here. The /jobs endpoints retry this if the store is unavailable now
+        jobs.get_runner().start(loop)
+    except Exception as e:
+        print(f"⚠️ Job workers not started: {e}", file=sys.stderr)
+    try:
+        transcription.prewarm()
+    except Exception as e:
+        print(f"⚠️ Whisper prewarm failed: {e}", file=sys.stderr)
+    yield
+    executor.shutdown(wait=False)
+
+
+def create_asgi_app() -> Starlette:
+    routes = [
+        Route('/extract', extract, methods=['POST']),
+        Route('/extract-stream', extract_stream, methods=['POST']),
+        Route('/extract-batch', extract_batch, methods=['POST']),
+        Route('/jobs', create_job, methods=['POST']),
+        Route('/jobs/{job_id}', get_job, methods=['GET']),
+        Route('/jobs/{job_id}/events', job_events, methods=['GET']),
+        Route('/thumb/{video_id}', thumbnail, methods=['GET']),
+        Route('/recipes/search', search_recipes, methods=['GET']),
+        Route('/recipes/by-ingredient', recipes_by_ingredient, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/', serve_react, methods=['GET']),
+        Route('/{path:path}', serve_react, methods=['GET']),
+    ]
+    middleware = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+    return Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+
+
+app = create_asgi_app()
+
+# For local testing: python3 asgi.py
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 3000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
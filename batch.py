@@ -0,0 +1,197 @@
+"""
+AI TikTok Recipe Parser - Batch Extraction
+Runs many URLs through process_video with bounded concurrency
+
+Features:
+- Duplicate URLs (by canonical video) are extracted once
+- Identical descriptions share a single GPT call, across locations
+- Metadata extraction limited to a sized thread pool
+- GPT calls limited by a semaphore, and queued behind interactive requests
+  by the rate-limit scheduler
+- NDJSON records emitted as each item finishes, plus a throughput summary
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import app as recipe_app
+import ratelimit
+from canonical import canonicalize_url
+
+DEFAULT_METADATA_WORKERS = int(os.environ.get("BATCH_METADATA_WORKERS", 8))
+DEFAULT_GPT_CONCURRENCY = int(os.environ.get("BATCH_GPT_CONCURRENCY", 4))
+
+
+class BatchProcessor(recipe_app.RecipeProcessor):
+    """RecipeProcessor shared by a whole batch, with concurrency limits and GPT dedup"""
+
+    def __init__(self, metadata_workers: int, gpt_concurrency: int):
+        super().__init__(streaming_mode=False)
+        self.metadata_slots = asyncio.Semaphore(metadata_workers)
+        self.gpt_slots = asyncio.Semaphore(gpt_concurrency)
+        self.metadata_tasks: Dict[str, asyncio.Task] = {}
+        self.gpt_tasks: Dict[str, asyncio.Task] = {}
+        self.unique_recipes = 0
+
+    async def extract_metadata(self, url: str):
+        # The same video requested for several locations is extracted once
+        key = canonicalize_url(url).key
+        task = self.metadata_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._limited_metadata(url))
+            self.metadata_tasks[key] = task
+        return await asyncio.shield(task)
+
+    async def _limited_metadata(self, url: str):
+        async with self.metadata_slots:
+            return await super().extract_metadata(url)
+
+    async def extract_recipe(self, description: str, extra_info: Dict[str, Any]) -> Dict[str, Any]:
+        # Different videos with the same caption (reposts) reuse one GPT call,
+        # whichever locations they were requested for
+        key = self.recipe_key(description, extra_info)
+        task = self.gpt_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(super().extract_recipe(description, extra_info))
+            self.gpt_tasks[key] = task
+        return await asyncio.shield(task)
+
+    async def _generate_recipe(self, *args) -> Dict[str, Any]:
+        # Runs inside the single-flight generator, past the cache and any peer
+        # worker, so only recipes actually asked of GPT take a slot and count
+        async with self.gpt_slots:
+            self.unique_recipes += 1
+            return await super()._generate_recipe(*args)
+
+    async def generate_costs(self, *args) -> Dict[str, Any]:
+        # Likewise past the cost cache: cached prices don't wait for a GPT slot
+        async with self.gpt_slots:
+            return await super().generate_costs(*args)
+
+
+def parse_items(lines) -> List[Dict[str, Any]]:
+    """Parse JSONL batch input; malformed lines become per-item errors"""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            items.append({"error": f"Invalid JSON: {e}"})
+            continue
+        if not isinstance(entry, dict):
+            items.append({"error": "Each line must be a JSON object"})
+            continue
+        items.append(entry)
+    return items
+
+
+def _validate(item: Dict[str, Any], default_location: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    if item.get("error"):
+        return None, None, item["error"]
+    url = item.get("url")
+    location = item.get("location") or item.get("zipcode") or default_location
+    if not url:
+        return None, None, "No URL provided"
+    if not location:
+        return url, None, "No location provided"
+    return url, location, None
+
+
+async def run_batch(items: List[Dict[str, Any]], emit: Callable[[Dict[str, Any]], None],
+                    default_location: Optional[str] = None,
+                    metadata_workers: int = DEFAULT_METADATA_WORKERS,
+                    gpt_concurrency: int = DEFAULT_GPT_CONCURRENCY) -> Dict[str, Any]:
+    """Process a batch, emitting one record per input item as it completes"""
+
+    start_time = time.time()
+    processor = BatchProcessor(metadata_workers, gpt_concurrency)
+
+    # Group inputs by (canonical video, location) before doing any work
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    jobs: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    failed = 0
+    for index, item in enumerate(items):
+        url, location, error = _validate(item, default_location)
+        if error:
+            failed += 1
+            emit({"type": "item", "index": index, "url": url, "location": location,
+                  "ok": False, "error": error, "elapsed_ms": 0})
+            continue
+        key = (canonicalize_url(url).key, location.strip().casefold())
+        groups.setdefault(key, []).append(index)
+        jobs.setdefault(key, (url, location))
+
+    async def run_one(key):
+        url, location = jobs[key]
+        started = time.time()
+        recipe = await recipe_app.process_video(url, location, processor=processor)
+        return key, recipe, time.time() - started
+
+    succeeded = 0
+    # Tasks copy the context they're created in, so every OpenAI call they make
+    # waits behind interactive requests when the rate limit is tight
+    with ratelimit.use_priority(ratelimit.BATCH):
+        pending = [asyncio.ensure_future(run_one(key)) for key in jobs]
+    for finished in asyncio.as_completed(pending):
+        key, recipe, elapsed = await finished
+        ok = "error" not in recipe
+        indices = groups[key]
+        for index in indices:
+            record = {
+                "type": "item",
+                "index": index,
+                "url": items[index].get("url"),
+                "location": jobs[key][1],
+                "ok": ok,
+                "elapsed_ms": round(elapsed * 1000, 1),
+            }
+            if index != indices[0]:
+                record["duplicate_of"] = indices[0]
+            if ok:
+                record["recipe"] = recipe
+            else:
+                record["error"] = recipe["error"]
+            emit(record)
+        if ok:
+            succeeded += len(indices)
+        else:
+            failed += len(indices)
+
+    elapsed = time.time() - start_time
+    summary = {
+        "type": "summary",
+        "items": len(items),
+        "unique_videos": len(jobs),
+        "unique_recipes": processor.unique_recipes,
+        "succeeded": succeeded,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "items_per_second": round(len(items) / elapsed, 2) if elapsed > 0 else None,
+    }
+    emit(summary)
+    print(f"📦 Batch complete: {succeeded}/{len(items)} succeeded in {elapsed:.2f}s", file=sys.stderr)
+    return summary
+
+
+async def run_batch_file(path: str) -> Dict[str, Any]:
+    """CLI entry point: read a JSONL file and print NDJSON results to stdout"""
+    with open(path, encoding="utf-8") as f:
+        items = parse_items(f)
+
+    def emit(record: Dict[str, Any]):
+        print(json.dumps(record), flush=True)
+
+    # Size the thread pool yt-dlp runs in to match the metadata limit
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+        max_workers=DEFAULT_METADATA_WORKERS, thread_name_prefix="batch-metadata"))
+
+    return await run_batch(items, emit)
@@ -0,0 +1,107 @@
+"""
+Per-request overhead: subprocess-per-request vs the in-process engine
+
+Both paths use the stubbed yt-dlp and OpenAI backends, so the numbers are
+pure interpreter start-up, import and client construction cost.
+
+Usage:
+    python3 benchmarks/bench_engine.py [--requests 20]
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+from stubs import ROOT, install_stubs
+
+
+def run_child(url: str, location: str):
+    """Entry point for the subprocess path: stub the backends, then run the CLI"""
+    import app
+    install_stubs(app)
+    sys.argv = ["app.py", url, location]
+    asyncio.run(app.main())
+
+
+def bench_subprocess(n: int):
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", f"https://stub.invalid/v/{i}", "Austin"],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        json.loads(result.stdout)
+    return timings
+
+
+def bench_engine(n: int):
+    import app
+    install_stubs(app)
+    from engine import RecipeEngine
+
+    engine = RecipeEngine()
+    engine.start()
+    timings = []
+    try:
+        for i in range(n):
+            start = time.perf_counter()
+            recipe = engine.extract(f"https://stub.invalid/v/{i}", "Austin")
+            timings.append(time.perf_counter() - start)
+            if "error" in recipe:
+                raise RuntimeError(recipe["error"])
+    finally:
+        engine.close()
+    return timings
+
+
+def summarize(name: str, timings):
+    timings_ms = sorted(t * 1000 for t in timings)
+    return {
+        "mode": name,
+        "requests": len(timings_ms),
+        "mean_ms": round(statistics.mean(timings_ms), 2),
+        "p50_ms": round(timings_ms[len(timings_ms) // 2], 2),
+        "max_ms": round(timings_ms[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--child", nargs=2, metavar=("URL", "LOCATION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    # Keep stub chatter out of the report
+    devnull = open(os.devnull, "w")
+    stderr, sys.stderr = sys.stderr, devnull
+    try:
+        before = summarize("subprocess", bench_subprocess(args.requests))
+        after = summarize("in-process", bench_engine(args.requests))
+    finally:
+        sys.stderr = stderr
+        devnull.close()
+
+    print(json.dumps({
+        "before": before,
+        "after": after,
+        "speedup": round(before["mean_ms"] / max(after["mean_ms"], 1e-6), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Recipe library query latency at scale
+
+Fills a temporary library with synthetic recipes and times searches and
+ingredient lookups against it. Ingredient names come from the nutrition food
+table (data/foods.csv) and are drawn with a skewed distribution, so staples
+like salt and garlic appear in most recipes, as they do in real ones. Titles
+are built from a recipe's ingredients plus a dish word. The recorded fixture
+recipes go in too, so the library holds real recipes alongside the made-up ones.
+
+Usage:
+    python3 benchmarks/bench_library.py [--recipes 200000] [--queries 200]
+"""
+
+import os
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+from typing import Any, Dict, List
+
+from stubs import ROOT  # also puts the repo root on sys.path
+import fixtures as recorded
+
+from library import RecipeLibrary
+
+DISHES = ["noodles", "tacos", "bowl", "salad", "soup", "curry", "stir fry", "pasta", "bake", "skillet",
+          "wraps", "fried rice", "sandwich", "pie", "stew", "burger", "toast", "smoothie", "omelette", "pizza"]
+STYLES = ["crispy", "creamy", "spicy", "garlic", "honey", "lemon", "smoky", "cheesy", "one pan", "10 minute"]
+
+
+def food_names() -> List[str]:
+    names = []
+    with open(os.path.join(ROOT, "data", "foods.csv"), encoding="utf-8") as f:
+        for row in csv.DictReader(line for line in f if not line.startswith("#")):
+            names.append(row["name"])
+            names.extend(alias for alias in row["aliases"].split(";") if alias)
+    return names
+
+
+def synthetic(rng: random.Random, names: List[str], weights: List[float], n: int) -> Dict[str, Any]:
+    count = rng.randint(5, 12)
+    ingredients = list(dict.fromkeys(rng.choices(names, weights, k=count + 3)))[:count]
+    title = f"{rng.choice(STYLES)} {ingredients[0]} {rng.choice(DISHES)}".title()
+    return {
+        "title": title,
+        "ingredients": [{"name": name, "amount": f"{rng.randint(1, 400)} g"} for name in ingredients],
+        "instructions": ["Prep everything.", "Cook it.", "Serve."],
+    }
+
+
+def build(library: RecipeLibrary, count: int, seed: int):
+    rng = random.Random(seed)
+    names = food_names()
+    # Zipf-like: the first names in a shuffled list are the staples
+    rng.shuffle(names)
+    weights = [1.0 / (rank + 1) ** 0.9 for rank in range(len(names))]
+    for fixture in recorded.load_fixtures():
+        info = dict(fixture["info_dict"], canonical_key=f"{fixture['info_dict']['extractor_key'].lower()}:"
+                                                          f"{fixture['info_dict']['id']}")
+        library.save([info["canonical_key"]], fixture["url"], info, fixture["completion"], "bench")
+    batch = []
+    for n in range(count):
+        video_id = str(7400000000000000000 + n)
+        info = {"title": "", "uploader": f"cook{rng.randint(1, 20000)}", "extractor": "tiktok",
+                "video_id": video_id}
+        batch.append(([f"tiktok:{video_id}"], f"https://www.tiktok.com/@_/video/{video_id}", info,
+                      synthetic(rng, names, weights, n), "bench"))
+        if len(batch) == 5000:
+            library.save_many(batch)
+            batch = []
+    if batch:
+        library.save_many(batch)
+    return names
+
+
+def timed(fn, *args) -> Dict[str, Any]:
+    start = time.perf_counter()
+    results, more = fn(*args)
+    return {"ms": (time.perf_counter() - start) * 1000, "results": len(results)}
+
+
+def summary(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = sorted(sample["ms"] for sample in samples)
+    return {
+        "queries": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 2),
+        "max_ms": round(latencies[-1], 2),
+        "mean_results": round(statistics.fmean(sample["results"] for sample in samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=200000, help="synthetic recipes in the library")
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--keep", help="build the library at this path and keep it")
+    args = parser.parse_args()
+
+    directory = None if args.keep else tempfile.mkdtemp(prefix="recipe-library-")
+    path = args.keep or os.path.join(directory, "library.sqlite3")
+    try:
+        library = RecipeLibrary(path)
+        start = time.perf_counter()
+        names = build(library, args.recipes, args.seed)
+        build_s = time.perf_counter() - start
+
+        rng = random.Random(args.seed + 1)
+        common, rare = names[:10], names[len(names) // 2:]
+        kinds = {
+            "search_common_word": lambda: (library.search, rng.choice(common)),
+            "search_two_words": lambda: (library.search, f"{rng.choice(STYLES)} {rng.choice(DISHES)}"),
+            "search_three_words": lambda: (library.search, f"{rng.choice(common)} {rng.choice(names[:40])} "
+                                                           f"{rng.choice(DISHES)}"),
+            "search_rare_word": lambda: (library.search, rng.choice(rare)),
+            "ingredient_one_staple": lambda: (library.by_ingredients, [rng.choice(common)]),
+            "ingredients_two": lambda: (library.by_ingredients, rng.sample(names[:30], 2)),
+            "ingredients_three": lambda: (library.by_ingredients, rng.sample(names[:60], 3)),
+        }
+        results = {}
+        for kind, make in kinds.items():
+            samples = []
+            for _ in range(args.queries):
+                fn, query = make()
+                samples.append(timed(fn, query, 20, 0))
+            results[kind] = summary(samples)
+
+        print(json.dumps({
+            "recipes": library.stats()["recipes"],
+            "terms": library.stats()["terms"],
+            "build_s": round(build_s, 1),
+            "db_mib": round(sum(os.path.getsize(f"{path}{suffix}") for suffix in ("", "-wal")
+                                if os.path.exists(f"{path}{suffix}")) / 2 ** 20, 1),
+            "results": results,
+        }, indent=2))
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Output tokens and latency: GPT-generated macros vs the local nutrition engine
+
+"before" replays each fixture's recipe as the old prompt returned it (with
+protein/carbs/fat/calories per ingredient and total_macros); "after" replays
+the trimmed reply (names and amounts only) and lets nutrition.py fill in the
+numbers. Replies stream from stub_openai.py at --tokens-per-second, so the
+latency difference is the generation time of the dropped tokens.
+
+Usage:
+    python3 benchmarks/bench_nutrition.py [--requests 6] [--tokens-per-second 60]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+from stubs import is_cost_request, recipe_reply  # also puts the repo root on sys.path
+import fixtures as recorded
+from stub_openai import serve
+
+CHUNK_CHARS = 16
+
+
+def count_tokens():
+    """Token counter for replies: tiktoken when installed, else ~4 characters per token"""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "tiktoken/cl100k_base", lambda text: len(encoding.encode(text))
+    except ImportError:
+        return "chars/4 estimate", lambda text: max(len(text) // 4, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=6, help="extractions per mode")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="stub generation speed")
+    parser.add_argument("--gpt-latency", type=float, default=0.4, help="stub time to first token (s)")
+    args = parser.parse_args()
+
+    fixtures = recorded.load_fixtures()
+    tokenizer, tokens = count_tokens()
+
+    # Output size per fixture, and what the local computation costs instead
+    from nutrition import annotate, get_table
+    get_table()
+    per_fixture = []
+    for fixture in fixtures:
+        before = json.dumps(recipe_reply(fixture["completion"], macros=True))
+        after_reply = recipe_reply(fixture["completion"])
+        after = json.dumps(after_reply)
+        start = time.perf_counter()
+        annotate(after_reply)
+        local_ms = (time.perf_counter() - start) * 1000
+        per_fixture.append({
+            "fixture": fixture["name"],
+            "output_tokens_before": tokens(before),
+            "output_tokens_after": tokens(after),
+            "saved_pct": round((1 - tokens(after) / tokens(before)) * 100, 1),
+            "local_nutrition_ms": round(local_ms, 3),
+        })
+
+    # End-to-end latency through the real pipeline for both reply shapes
+    mode = {"macros": True}
+
+    replay = recorded.responder(fixtures)
+
+    def respond(request):
+        messages = request.get("messages", [])
+        if not mode["macros"] or is_cost_request(messages):
+            return replay(request)
+        match = recorded.match_fixture(fixtures, "\n".join(str(m.get("content", "")) for m in messages))
+        return json.dumps(recipe_reply(match["completion"], macros=True)), None
+
+    chunk_delay = (CHUNK_CHARS / 4) / args.tokens_per_second
+    stub = serve(latency=args.gpt_latency, chunk_delay=chunk_delay, chunk_size=CHUNK_CHARS, content=respond)
+    os.environ.update({"OPENAI_BASE_URL": f"http://127.0.0.1:{stub.server_port}/v1",
+                       "OPENAI_API_KEY": "sk-stub", "METRICS_JSON_LOGS": "0"})
+
+    devnull = open(os.devnull, "w")
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = devnull
+    latency = {}
+    try:
+        import app
+        recorded.install(app, fixtures)
+        from engine import get_engine
+        engine = get_engine()
+        offset = 0
+        for label, macros in (("before", True), ("after", False)):
+            mode["macros"] = macros
+            urls = recorded.variants(fixtures, args.requests, offset)
+            offset += args.requests
+            timings = []
+            for i, url in enumerate(urls):
+                start = time.perf_counter()
+                # A distinct location per request so pricing never comes from cache
+                recipe = engine.extract(url, f"{label} city {i}")
+                timings.append(time.perf_counter() - start)
+                if "error" in recipe:
+                    raise RuntimeError(recipe["error"])
+            latency[label] = {"mean_ms": round(statistics.mean(timings) * 1000, 1),
+                              "p50_ms": round(sorted(timings)[len(timings) // 2] * 1000, 1)}
+        engine.close()
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        devnull.close()
+        stub.shutdown()
+
+    before_tokens = sum(f["output_tokens_before"] for f in per_fixture)
+    after_tokens = sum(f["output_tokens_after"] for f in per_fixture)
+    print(json.dumps({
+        "tokenizer": tokenizer,
+        "tokens_per_second": args.tokens_per_second,
+        "fixtures": per_fixture,
+        "output_tokens": {"before": before_tokens, "after": after_tokens,
+                          "saved_pct": round((1 - after_tokens / before_tokens) * 100, 1)},
+        "latency": latency,
+        "speedup": round(latency["before"]["mean_ms"] / latency["after"]["mean_ms"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Startup time: importing app.py, server.py and asgi.py, and the app.py CLI
+
+Each measurement is a fresh interpreter, the way app.py is run per request and
+a worker imports the app. Reports the median wall time (an empty interpreter
+is timed too, for reference), what each entry module's imports cost according
+to python -X importtime, and whether any of the modules that are meant to load
+on first use (openai, yt-dlp, numpy, httpx, Pillow) were imported anyway.
+
+Exits non-zero when importing app.py takes longer than --budget-ms or a lazy
+module is imported at startup, so it can gate a change; bench_suite.py
+records the same numbers with its results.
+
+Usage:
+    python3 benchmarks/bench_startup.py [--runs 7] [--budget-ms 400]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+from stubs import ROOT
+
+MODULES = ("app", "server", "asgi")
+
+# Loaded by the code paths that use them, never by an import of the app
+LAZY = ("openai", "yt_dlp", "numpy", "httpx", "PIL")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Startup must not depend on credentials; the client is made on first use
+    env.pop("OPENAI_API_KEY", None)
+    return env
+
+
+def wall_ms(argv: List[str], runs: int, check: bool = True) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + argv, cwd=ROOT, env=_env(), capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if check and result.returncode != 0:
+            raise SystemExit(f"{' '.join(argv)} failed:\n{result.stderr.decode(errors='replace')}")
+    return round(statistics.median(timings), 1)
+
+
+def import_profile(module: str, top: int) -> Dict[str, Any]:
+    """python -X importtime for one module: its direct imports by cumulative cost"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=_env(), capture_output=True, text=True)
+    total, children = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative) / 1000
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            # A top-level import that finished before the module did (site, encodings)
+            children = []
+    children.sort(key=lambda child: -child[1])
+    return {
+        "import_ms": round(total, 1) if total is not None else None,
+        "heaviest": {name: round(ms, 1) for name, ms in children[:top]},
+    }
+
+
+def eager(module: str) -> List[str]:
+    """Lazy modules that importing `module` loads anyway"""
+    code = (f"import sys, json, {module}; "
+            f"print(json.dumps(sorted(m for m in {LAZY!r} if m in sys.modules)))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(runs: int = 7, top: int = 5) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"python_ms": wall_ms(["-c", "pass"], runs)}
+    for module in MODULES:
+        results[module] = dict(wall_ms=wall_ms(["-c", f"import {module}"], runs),
+                               eager_imports=eager(module), **import_profile(module, top))
+    # No arguments: the usage error, i.e. everything before the first network call
+    results["app_cli_usage_ms"] = wall_ms(["app.py"], runs, check=False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="interpreters started per measurement")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports listed per module")
+    parser.add_argument("--budget-ms", type=float, help="fail if importing app.py takes longer (wall time)")
+    args = parser.parse_args()
+
+    results = measure(args.runs, args.top)
+    print(json.dumps(results, indent=2))
+
+    failures = [f"import {module} loads {', '.join(results[module]['eager_imports'])}"
+                for module in MODULES if results[module]["eager_imports"]]
+    if args.budget_ms is not None and results["app"]["wall_ms"] > args.budget_ms:
+        failures.append(f"import app took {results['app']['wall_ms']}ms (budget {args.budget_ms:g}ms)")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Offline benchmark suite: recorded fixtures replayed through the real pipeline
+
+yt-dlp is replaced by the fixture replayer (fixtures.py) and OpenAI by the
+local stub HTTP server (stub_openai.py) serving the recorded completions, so
+the app's own HTTP client, streaming parser, caches and coalescing are all
+exercised with fixed, injected latencies. Measures:
+
+- single-request latency, cold and cached, for app.py (one process per
+  request) and the server.py /extract and /extract-stream endpoints, and for
+  an already-extracted video requested from a new location
+- throughput of /extract at each --concurrency level
+- Python memory allocated and retained per request
+- startup: importing app.py, server.py and asgi.py (bench_startup.py)
+
+Results are written as JSON (with the git commit) so runs can be compared.
+
+Usage:
+    python3 benchmarks/bench_suite.py [--requests 10] [--concurrency 1 4 16]
+    python3 benchmarks/bench_suite.py --compare results/old.json [results/new.json]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tracemalloc
+import concurrent.futures
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from stubs import ROOT
+import fixtures as recorded
+from stub_openai import serve
+import bench_startup
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+LOCATION = "Austin, TX"
+
+
+def summarize(timings: List[float]) -> Dict[str, Any]:
+    timings_ms = sorted(t * 1000 for t in timings)
+    return {
+        "n": len(timings_ms),
+        "mean_ms": round(statistics.mean(timings_ms), 2),
+        "p50_ms": round(timings_ms[len(timings_ms) // 2], 2),
+        "p95_ms": round(timings_ms[min(len(timings_ms) - 1, int(len(timings_ms) * 0.95))], 2),
+        "max_ms": round(timings_ms[-1], 2),
+    }
+
+
+def timed(fn: Callable[[str], None], urls: List[str]) -> List[float]:
+    timings = []
+    for url in urls:
+        start = time.perf_counter()
+        fn(url)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def check(recipe: Dict[str, Any], url: str):
+    if "error" in recipe:
+        raise RuntimeError(f"{url}: {recipe['error']}")
+
+
+def run_child(fixture_index: int, variant_index: int, location: str, metadata_latency: float):
+    """Entry point for the app.py path: replay one fixture variant through the CLI"""
+    import app
+    fixtures = recorded.load_fixtures()
+    recorded.install(app, fixtures, metadata_latency)
+    url, info = recorded.variant(fixtures[fixture_index], variant_index)
+    recorded.FixtureYoutubeDL.register(url, info)
+    sys.argv = ["app.py", url, location]
+    asyncio.run(app.main())
+
+
+def bench_cli(fixtures, n: int, env: Dict[str, str], metadata_latency: float) -> Dict[str, Any]:
+    timings = []
+    for i in range(n):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             str(i % len(fixtures)), str(1000 + i // len(fixtures)), LOCATION, str(metadata_latency)],
+            capture_output=True, text=True, cwd=ROOT, env=env,
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        check(json.loads(result.stdout), f"app.py #{i}")
+    return summarize(timings)
+
+
+def bench_stream(client, urls: List[str]) -> Dict[str, Any]:
+    """/extract-stream: time to first event, first recipe piece and the result"""
+    first_event, first_partial, total = [], [], []
+    for url in urls:
+        start = time.perf_counter()
+        seen_event = seen_partial = False
+        response = client.post("/extract-stream", json={"url": url, "zipcode": LOCATION}, buffered=False)
+        for chunk in response.response:
+            now = time.perf_counter() - start
+            for line in (chunk.decode() if isinstance(chunk, bytes) else chunk).splitlines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if not seen_event:
+                    first_event.append(now)
+                    seen_event = True
+                if not seen_partial and event.get("type") in ("title", "ingredient", "instruction"):
+                    first_partial.append(now)
+                    seen_partial = True
+                if event.get("type") == "error":
+                    raise RuntimeError(f"{url}: {event.get('message')}")
+        response.close()
+        total.append(time.perf_counter() - start)
+    return {
+        "first_event": summarize(first_event),
+        "first_partial": summarize(first_partial) if first_partial else None,
+        "total": summarize(total),
+    }
+
+
+def bench_throughput(flask_app, urls: List[str], concurrency: int) -> Dict[str, Any]:
+    def one(url: str) -> float:
+        client = flask_app.test_client()
+        start = time.perf_counter()
+        response = client.post("/extract", json={"url": url, "zipcode": LOCATION})
+        if response.status_code != 200:
+            raise RuntimeError(f"{url}: HTTP {response.status_code}")
+        check(response.get_json(), url)
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(one, urls))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(urls),
+        "wall_s": round(wall, 3),
+        "requests_per_second": round(len(urls) / wall, 2),
+        "latency": summarize(timings),
+    }
+
+
+def bench_memory(engine, urls: List[str]) -> Dict[str, Any]:
+    """Python heap allocated while serving (peak) and kept afterwards (caches), per request"""
+    # One request first so imports and pool set-up aren't billed to the run
+    check(engine.extract(urls[0], LOCATION), urls[0])
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for url in urls[1:]:
+        check(engine.extract(url, LOCATION), url)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = len(urls) - 1
+    return {
+        "requests": n,
+        "retained_kib_per_request": round((current - baseline) / n / 1024, 2),
+        "peak_kib": round((peak - baseline) / 1024, 2),
+        "max_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        result = subprocess.run(["git", *args], capture_output=True, text=True, cwd=ROOT)
+        return result.stdout.strip() if result.returncode == 0 else None
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_suite(args) -> Dict[str, Any]:
+    fixtures = recorded.load_fixtures()
+    stub = serve(latency=args.gpt_latency, chunk_delay=args.chunk_delay, content=recorded.responder(fixtures))
+    stub_url = f"http://127.0.0.1:{stub.server_port}/v1"
+    os.environ.update({
+        "OPENAI_BASE_URL": stub_url,
+        "OPENAI_API_KEY": "sk-stub",
+        "OPENAI_MAX_CONNECTIONS": str(max(args.concurrency + [20])),
+        "OPENAI_MAX_KEEPALIVE": str(max(args.concurrency + [10])),
+        "METRICS_JSON_LOGS": "0",
+    })
+
+    import app
+    recorded.install(app, fixtures, args.metadata_latency)
+    import server
+    from engine import get_engine
+
+    engine = get_engine()
+    client = server.app.test_client()
+    offset = 0
+
+    def fresh(count: int) -> List[str]:
+        nonlocal offset
+        urls = recorded.variants(fixtures, count, offset)
+        offset += count
+        return urls
+
+    def extract(url: str):
+        response = client.post("/extract", json={"url": url, "zipcode": LOCATION})
+        check(response.get_json(), url)
+
+    results: Dict[str, Any] = {}
+    n = args.requests
+    # Warm-up: pool connection, thread pools, lazy imports
+    check(engine.extract(fresh(1)[0], LOCATION), "warm-up")
+
+    print("⏱️  startup...", file=sys.stderr)
+    results["startup"] = bench_startup.measure(runs=5)
+
+    print("⏱️  app.py (process per request)...", file=sys.stderr)
+    results["app_cli_cold"] = bench_cli(fixtures, args.cli_requests, dict(os.environ), args.metadata_latency)
+
+    print("⏱️  single-request latency...", file=sys.stderr)
+    cold = fresh(n)
+    results["engine_cold"] = summarize(timed(lambda url: check(engine.extract(url, LOCATION), url), cold))
+    results["engine_cached"] = summarize(timed(lambda url: check(engine.extract(url, LOCATION), url), cold))
+    # Same videos from another city: recipe cached, only the pricing call runs
+    results["engine_new_location"] = summarize(timed(lambda url: check(engine.extract(url, "Tokyo"), url), cold))
+    cold = fresh(n)
+    results["server_extract_cold"] = summarize(timed(extract, cold))
+    results["server_extract_cached"] = summarize(timed(extract, cold))
+    results["server_stream_cold"] = bench_stream(client, fresh(n))
+
+    print("⏱️  throughput...", file=sys.stderr)
+    results["server_extract_throughput"] = [
+        bench_throughput(server.app, fresh(concurrency * args.rounds), concurrency)
+        for concurrency in args.concurrency
+    ]
+
+    print("⏱️  memory...", file=sys.stderr)
+    results["memory"] = bench_memory(engine, fresh(n + 1))
+    results["openai_calls"] = stub.completions
+
+    engine.close()
+    stub.shutdown()
+    return results
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves keyed by dotted path (throughput entries keyed by concurrency)"""
+    flat: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}{key}."))
+    elif isinstance(value, list):
+        for item in value:
+            label = item.get("concurrency", value.index(item)) if isinstance(item, dict) else value.index(item)
+            flat.update(flatten(item, f"{prefix}c{label}."))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix.rstrip(".")] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    lines = [f"{baseline['meta']['git'].get('commit')} -> {current['meta']['git'].get('commit')}"]
+    for key in sorted(set(old) & set(new)):
+        if old[key] == new[key] == 0:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "new"
+        lines.append(f"  {key:<55} {old[key]:>12} -> {new[key]:>12}  {change}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10, help="requests per latency scenario")
+    parser.add_argument("--cli-requests", type=int, default=5, help="app.py processes to time")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=4, help="throughput requests per concurrent client")
+    parser.add_argument("--metadata-latency", type=float, default=0.2, help="injected yt-dlp latency (s)")
+    parser.add_argument("--gpt-latency", type=float, default=0.5, help="injected OpenAI time to first token (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="injected delay between streamed chunks (s)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT",
+                        help="baseline result to diff against; with two files, diff them without running")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        fixture_index, variant_index, location, metadata_latency = args.child
+        run_child(int(fixture_index), int(variant_index), location, float(metadata_latency))
+        return
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as a, open(args.compare[1]) as b:
+            print("\n".join(compare(json.load(a), json.load(b))))
+        return
+
+    # Keep pipeline chatter (including server.py's DEBUG prints) out of the report
+    devnull = open(os.devnull, "w")
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = devnull
+    try:
+        results = run_suite(args)
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+        devnull.close()
+
+    revision = git_revision()
+    report = {
+        "meta": {
+            "git": revision,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("child", "compare", "output")},
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{revision['commit'] or 'unknown'}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(json.dumps(report, indent=2))
+    print(f"📁 Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            print("\n".join(compare(json.load(f), report)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
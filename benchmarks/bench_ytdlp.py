@@ -0,0 +1,252 @@
+"""
+yt-dlp metadata extraction: a fresh YoutubeDL with full processing vs the lean, reused profile
+
+Serves TikTok video pages from a local keep-alive HTTP server and runs the
+real TikTok extractor against them, so only the network round trip to TikTok
+is taken out. Pages are built in TikTok's own format (the
+__UNIVERSAL_DATA_FOR_REHYDRATION__ script) from the TikTok fixtures, padded
+to a realistic size; with --pages, saved HTML files named <video id>.html
+are served instead.
+
+"before" is the old extract_metadata: a new YoutubeDL per video and a full
+extract_info (format selection, thumbnail sorting, field filling). "after"
+is metadata.py: one YoutubeDL per thread, process=False, shared cookie jar.
+Reports latency and how many TCP connections the server accepted.
+
+Usage:
+    python3 benchmarks/bench_ytdlp.py [--requests 200] [--threads 4] [--pad-kb 250]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import statistics
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import stubs  # noqa: F401  puts the repo root on sys.path
+import fixtures as recorded
+
+import yt_dlp
+from yt_dlp.extractor.tiktok import TikTokIE
+
+import metadata
+
+FIELDS = ("description", "thumbnail", "title", "uploader", "duration")
+
+_VIDEO_ID = re.compile(r"/video/(\d+)")
+
+
+def tiktok_page(info: Dict[str, Any], pad_kb: int) -> bytes:
+    """A video page the TikTok extractor parses like the real one"""
+    video_id = info["id"]
+    cover = info.get("thumbnail") or ""
+    item = {
+        "id": video_id,
+        "desc": info.get("description", ""),
+        "createTime": str(info.get("timestamp") or 0),
+        "author": {"id": info.get("uploader_id", "0"), "uniqueId": info.get("uploader", ""),
+                   "nickname": info.get("uploader", ""), "secUid": f"MS4wLjABAAAA{video_id}"},
+        "video": {
+            "id": video_id, "duration": info.get("duration") or 0,
+            "width": info.get("width") or 576, "height": info.get("height") or 1024,
+            "ratio": "540p", "format": "mp4", "codecType": "h264",
+            "cover": cover, "originCover": cover, "dynamicCover": cover.replace(".jpeg", "-dyn.jpeg"),
+            "playAddr": f"https://v16-webapp.tiktok.com/video/{video_id}/play.mp4",
+            "downloadAddr": f"https://v16-webapp.tiktok.com/video/{video_id}/download.mp4",
+            "bitrateInfo": [
+                {"GearName": f"normal_{height}_0", "Bitrate": bitrate, "QualityType": quality, "CodecType": "h264",
+                 "PlayAddr": {"DataSize": str(bitrate * 5), "Width": width, "Height": height,
+                              "UrlList": [f"https://v16-webapp.tiktok.com/video/{video_id}/{height}.mp4"]}}
+                for width, height, bitrate, quality in ((576, 1024, 1200000, 10), (540, 960, 800000, 20),
+                                                        (360, 640, 400000, 24))
+            ],
+        },
+        "music": {"id": "1", "title": "original sound", "authorName": info.get("uploader", ""),
+                  "duration": info.get("duration") or 0},
+        "stats": {"playCount": info.get("view_count") or 0, "diggCount": info.get("like_count") or 0,
+                  "commentCount": info.get("comment_count") or 0, "shareCount": 0},
+    }
+    data = {"__DEFAULT_SCOPE__": {
+        "webapp.app-context": {"language": "en", "region": "US"},
+        "webapp.video-detail": {"statusCode": 0, "statusMsg": "", "itemInfo": {"itemStruct": item}},
+    }}
+    # Real pages carry a few hundred KB of inline scripts and styles
+    padding = "x" * (pad_kb * 1024)
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>TikTok</title>'
+        f'<script>var __bundle="{padding}";</script></head><body><div id="app"></div>'
+        '<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" type="application/json">'
+        f'{json.dumps(data)}</script></body></html>'
+    ).encode()
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        match = _VIDEO_ID.search(self.path)
+        page = server.pages.get(match.group(1)) if match else None
+        with server.lock:
+            server.requests += 1
+            if "tt_chain_token" in (self.headers.get("Cookie") or ""):
+                server.with_cookie += 1
+        if page is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        # TikTok hands out a session cookie on the first visit
+        self.send_header("Set-Cookie", "tt_chain_token=benchtoken; Path=/; Max-Age=86400")
+        self.end_headers()
+        self.wfile.write(page)
+
+
+class PageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve_pages(pages: Dict[str, bytes]) -> PageServer:
+    server = PageServer(("127.0.0.1", 0), PageHandler)
+    server.pages = pages
+    server.lock = threading.Lock()
+    server.connections = server.requests = server.with_cookie = 0
+    threading.Thread(target=server.serve_forever, name="tiktok-pages", daemon=True).start()
+    return server
+
+
+def route_to(server: PageServer):
+    """Make the TikTok extractor fetch its pages from the local server"""
+    base = f"http://127.0.0.1:{server.server_port}"
+    TikTokIE._create_url = staticmethod(lambda user_id, video_id: f'{base}/@{user_id or "_"}/video/{video_id}')
+
+
+def build_pages(args) -> Dict[str, Dict[str, Any]]:
+    """video URL -> info the page was built from, with server.pages filled per video ID"""
+    pages, infos = {}, {}
+    if args.pages:
+        for name in sorted(os.listdir(args.pages)):
+            video_id, ext = os.path.splitext(name)
+            if ext == ".html" and video_id.isdigit():
+                with open(os.path.join(args.pages, name), "rb") as f:
+                    pages[video_id] = f.read()
+                infos[f"https://www.tiktok.com/@_/video/{video_id}"] = {"id": video_id}
+    else:
+        tiktok = [f for f in recorded.load_fixtures() if f["info_dict"].get("extractor_key") == "TikTok"]
+        if not tiktok:
+            raise SystemExit("no TikTok fixtures to build pages from")
+        for n in range(args.videos):
+            url, info = recorded.variant(tiktok[n % len(tiktok)], n // len(tiktok))
+            pages[info["id"]] = tiktok_page(info, args.pad_kb)
+            infos[url] = info
+    if not pages:
+        raise SystemExit(f"no <video id>.html pages in {args.pages}")
+    return {"pages": pages, "infos": infos}
+
+
+def before_extract(url: str) -> Dict[str, Any]:
+    """The previous extract_metadata: a new YoutubeDL and full processing per video"""
+    options = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'extract_flat': False}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def run(mode: str, extract: Callable[[str], Dict[str, Any]], urls: List[str], threads: int,
+        server: PageServer) -> Dict[str, Any]:
+    server.connections = server.requests = server.with_cookie = 0
+    latencies, results, errors = [], {}, 0
+
+    def one(url):
+        start = time.perf_counter()
+        info = extract(url)
+        return url, info, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in concurrent.futures.as_completed([pool.submit(one, url) for url in urls]):
+            try:
+                url, info, ms = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ {mode}: {e}", file=sys.stderr)
+                continue
+            latencies.append(ms)
+            results[url] = {field: info.get(field) for field in FIELDS}
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": mode,
+        "requests": len(urls),
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2) if latencies else None,
+            "p50": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 2) if latencies else None,
+        },
+        "connections": server.connections,
+        "requests_per_connection": round(server.requests / max(server.connections, 1), 1),
+        "requests_with_cookie": server.with_cookie,
+        "_results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="extractions per mode")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent extractions")
+    parser.add_argument("--videos", type=int, default=50, help="distinct synthesized pages")
+    parser.add_argument("--pad-kb", type=int, default=250, help="inline script padding per page (KB)")
+    parser.add_argument("--pages", help="directory of saved TikTok pages (<video id>.html) to serve instead")
+    args = parser.parse_args()
+
+    built = build_pages(args)
+    server = serve_pages(built["pages"])
+    route_to(server)
+    video_urls = list(built["infos"])
+    urls = [video_urls[n % len(video_urls)] for n in range(args.requests)]
+
+    extractor = metadata.MetadataExtractor()
+    # One warm-up each, so import and extractor-class setup are out of the numbers
+    before_extract(urls[0])
+    extractor.extract(urls[0])
+
+    before = run("before", before_extract, urls, args.threads, server)
+    after = run("after", extractor.extract, urls, args.threads, server)
+
+    mismatched = [url for url in after["_results"]
+                  if before["_results"].get(url) and before["_results"][url] != after["_results"][url]]
+    for result in (before, after):
+        result.pop("_results")
+    print(json.dumps({
+        "pages": "saved" if args.pages else f"synthesized ({args.pad_kb} KB)",
+        "threads": args.threads,
+        "results": [before, after],
+        "speedup_mean": round(before["latency_ms"]["mean"] / after["latency_ms"]["mean"], 2)
+        if before["latency_ms"]["mean"] and after["latency_ms"]["mean"] else None,
+        "fields_match": not mismatched,
+        "extractor": extractor.stats(),
+    }, indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
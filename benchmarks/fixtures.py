@@ -0,0 +1,140 @@
+"""
+Recorded yt-dlp and OpenAI fixtures for deterministic benchmark replay
+
+Each file in fixtures/ holds one video: the share URL, the yt-dlp info_dict
+it returned and the recipe the model produced for it (with token usage);
+extraction and per-location pricing replies are both derived from it.
+record_fixture.py captures new ones. Replay needs no network:
+
+- FixtureYoutubeDL answers extract_info() for registered URLs
+- responder() picks the recorded completion for a stub_openai.py request
+
+variants() derives any number of distinct videos from the recorded ones
+(new video IDs and a tagged description), so cold-path runs never hit the
+metadata or recipe caches.
+"""
+
+import os
+import json
+import time
+import glob
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from stubs import cost_reply, is_cost_request, recipe_reply
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(directory: str = FIXTURE_DIR) -> List[Dict[str, Any]]:
+    """All fixtures in a directory, sorted by name"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        fixture["name"] = os.path.splitext(os.path.basename(path))[0]
+        fixtures.append(fixture)
+    if not fixtures:
+        raise FileNotFoundError(f"no fixtures in {directory}")
+    return fixtures
+
+
+def _variant_id(video_id: str, index: int) -> str:
+    if index == 0:
+        return video_id
+    if video_id.isdigit():
+        return str(int(video_id) + index)
+    # Shortcodes keep their length so URL patterns still match
+    suffix = format(index, "x")
+    return video_id[:-len(suffix)] + suffix
+
+
+def variant(fixture: Dict[str, Any], index: int) -> Tuple[str, Dict[str, Any]]:
+    """The index-th distinct video derived from a fixture: (url, info_dict)"""
+    info = dict(fixture["info_dict"])
+    base_id = info["id"]
+    video_id = _variant_id(base_id, index)
+    url = fixture["url"].replace(base_id, video_id)
+    info["id"] = video_id
+    info["webpage_url"] = info.get("webpage_url", url).replace(base_id, video_id)
+    if index:
+        info["description"] = f"{info.get('description', '')}\n\n(take {index})"
+    return url, info
+
+
+class FixtureYoutubeDL:
+    """Drop-in for yt_dlp.YoutubeDL that replays registered info_dicts"""
+
+    latency = 0.0
+    infos: Dict[str, Dict[str, Any]] = {}
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    @classmethod
+    def register(cls, url: str, info: Dict[str, Any]):
+        cls.infos[url] = info
+
+    def extract_info(self, url, download=False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        info = self.infos.get(url)
+        if info is None:
+            raise RuntimeError(f"Unsupported URL: {url} (no fixture registered)")
+        return dict(info)
+
+
+def variants(fixtures: List[Dict[str, Any]], count: int, offset: int = 0) -> List[str]:
+    """Register count distinct videos, cycling through the fixtures, and return their URLs"""
+    urls = []
+    for n in range(offset, offset + count):
+        url, info = variant(fixtures[n % len(fixtures)], n // len(fixtures))
+        FixtureYoutubeDL.register(url, info)
+        urls.append(url)
+    return urls
+
+
+def responder(fixtures: List[Dict[str, Any]]):
+    """stub_openai.py content callable: the recorded completion whose video the prompt is about"""
+    def respond(request: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, int]]]:
+        messages = request.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        match = match_fixture(fixtures, prompt)
+        if is_cost_request(messages):
+            # Pricing calls are short; usage is derived from the reply size
+            return json.dumps(cost_reply(match["completion"])), None
+        content = json.dumps(recipe_reply(match["completion"]))
+        # Recorded prompt size; the completion is re-counted for the reply we send
+        usage = dict(match.get("usage") or {"prompt_tokens": 250})
+        usage["completion_tokens"] = max(len(content) // 4, 1)
+        return content, usage
+    return respond
+
+
+def match_fixture(fixtures: List[Dict[str, Any]], prompt: str) -> Dict[str, Any]:
+    """The fixture a chat prompt is about (by title, then by ingredients)"""
+    for fixture in fixtures:
+        title = fixture["info_dict"].get("title")
+        if title and title in prompt:
+            return fixture
+    for fixture in fixtures:
+        # Recipe text survives prompt templating better than the exact caption
+        if any(i["name"] in prompt for i in fixture["completion"].get("ingredients", [])[:3]):
+            return fixture
+    return fixtures[0]
+
+
+def install(app_module, fixtures: List[Dict[str, Any]], metadata_latency: float = 0.0):
+    """Point the app's yt-dlp (metadata.py) at the fixture replayer (OpenAI goes to stub_openai.py)"""
+    FixtureYoutubeDL.latency = metadata_latency
+    app_module.metadata.yt_dlp = SimpleNamespace(YoutubeDL=FixtureYoutubeDL)
+    return app_module
@@ -0,0 +1,148 @@
+"""
+Concurrent /extract-stream capacity: gunicorn sync workers vs the ASGI app
+
+Starts the stub OpenAI server, launches each server mode against it with
+yt-dlp stubbed (stub_app.py), opens N SSE streams at once and reports time
+to first event, completion time and peak concurrently open streams.
+
+Usage:
+    python3 benchmarks/loadtest_streams.py [--streams 200] [--latency 1.0]
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+from stubs import ROOT
+from stub_openai import serve
+
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+
+MODES = {
+    # Today's deployment: Flask under gunicorn sync workers
+    "flask-sync": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "sync", "--timeout", "300",
+        "-b", f"127.0.0.1:{port}", "stub_app:flask_app"],
+    "asgi": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "--workers", str(workers), "--log-level", "warning",
+        "--host", "127.0.0.1", "--port", str(port), "stub_app:asgi_app"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_healthy(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become healthy")
+
+
+async def open_stream(client: httpx.AsyncClient, base_url: str, index: int, timeline: list):
+    start = time.perf_counter()
+    first_event = None
+    got_result = False
+    try:
+        async with client.stream("POST", f"{base_url}/extract-stream",
+                                 json={"url": f"https://stub.invalid/load/{index}", "zipcode": "Austin"}) as response:
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if first_event is None:
+                    first_event = time.perf_counter() - start
+                    timeline.append((start + first_event, 1))
+                if json.loads(line[6:]).get("type") == "result":
+                    got_result = True
+    except httpx.HTTPError:
+        pass
+    total = time.perf_counter() - start
+    if first_event is not None:
+        timeline.append((start + total, -1))
+    return {"first_event_s": first_event, "total_s": total, "ok": got_result}
+
+
+def peak_open(timeline: list) -> int:
+    peak = current = 0
+    for _, delta in sorted(timeline):
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+async def run_mode(mode: str, streams: int, workers: int, stub_url: str):
+    port = free_port()
+    env = dict(os.environ,
+               OPENAI_BASE_URL=stub_url,
+               OPENAI_API_KEY="sk-stub",
+               RECIPE_CACHE_BACKEND="memory",
+               OPENAI_MAX_CONNECTIONS=str(max(streams, 20)),
+               OPENAI_MAX_KEEPALIVE=str(max(streams, 10)),
+               METADATA_WORKERS="64")
+    process = subprocess.Popen(MODES[mode](port, workers), cwd=BENCH_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_healthy(base_url)
+        timeline: list = []
+        limits = httpx.Limits(max_connections=streams, max_keepalive_connections=streams)
+        async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(600.0)) as client:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(open_stream(client, base_url, i, timeline) for i in range(streams)))
+            wall = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    firsts = sorted(r["first_event_s"] for r in results if r["first_event_s"] is not None)
+    return {
+        "mode": mode,
+        "workers": workers,
+        "streams": streams,
+        "completed": sum(r["ok"] for r in results),
+        "peak_open_streams": peak_open(timeline),
+        "first_event_p50_s": round(statistics.median(firsts), 3) if firsts else None,
+        "first_event_max_s": round(firsts[-1], 3) if firsts else None,
+        "wall_s": round(wall, 3),
+    }
+
+
+async def main_async(args):
+    stub = serve(latency=args.latency, chunk_delay=args.chunk_delay)
+    stub_url = f"http://127.0.0.1:{stub.server_port}/v1"
+    report = []
+    for mode in args.modes:
+        report.append(await run_mode(mode, args.streams, args.workers, stub_url))
+    stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes per mode")
+    parser.add_argument("--latency", type=float, default=1.0, help="stub OpenAI time to first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["flask-sync", "asgi"])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
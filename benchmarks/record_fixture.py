@@ -0,0 +1,80 @@
+"""
+Record a benchmark fixture from a live video (needs network and OPENAI_API_KEY)
+
+Runs yt-dlp and the GPT steps (extraction and pricing) once for real and
+saves the info_dict and the resulting recipe to benchmarks/fixtures/<name>.json for bench_suite.py.
+
+Usage:
+    python3 benchmarks/record_fixture.py <url> <name> [--location "Austin, TX"]
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+from fixtures import FIXTURE_DIR
+
+# Not via stubs.py: that would default OPENAI_API_KEY to a placeholder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Fields the app reads plus a few that make fixtures recognisable
+INFO_FIELDS = (
+    "id", "extractor", "extractor_key", "webpage_url", "title", "description", "uploader",
+    "uploader_id", "channel_id", "duration", "thumbnail", "timestamp", "view_count",
+    "like_count", "comment_count", "width", "height", "ext",
+)
+
+
+async def record(url: str, location: str):
+    import app
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "skip_download": True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    info = {key: info[key] for key in INFO_FIELDS if info.get(key) is not None}
+
+    usage = {}
+    create = app.get_client().chat.completions.create
+
+    async def capture(**kwargs):
+        # Keep the usage the real extraction call reports alongside the recipe
+        stream = await create(**kwargs)
+        if not kwargs.get("stream"):
+            return stream
+
+        async def relay():
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage.update(prompt_tokens=chunk.usage.prompt_tokens,
+                                 completion_tokens=chunk.usage.completion_tokens)
+                yield chunk
+        return relay()
+
+    app.get_client().chat.completions.create = capture
+    recipe = await app.RecipeProcessor().process_with_gpt(info.get("description", ""), location,
+                                                          {"title": info.get("title", "")})
+    return {"url": url, "info_dict": info, "completion": recipe, "usage": usage or None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("name", help="fixture file name, e.g. tiktok_garlic_noodles")
+    parser.add_argument("--location", default="Austin, TX")
+    args = parser.parse_args()
+
+    os.environ.setdefault("RECIPE_CACHE_BACKEND", "memory")
+    fixture = asyncio.run(record(args.url, args.location))
+    path = os.path.join(FIXTURE_DIR, f"{args.name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(f"📁 Recorded {path}")
+
+
+if __name__ == "__main__":
+    main()
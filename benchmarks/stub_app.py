@@ -0,0 +1,18 @@
+"""
+Servers under test for load benchmarks: the real apps with yt-dlp stubbed out
+
+OpenAI is left real; point OPENAI_BASE_URL at stub_openai.py. Run from the
+benchmarks directory:
+    gunicorn stub_app:flask_app
+    uvicorn stub_app:asgi_app
+"""
+
+import os
+
+from stubs import install_stubs  # also puts the repo root on sys.path
+import app
+
+install_stubs(app, metadata_latency=float(os.environ.get("STUB_METADATA_LATENCY", 0.2)), stub_openai=False)
+
+from server import app as flask_app  # noqa: E402
+from asgi import app as asgi_app  # noqa: E402
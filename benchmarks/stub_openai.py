@@ -0,0 +1,187 @@
+"""
+Local stub of the OpenAI HTTP API for load tests
+
+Speaks just enough of the API for the app: GET /v1/models and
+POST /v1/chat/completions (plain and stream=True, as chunked SSE), with a
+configurable time to first token and delay between chunks. Responses carry
+x-ratelimit-* headers; with an rpm limit, requests over it get a 429 with
+retry-after-ms, like the real API. The reply is
+SAMPLE_RECIPE (or its costs) unless serve() is given fixed content or a responder that picks
+a recorded response per request (see fixtures.py).
+
+Usage:
+    python3 benchmarks/stub_openai.py --port 8899 --latency 0.5 [--rpm 60]
+    OPENAI_BASE_URL=http://127.0.0.1:8899/v1 python3 server.py
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stubs import stub_content
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set on the server instance by serve()
+    @property
+    def config(self):
+        return self.server.stub_config
+
+    def log_message(self, *args):
+        pass
+
+    def _rate_limit_headers(self, remaining: int, reset: float):
+        limit = self.config["rpm"] or 10000
+        self.send_header("x-ratelimit-limit-requests", str(limit))
+        self.send_header("x-ratelimit-remaining-requests", str(remaining))
+        self.send_header("x-ratelimit-reset-requests", f"{reset:.3f}s")
+        self.send_header("x-ratelimit-limit-tokens", "2000000")
+        self.send_header("x-ratelimit-remaining-tokens", "1999000")
+        self.send_header("x-ratelimit-reset-tokens", "30ms")
+
+    def _admit(self):
+        """Request bucket refilling at rpm/60 per second: (allowed, remaining, reset seconds)"""
+        server = self.server
+        limit = self.config["rpm"]
+        if not limit:
+            return True, 9999, 0.0
+        with server.bucket_lock:
+            now = time.monotonic()
+            server.bucket = min(limit, server.bucket + (now - server.bucket_updated) * limit / 60)
+            server.bucket_updated = now
+            if server.bucket < 1:
+                return False, 0, (1 - server.bucket) * 60 / limit
+            server.bucket -= 1
+            return True, int(server.bucket), (limit - server.bucket) * 60 / limit
+
+    def _send_json(self, payload, status=200, limits=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if limits:
+            remaining, reset = limits
+            self._rate_limit_headers(remaining, reset)
+            if status == 429:
+                self.send_header("retry-after-ms", str(int(reset * 1000)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model"}]})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, status=404)
+            return
+
+        config = self.config
+        allowed, remaining, reset = self._admit()
+        if not allowed:
+            self.server.throttled += 1
+            self._send_json({"error": {"message": "Rate limit reached for requests", "type": "requests",
+                                       "code": "rate_limit_exceeded"}}, status=429, limits=(remaining, reset))
+            return
+        self.server.completions += 1
+        content, usage = config["content"], None
+        if callable(content):
+            content, usage = content(request)
+        usage = dict(usage or {"prompt_tokens": 250, "completion_tokens": max(len(content) // 4, 1)})
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(config["latency"])
+
+        if not request.get("stream"):
+            self._send_json({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }, limits=(remaining, reset))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self._rate_limit_headers(remaining, reset)
+        self.end_headers()
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "gpt-3.5-turbo")}
+        size = config["chunk_size"]
+        for start in range(0, len(content), size):
+            chunk = dict(base, choices=[{"index": 0, "delta": {"content": content[start:start + size]},
+                                         "finish_reason": None}])
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            if config["chunk_delay"]:
+                time.sleep(config["chunk_delay"])
+        final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+            final = dict(base, choices=[], usage=usage)
+        self._write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, chunk_delay: float = 0.0,
+          chunk_size: int = 16, content=None, rpm: int = 0) -> StubOpenAIServer:
+    """Start the stub in a background thread; the bound port is server.server_port
+
+    content is a string, or a callable(request_json) -> (content, usage or None).
+    rpm > 0 answers completions over that many per minute with a 429.
+    """
+    server = StubOpenAIServer((host, port), StubOpenAIHandler)
+    server.completions = 0
+    server.throttled = 0
+    server.bucket = float(rpm)
+    server.bucket_updated = time.monotonic()
+    server.bucket_lock = threading.Lock()
+    server.stub_config = {
+        "latency": latency,
+        "chunk_delay": chunk_delay,
+        "chunk_size": chunk_size,
+        "rpm": rpm,
+        "content": content if content is not None else (
+            lambda request: (stub_content(request.get("messages", [])), None)),
+    }
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between chunks")
+    parser.add_argument("--rpm", type=int, default=0, help="completions per minute before 429s (0: unlimited)")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.chunk_delay, rpm=args.rpm)
+    print(f"Stub OpenAI listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
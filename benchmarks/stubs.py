@@ -0,0 +1,176 @@
+"""
+Stub yt-dlp and OpenAI backends for offline benchmarks
+
+Replaces the network-facing pieces of app.py with canned responses and a
+configurable artificial latency, so benchmarks measure our own overhead.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+# Benchmarks live one level below the application modules
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# The OpenAI client (made on first use by app.get_client()) needs a key
+os.environ.setdefault("OPENAI_API_KEY", "sk-stub")
+# Keep benchmark runs from reading or polluting the on-disk cache
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "memory")
+# ...or the recipe library, which would answer a second run without the calls it measures,
+# the job queue, whose leftover jobs the engine would pick up, and the thumbnail store
+_STATE_DIR = tempfile.mkdtemp(prefix="recipe-bench-")
+os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(_STATE_DIR, "library.sqlite3"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_STATE_DIR, "jobs.sqlite3"))
+os.environ.setdefault("THUMB_CACHE_DIR", os.path.join(_STATE_DIR, "thumbs"))
+
+SAMPLE_RECIPE = {
+    "title": "Garlic Butter Noodles",
+    "servings": 2,
+    "prep_time_minutes": 5,
+    "cook_time_minutes": 10,
+    "equipment": ["pot", "pan"],
+    "ingredients": [
+        {"name": "spaghetti", "amount": "200 g", "cost": "1.50 (USD)",
+         "protein_g": 25, "carbs_g": 150, "fat_g": 3, "calories": 710},
+        {"name": "butter", "amount": "2 tbsp", "cost": "0.40 (USD)",
+         "protein_g": 0, "carbs_g": 0, "fat_g": 23, "calories": 204},
+        {"name": "garlic", "amount": "4 cloves", "cost": "0.30 (USD)",
+         "protein_g": 1, "carbs_g": 4, "fat_g": 0, "calories": 18},
+    ],
+    "instructions": ["Boil the pasta", "Melt butter with garlic", "Toss together"],
+    "notes": "Measurements and costs are approximate",
+    "total_cost_estimate": "2-3 (USD)",
+    "total_macros": {"protein_g": 26, "carbs_g": 154, "fat_g": 26, "calories": 932},
+    "dietary_substitutions": {"gluten_free": "rice noodles", "vegan": "olive oil"},
+}
+
+SAMPLE_INFO = {
+    "id": "7300000000000000000",
+    "extractor_key": "TikTok",
+    "title": "Garlic butter noodles in 10 minutes",
+    "description": "Garlic butter noodles: 200g spaghetti, 2 tbsp butter, 4 cloves garlic. "
+                   "Boil pasta, melt butter with garlic, toss. #pasta #easyrecipe",
+    "thumbnail": "https://example.invalid/thumb.jpg",
+    "uploader": "stubchef",
+    "duration": 42,
+}
+
+
+def is_cost_request(messages) -> bool:
+    """True for app.py's per-location pricing call, False for recipe extraction"""
+    return any(m.get("role") == "system" and "cost" in str(m.get("content", "")).lower() for m in messages)
+
+
+MACRO_FIELDS = ("protein_g", "carbs_g", "fat_g", "calories")
+
+
+def recipe_reply(recipe: dict, macros: bool = False) -> dict:
+    """What the extraction call returns for a recipe: no costs and, unless
+    macros=True (the older prompt), no nutrition numbers"""
+    dropped = {"total_cost_estimate"} if macros else {"total_cost_estimate", "total_macros"}
+    reply = {key: value for key, value in recipe.items() if key not in dropped}
+    kept = ("name", "amount", *MACRO_FIELDS) if macros else ("name", "amount")
+    reply["ingredients"] = [{key: value for key, value in ingredient.items() if key in kept}
+                            for ingredient in recipe.get("ingredients", [])]
+    return reply
+
+
+def cost_reply(recipe: dict) -> dict:
+    """What the pricing call returns for a recipe's ingredients"""
+    return {"costs": [ingredient.get("cost", "") for ingredient in recipe.get("ingredients", [])],
+            "total_cost_estimate": recipe.get("total_cost_estimate", "")}
+
+
+def stub_content(messages, recipe: dict = SAMPLE_RECIPE) -> str:
+    """Completion text for a chat request: a recipe or its costs"""
+    return json.dumps(cost_reply(recipe) if is_cost_request(messages) else recipe_reply(recipe))
+
+
+class StubYoutubeDL:
+    """Drop-in for yt_dlp.YoutubeDL that returns SAMPLE_INFO after a delay"""
+
+    latency = 0.0
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        # Vary the description per URL so recipe caching keys stay distinct
+        info = dict(SAMPLE_INFO)
+        info["description"] = f"[{url}] {SAMPLE_INFO['description']}"
+        info["id"] = str(7300000000000000000 + zlib.crc32(url.encode()))
+        info["webpage_url"] = url
+        return info
+
+
+class _StubCompletions:
+    def __init__(self, latency: float, chunk_size: int = 16):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        # latency models time to first token
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = stub_content(kwargs.get("messages", []))
+        usage = SimpleNamespace(prompt_tokens=250, completion_tokens=len(content) // 4,
+                                total_tokens=250 + len(content) // 4)
+        if kwargs.get("stream"):
+            return self._stream(content, usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    async def _stream(self, content: str, usage):
+        for start in range(0, len(content), self.chunk_size):
+            delta = SimpleNamespace(content=content[start:start + self.chunk_size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _StubModels:
+    async def list(self):
+        return SimpleNamespace(data=[])
+
+
+class StubAsyncOpenAI:
+    """Minimal stand-in for openai.AsyncOpenAI used by RecipeProcessor"""
+
+    def __init__(self, latency: float = 0.0):
+        self.chat = SimpleNamespace(completions=_StubCompletions(latency))
+        self.models = _StubModels()
+
+
+def install_stubs(app_module, metadata_latency: float = 0.0, gpt_latency: float = 0.0,
+                  stub_openai: bool = True):
+    """Patch the app's yt-dlp module (metadata.py) and (optionally) OpenAI client with the stubs
+
+    With stub_openai=False the real client is kept, so it can be pointed at
+    stub_openai.py through OPENAI_BASE_URL and exercise the HTTP stack.
+    """
+    StubYoutubeDL.latency = metadata_latency
+    app_module.metadata.yt_dlp = SimpleNamespace(YoutubeDL=StubYoutubeDL)
+    if stub_openai:
+        app_module.client = StubAsyncOpenAI(latency=gpt_latency)
+    return app_module
@@ -0,0 +1,546 @@
+"""
+AI TikTok Recipe Parser - Cache Tier
+Size-bounded caches for yt-dlp metadata and GPT recipes
+
+Features:
+- In-memory LRU with TTL (per process)
+- SQLite store shared by every gunicorn worker on the host
+- Optional Redis-compatible backend shared across hosts
+- Eviction by entry count and by bytes
+- Per-tier hit/miss counters
+- Separate TTLs for metadata and recipes
+- Advisory locks in the shared tier for cross-worker request coalescing
+- Async variants that look up the in-process tier inline and run the shared
+  tier on a few dedicated I/O threads, off the event loop
+
+Configuration (environment):
+    RECIPE_CACHE_BACKEND   memory | sqlite | redis   (default: sqlite)
+    RECIPE_CACHE_PATH      SQLite file (default: .cache/recipes.sqlite3)
+    REDIS_URL              Redis connection URL for the redis backend
+    CACHE_MEMORY_ENTRIES   in-memory entry limit (default: 1000)
+    CACHE_MEMORY_BYTES     in-memory byte limit (default: 32 MiB)
+    CACHE_SHARED_ENTRIES   shared-tier entry limit (default: 100000)
+    CACHE_SHARED_BYTES     shared-tier byte limit (default: 512 MiB)
+    CACHE_IO_THREADS       threads for shared-tier calls made from the event loop (default: 4)
+    METADATA_CACHE_TTL     seconds to keep yt-dlp metadata (default: 6 hours)
+    RECIPE_CACHE_TTL       seconds to keep GPT recipes (default: 7 days)
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import sqlite3
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# How stale accessed_at may get before a hit writes it again
+_TOUCH_INTERVAL = 60
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class CacheBackend:
+    """Base class: a JSON-value store with TTLs, size bounds and counters"""
+
+    name = "base"
+    # Lives in this process's memory, so lookups are cheap enough for the event loop
+    in_process = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """The value and when it expires (a time.time() timestamp, None for never)"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[bool]:
+        """Try to take an expiring lock; None if this backend can't share locks"""
+        return None
+
+    def release_lock(self, key: str):
+        pass
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with TTL, bounded by entry count and bytes"""
+
+    name = "memory"
+    in_process = True
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._record(False)
+                return None
+            self._entries.move_to_end(key)
+            self._record(True)
+            return entry[0], entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
+
+
+class SQLiteCache(CacheBackend):
+    """On-disk LRU cache shared by every worker process on the host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int = 100000, max_bytes: int = 512 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at);
+            CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at);
+            CREATE TABLE IF NOT EXISTS locks (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+            BEGIN IMMEDIATE;
+            -- Running totals kept by triggers, so bounds are checked without
+            -- scanning the table and agree across every worker using the file
+            CREATE TABLE IF NOT EXISTS cache_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO cache_totals SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM cache;
+            CREATE TRIGGER IF NOT EXISTS cache_added AFTER INSERT ON cache BEGIN
+                UPDATE cache_totals SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS cache_removed AFTER DELETE ON cache BEGIN
+                UPDATE cache_totals SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS cache_resized AFTER UPDATE OF size ON cache BEGIN
+                UPDATE cache_totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 1;
+            END;
+            COMMIT;
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process: sqlite3 connections are
+        # neither thread-safe by default nor safe to carry across fork()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            if row is not None:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._record(False)
+            return None
+        # LRU order only needs to be roughly right; don't write on every hit
+        if now - row[2] > _TOUCH_INTERVAL:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._record(True)
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        payload = json.dumps(value)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn = self._connect()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete
+        # doesn't fire the trigger that keeps cache_totals right
+        conn.execute(
+            "INSERT INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+            (key, payload, size, expires_at, now),
+        )
+        self._evict(conn)
+
+    def _totals(self, conn: sqlite3.Connection) -> tuple:
+        return conn.execute("SELECT entries, bytes FROM cache_totals WHERE id = 1").fetchone()
+
+    def _evict(self, conn: sqlite3.Connection):
+        count, total = self._totals(conn)
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        # Drop least recently used rows until both bounds hold again, a batch
+        # at a time through the accessed_at index (sized from the average row
+        # for the byte bound)
+        while True:
+            count, total = self._totals(conn)
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+            excess = count - self.max_entries
+            if total > self.max_bytes and count:
+                excess = max(excess, math.ceil((total - self.max_bytes) / (total / count)))
+            cursor = conn.execute("DELETE FROM cache WHERE key IN "
+                                  "(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)", (max(excess, 1),))
+            if cursor.rowcount <= 0:
+                return
+            self.evictions += cursor.rowcount
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[bool]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+        cursor = conn.execute("INSERT OR IGNORE INTO locks (key, expires_at) VALUES (?, ?)", (key, now + ttl))
+        return cursor.rowcount == 1
+
+    def release_lock(self, key: str):
+        self._connect().execute("DELETE FROM locks WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        count, total = self._totals(self._connect())
+        stats.update({"entries": count, "bytes": total, "path": self.path})
+        return stats
+
+
+class RedisCache(CacheBackend):
+    """Redis-compatible backend; size bounds are enforced by the server's maxmemory policy"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis cache backend requires the 'redis' package")
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        payload, remaining_ms = self._client.pipeline().get(key).pttl(key).execute()
+        self._record(payload is not None)
+        if payload is None:
+            return None
+        # PTTL is -1 for a key without an expiry
+        return json.loads(payload), time.time() + remaining_ms / 1000 if remaining_ms >= 0 else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        # Milliseconds: a back-filled entry may have less than a second left
+        self._client.set(key, json.dumps(value), px=max(int(ttl * 1000), 1) if ttl else None)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def acquire_lock(self, key: str, ttl: float) -> Optional[bool]:
+        return bool(self._client.set(f"recipe-parser:lock:{key}", "1", nx=True, ex=max(int(ttl), 1)))
+
+    def release_lock(self, key: str):
+        self._client.delete(f"recipe-parser:lock:{key}")
+
+    def clear(self):
+        # Only our own namespaces; the server may be shared with other apps
+        for key in self._client.scan_iter(match="recipe-parser:*"):
+            self._client.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["url"] = self.url
+        return stats
+
+
+class TieredCache:
+    """Looks keys up tier by tier, back-filling faster tiers on a hit"""
+
+    def __init__(self, tiers: List[CacheBackend]):
+        self.tiers = tiers
+        # Leading in-process tiers, looked up inline by the async variants
+        self.local = next((index for index, tier in enumerate(tiers) if not tier.in_process), len(tiers))
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        return self._get(key, ttl, 0, len(self.tiers))
+
+    async def get_async(self, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        """get() for coroutines: in-process tiers inline, shared tiers on the I/O threads"""
+        value = self._get(key, ttl, 0, self.local)
+        if value is not None or self.local == len(self.tiers):
+            return value
+        return await run_io(self._get, key, ttl, self.local, len(self.tiers))
+
+    def _get(self, key: str, ttl: Optional[float], start: int, stop: int) -> Optional[Any]:
+        for index in range(start, stop):
+            tier = self.tiers[index]
+            try:
+                entry = tier.get_entry(key)
+            except Exception as e:
+                print(f"⚠️ Cache tier {tier.name} get failed: {e}", file=sys.stderr)
+                continue
+            if entry is not None:
+                value, expires_at = entry
+                # Faster tiers keep it only as long as this one will, not a fresh TTL
+                remaining = expires_at - time.time() if expires_at is not None else ttl
+                if remaining is None or remaining > 0:
+                    self._set(key, value, remaining, self.tiers[:index])
+                return value
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._set(key, value, ttl, self.tiers)
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None):
+        """set() for coroutines: in-process tiers inline, shared tiers on the I/O threads"""
+        self._set(key, value, ttl, self.tiers[:self.local])
+        if self.local < len(self.tiers):
+            await run_io(self._set, key, value, ttl, self.tiers[self.local:])
+
+    def _set(self, key: str, value: Any, ttl: Optional[float], tiers: List[CacheBackend]):
+        for tier in tiers:
+            try:
+                tier.set(key, value, ttl)
+            except Exception as e:
+                print(f"⚠️ Cache tier {tier.name} set failed: {e}", file=sys.stderr)
+
+    def delete(self, key: str):
+        for tier in self.tiers:
+            try:
+                tier.delete(key)
+            except Exception as e:
+                print(f"⚠️ Cache tier {tier.name} delete failed: {e}", file=sys.stderr)
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        """Lock in the outermost shared tier; always granted when there is none"""
+        for tier in reversed(self.tiers):
+            try:
+                acquired = tier.acquire_lock(key, ttl)
+            except Exception as e:
+                print(f"⚠️ Cache tier {tier.name} lock failed: {e}", file=sys.stderr)
+                return True
+            if acquired is not None:
+                return acquired
+        return True
+
+    async def acquire_lock_async(self, key: str, ttl: float) -> bool:
+        if self.local == len(self.tiers):
+            return self.acquire_lock(key, ttl)
+        return await run_io(self.acquire_lock, key, ttl)
+
+    async def release_lock_async(self, key: str):
+        if self.local == len(self.tiers):
+            return self.release_lock(key)
+        await run_io(self.release_lock, key)
+
+    def release_lock(self, key: str):
+        for tier in reversed(self.tiers):
+            try:
+                tier.release_lock(key)
+            except Exception as e:
+                print(f"⚠️ Cache tier {tier.name} unlock failed: {e}", file=sys.stderr)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [tier.stats() for tier in self.tiers]
+
+
+class NamespacedCache:
+    """A view over a TieredCache with its own key prefix and TTL"""
+
+    def __init__(self, namespace: str, ttl: Optional[float], store: Optional[TieredCache] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._store = store
+
+    @property
+    def store(self) -> TieredCache:
+        # Resolved on first use so importing app.py doesn't open the shared tier
+        return self._store if self._store is not None else get_store()
+
+    def _key(self, key: str) -> str:
+        return f"recipe-parser:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.store.get(self._key(key), self.ttl)
+
+    def set(self, key: str, value: Any):
+        self.store.set(self._key(key), value, self.ttl)
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return await self.store.get_async(self._key(key), self.ttl)
+
+    async def set_async(self, key: str, value: Any):
+        await self.store.set_async(self._key(key), value, self.ttl)
+
+    def delete(self, key: str):
+        self.store.delete(self._key(key))
+
+
+def build_store() -> TieredCache:
+    """Build the cache tiers selected by the environment"""
+    tiers: List[CacheBackend] = [MemoryCache(
+        max_entries=_env_int("CACHE_MEMORY_ENTRIES", 1000),
+        max_bytes=_env_int("CACHE_MEMORY_BYTES", 32 * 1024 * 1024),
+    )]
+
+    backend = os.environ.get("RECIPE_CACHE_BACKEND", "sqlite").lower()
+    try:
+        if backend == "sqlite":
+            tiers.append(SQLiteCache(
+                os.environ.get("RECIPE_CACHE_PATH", os.path.join(".cache", "recipes.sqlite3")),
+                max_entries=_env_int("CACHE_SHARED_ENTRIES", 100000),
+                max_bytes=_env_int("CACHE_SHARED_BYTES", 512 * 1024 * 1024),
+            ))
+        elif backend == "redis":
+            tiers.append(RedisCache(os.environ.get("REDIS_URL", "redis://localhost:6379/0")))
+    except Exception as e:
+        # A broken shared tier must never take extraction down with it
+        print(f"⚠️ Shared cache unavailable, using memory only: {e}", file=sys.stderr)
+
+    return TieredCache(tiers)
+
+
+_io_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_io_pid: Optional[int] = None
+_io_lock = threading.Lock()
+
+
+def io_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Threads for blocking storage calls made from the event loop
+
+    Kept apart from the loop's default executor, which is sized for yt-dlp, so
+    a cache or database call never queues behind a slow extraction.
+    """
+    global _io_executor, _io_pid
+    with _io_lock:
+        # Threads don't survive fork(); a pool inherited from a preloading parent is rebuilt
+        if _io_executor is None or _io_pid != os.getpid():
+            _io_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_env_int("CACHE_IO_THREADS", 4), thread_name_prefix="storage-io")
+            _io_pid = os.getpid()
+        return _io_executor
+
+
+async def run_io(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking storage call on the I/O threads and wait for it"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor(), fn, *args)
+
+
+_store: Optional[TieredCache] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> TieredCache:
+    """Return the process-wide cache store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_store()
+    return _store
+
+
+def namespace(name: str, ttl_env: str, default_ttl: float) -> NamespacedCache:
+    """Create a namespaced view whose TTL can be overridden from the environment"""
+    return NamespacedCache(name, _env_int(ttl_env, int(default_ttl)))
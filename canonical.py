@@ -0,0 +1,139 @@
+"""
+AI TikTok Recipe Parser - Canonical Keys
+URL canonicalization and content-addressed cache keys
+
+Share URLs for the same video come in many shapes (tracking query params,
+mobile hosts, short links). Resolving them to an (extractor, video_id) pair
+offline lets every variant hit the same metadata cache entry. Recipe keys
+hash everything that influences the GPT output, so different videos can't
+collide and a prompt change never serves stale answers. Recipes are keyed
+without the location; per-location costs have their own key.
+"""
+
+import re
+import json
+import hashlib
+import unicodedata
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+
+class CanonicalURL(NamedTuple):
+    extractor: str           # "tiktok", "instagram", "youtube" or "generic"
+    video_id: Optional[str]  # None when the ID can't be resolved offline
+    url: str                 # normalized URL
+
+    @property
+    def key(self) -> str:
+        """Metadata cache key shared by every variant of this video"""
+        if self.video_id:
+            return f"{self.extractor}:{self.video_id}"
+        return f"{self.extractor}:{self.url}"
+
+
+_TIKTOK_VIDEO = re.compile(r"/(?:@[^/]+/video|v|embed(?:/v2)?|share/video)/(\d+)")
+_TIKTOK_SHORT = re.compile(r"^/(?:t/)?([A-Za-z0-9]+)/?$")
+_INSTAGRAM_MEDIA = re.compile(r"^/(?:[^/]+/)?(?:p|reel|reels|tv)/([A-Za-z0-9_-]+)")
+_YOUTUBE_PATH = re.compile(r"^/(?:shorts|embed|live|v)/([A-Za-z0-9_-]{11})")
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def _normalize(url: str) -> str:
+    url = url.strip()
+    if "://" not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    path = parts.path.rstrip("/") or "/"
+    return f"https://{host}{path}"
+
+
+def canonicalize_url(url: str) -> CanonicalURL:
+    """Resolve a share URL to its extractor and video ID without network access"""
+    raw = url.strip()
+    if "://" not in raw:
+        raw = f"https://{raw}"
+    parts = urlsplit(raw)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path
+
+    if host.endswith("tiktok.com"):
+        match = _TIKTOK_VIDEO.search(path)
+        if match:
+            video_id = match.group(1)
+            return CanonicalURL("tiktok", video_id, f"https://www.tiktok.com/@/video/{video_id}")
+        short = _TIKTOK_SHORT.match(path)
+        if short and (host in ("vm.tiktok.com", "vt.tiktok.com") or path.startswith("/t/")):
+            # Short links only redirect to a video ID; key on the code itself
+            return CanonicalURL("tiktok-short", short.group(1), f"https://vm.tiktok.com/{short.group(1)}/")
+        return CanonicalURL("tiktok", None, _normalize(raw))
+
+    if host.endswith("instagram.com") or host == "instagr.am":
+        match = _INSTAGRAM_MEDIA.match(path)
+        if match:
+            code = match.group(1)
+            return CanonicalURL("instagram", code, f"https://www.instagram.com/p/{code}/")
+        return CanonicalURL("instagram", None, _normalize(raw))
+
+    if host == "youtu.be" or host.endswith("youtube.com"):
+        video_id = None
+        if host == "youtu.be":
+            candidate = path.strip("/").split("/")[0]
+            video_id = candidate if _YOUTUBE_ID.match(candidate) else None
+        else:
+            match = _YOUTUBE_PATH.match(path)
+            if match:
+                video_id = match.group(1)
+            elif path.rstrip("/") == "/watch":
+                candidate = parse_qs(parts.query).get("v", [""])[0]
+                video_id = candidate if _YOUTUBE_ID.match(candidate) else None
+        if video_id:
+            return CanonicalURL("youtube", video_id, f"https://www.youtube.com/watch?v={video_id}")
+        return CanonicalURL("youtube", None, _normalize(raw))
+
+    return CanonicalURL("generic", None, _normalize(raw))
+
+
+def canonical_from_info(info_dict: dict) -> Optional[CanonicalURL]:
+    """Build the canonical key from yt-dlp's own view of the video"""
+    extractor = (info_dict.get("extractor_key") or info_dict.get("extractor") or "").lower()
+    video_id = info_dict.get("id")
+    if not extractor or not video_id:
+        return None
+    for name in ("tiktok", "instagram", "youtube"):
+        if extractor.startswith(name):
+            extractor = name
+            break
+    return CanonicalURL(extractor, str(video_id), info_dict.get("webpage_url") or "")
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def _digest(payload: dict) -> str:
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def recipe_cache_key(description: str, title: str, model: str, prompt_version: str) -> str:
+    """Content-addressed recipe key over every input that shapes the GPT output"""
+    return _digest({
+        "description": _normalize_text(description),
+        "title": _normalize_text(title),
+        "model": model,
+        "prompt_version": prompt_version,
+    })
+
+
+def cost_cache_key(ingredients: List[Tuple[str, str]], location: str, model: str, prompt_version: str) -> str:
+    """Key for per-location ingredient costs: (name, amount) pairs plus the location"""
+    return _digest({
+        "ingredients": [[_normalize_text(name).casefold(), _normalize_text(amount).casefold()]
+                        for name, amount in ingredients],
+        "location": _normalize_text(location).casefold(),
+        "model": model,
+        "prompt_version": prompt_version,
+    })
@@ -0,0 +1,93 @@
+"""
+AI TikTok Recipe Parser - Caption Pre-processing
+Cleans video descriptions before they reach the prompt
+
+Features:
+- Strips trailing hashtag runs, @mentions, emoji, links and sponsor/CTA lines
+  (inline hashtags keep their word: "made #pasta" -> "made pasta")
+- Drops repeated lines and collapses whitespace, keeping line breaks for lists
+- Flags captions that are only noise (hashtags, mentions, links, calls to
+  action) so the audio can be tried instead and the GPT call skipped
+- Estimates the prompt tokens saved for the per-request timing output
+"""
+
+import re
+from typing import NamedTuple, Optional
+
+# Roughly 4 characters per token for English text
+CHARS_PER_TOKEN = 4
+
+_URL = re.compile(r"(?:https?://|www\.)\S+|\b[\w-]+\.(?:com|co|ly|link|io|me|shop|store)/\S*", re.IGNORECASE)
+_MENTION = re.compile(r"(?<![\w@])@[\w.]+")
+_HASHTAG_RUN = re.compile(r"(?:\s*#[\w]+)+\s*$")
+_HASHTAG = re.compile(r"#(\w+)")
+_EMOJI = re.compile(
+    "[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0001F900-\U0001F9FF\U00002B00-\U00002BFF"
+    "\U0000FE0F\U0000200D\U000020E3\U0001F1E6-\U0001F1FF]+"
+)
+_CTA = re.compile(
+    r"\b(?:follow (?:me|us|@?\w+)?\s*for (?:more|part)|like (?:and|&) (?:follow|subscribe)|"
+    r"subscribe (?:for|to)|link in (?:my )?bio|save (?:this|it) for (?:later|\w+)|"
+    r"(?:full|written) recipe (?:is )?(?:on|at|in) (?:my|the) (?:website|blog|site|bio|channel)|"
+    r"comment ['\"]?\w+['\"]? (?:below|and)|tag (?:a|someone|your)|share (?:this|with)|"
+    r"use (?:my )?code \w+|shop (?:my|the|now)|turn on (?:post )?notifications|"
+    r"dm (?:me|us)|(?:partner(?:ed)?|sponsored|paid partnership) (?:with|by))\b",
+    re.IGNORECASE,
+)
+_SPONSOR_TAG = re.compile(r"#(?:ad|sponsored|partner|gifted|collab)\b", re.IGNORECASE)
+_SPACES = re.compile(r"[ \t ]+")
+
+
+class PreparedCaption(NamedTuple):
+    text: str                # cleaned description for the prompt
+    raw_chars: int
+    clean_chars: int
+    rejected: Optional[str]  # reason when the caption isn't a recipe
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.raw_chars - self.clean_chars, 0) // CHARS_PER_TOKEN
+
+
+def clean_description(text: str, keep_hashtags: bool = False) -> str:
+    """Remove social-media noise from a caption, keeping the recipe content"""
+    lines = []
+    seen = set()
+    for line in (text or "").splitlines():
+        if _SPONSOR_TAG.search(line) or _CTA.search(line):
+            # Sponsor and call-to-action sentences carry nothing for the recipe;
+            # keep the rest of the line if the CTA was tacked on after a period
+            sentences = re.split(r"(?<=[.!?])\s+", line)
+            line = " ".join(s for s in sentences if not (_CTA.search(s) or _SPONSOR_TAG.search(s)))
+        line = _URL.sub(" ", line)
+        line = _MENTION.sub(" ", line)
+        if not keep_hashtags:
+            line = _HASHTAG_RUN.sub("", line)
+        line = _HASHTAG.sub(r"\1", line)
+        line = _EMOJI.sub(" ", line)
+        line = _SPACES.sub(" ", line).strip(" -|•·:")
+        key = line.casefold()
+        if not line or key in seen:
+            if lines and lines[-1]:
+                lines.append("")  # keep paragraph breaks, collapse repeats
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def prepare(description: str, title: str = "") -> PreparedCaption:
+    """Clean a caption and decide whether it's worth a GPT call
+
+    Only captions with nothing left once cleaned, and no title to go on, are
+    rejected. Anything else goes to GPT, however short and in whatever
+    language: "Omg this lasagna" is a recipe request.
+    """
+    cleaned = clean_description(description)
+    rejected = None
+    if not cleaned and not clean_description(title):
+        rejected = "only hashtags, mentions, links or calls to action" if (description or "").strip() else "empty caption"
+    if not cleaned:
+        # Hashtags still name the dish
+        cleaned = clean_description(description, keep_hashtags=True)
+    return PreparedCaption(cleaned, len(description or ""), len(cleaned), rejected)
@@ -0,0 +1,166 @@
+"""
+AI TikTok Recipe Parser - OpenAI Connection Pool
+Shared keep-alive HTTP pool for the OpenAI client, warmed without generating tokens
+
+Features:
+- One explicitly sized httpx pool per worker process (HTTP/2 when h2 is installed)
+- Warm-up via a models listing (no billable completion)
+- Re-warm only after the pool has sat idle
+- Pool stats: open connections, reuse ratio, handshake time
+- Rate-limit headers on every response are fed to the scheduler (ratelimit.py)
+
+Configuration (environment):
+    OPENAI_MAX_CONNECTIONS    pool size (default: 20)
+    OPENAI_MAX_KEEPALIVE      idle connections kept open (default: 10)
+    OPENAI_KEEPALIVE_EXPIRY   seconds an idle connection is kept (default: 120)
+    OPENAI_REWARM_AFTER       idle seconds before the next request re-warms (default: 60)
+    OPENAI_HTTP2              set to 0 to force HTTP/1.1
+"""
+
+import os
+import sys
+import time
+import threading
+import importlib.util
+from typing import Any, Dict, Optional
+
+from ratelimit import get_scheduler
+
+# httpx only needs h2 to be importable; find_spec checks without importing it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class OpenAIPool:
+    """Process-wide httpx pool with connection tracing and idle-aware warming"""
+
+    def __init__(self):
+        self.max_connections = int(_env_float("OPENAI_MAX_CONNECTIONS", 20))
+        self.max_keepalive = int(_env_float("OPENAI_MAX_KEEPALIVE", 10))
+        self.keepalive_expiry = _env_float("OPENAI_KEEPALIVE_EXPIRY", 120)
+        self.rewarm_after = _env_float("OPENAI_REWARM_AFTER", 60)
+        self.http2 = HTTP2_AVAILABLE and os.environ.get("OPENAI_HTTP2", "1") != "0"
+
+        self._http_client = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.handshake_seconds = 0.0
+        self.last_handshake_ms: Optional[float] = None
+        self.warmups = 0
+        self.last_warm_ms: Optional[float] = None
+        self.last_used: Optional[float] = None
+
+    @property
+    def http_client(self) -> "httpx.AsyncClient":
+        """The shared httpx client, rebuilt if this process was forked"""
+        with self._lock:
+            if self._http_client is None or self._pid != os.getpid():
+                import httpx
+                self._http_client = httpx.AsyncClient(
+                    http2=self.http2,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(60.0, connect=5.0),
+                    event_hooks={"request": [self._attach_trace], "response": [self._observe_limits]},
+                )
+                self._pid = os.getpid()
+                self.last_used = None
+            return self._http_client
+
+    async def _attach_trace(self, request):
+        request.extensions["trace"] = _ConnectionTrace(self)
+
+    async def _observe_limits(self, response):
+        get_scheduler().observe(response.headers)
+
+    def needs_warm(self) -> bool:
+        """True if no connection has been used recently enough to still be open"""
+        return self.last_used is None or time.monotonic() - self.last_used > self.rewarm_after
+
+    async def warm(self, openai_client) -> bool:
+        """Open (or refresh) a pooled connection with a non-generating request"""
+        start = time.perf_counter()
+        try:
+            # Waits out rate-limit pauses like any call, but doesn't spend the
+            # completion budget and isn't retried: warming is optional
+            await get_scheduler().call(openai_client.models.list, retries=0, requests=0)
+        except Exception as e:
+            print(f"⚠️ Connection warming failed: {e}", file=sys.stderr)
+            return False
+        self.warmups += 1
+        self.last_warm_ms = round((time.perf_counter() - start) * 1000, 2)
+        # Stub clients bypass the pool, so count the warm-up as use either way
+        self.last_used = time.monotonic()
+        return True
+
+    def open_connections(self) -> Optional[int]:
+        # httpx doesn't expose pool state publicly; read it best-effort
+        client = self._http_client
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        return len(connections) if connections is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "http2": self.http2,
+            "open_connections": self.open_connections(),
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "avg_handshake_ms": round(self.handshake_seconds * 1000 / self.connections_opened, 2)
+            if self.connections_opened else None,
+            "last_handshake_ms": self.last_handshake_ms,
+            "warmups": self.warmups,
+            "last_warm_ms": self.last_warm_ms,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.last_used else None,
+        }
+
+
+class _ConnectionTrace:
+    """httpcore trace callback for one request: counts requests and times handshakes"""
+
+    def __init__(self, pool: OpenAIPool):
+        self.pool = pool
+        self.handshake_start: Optional[float] = None
+
+    async def __call__(self, event: str, info: Dict[str, Any]):
+        if event == "connection.connect_tcp.started":
+            self.handshake_start = time.perf_counter()
+        elif event == "connection.connect_tcp.complete":
+            self.pool.connections_opened += 1
+        elif event.endswith("send_request_headers.started"):
+            if self.handshake_start is not None:
+                # TCP connect + TLS (+ HTTP/2 preface) up to the first request byte
+                elapsed = time.perf_counter() - self.handshake_start
+                self.pool.handshake_seconds += elapsed
+                self.pool.last_handshake_ms = round(elapsed * 1000, 2)
+                self.handshake_start = None
+            self.pool.requests += 1
+            self.pool.last_used = time.monotonic()
+
+
+_pool: Optional[OpenAIPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> OpenAIPool:
+    """Return the process-wide OpenAI connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OpenAIPool()
+    return _pool
@@ -0,0 +1,194 @@
+"""
+AI TikTok Recipe Parser - In-process Extraction Engine
+Runs process_video inside the server process instead of spawning app.py
+
+Features:
+- One long-lived event loop per worker (background thread)
+- Shared OpenAI client and HTTP connection pool across requests, warmed at startup
+- Sized thread pool for yt-dlp metadata extraction
+- Blocking, streaming (SSE) and batch (NDJSON) entry points for Flask
+- Background job workers (jobs.py) run on the same loop
+- Whisper transcription workers started with the engine when installed
+- Fork-safe: the loop is (re)started lazily in each worker process
+"""
+
+import os
+import sys
+import json
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from typing import Dict, Any, Iterator, Optional
+
+import app as recipe_app
+import batch
+import jobs
+import transcription
+from connections import get_pool
+
+# Marker pushed onto a stream queue once the extraction future settles
+_STREAM_END = object()
+
+
+class RecipeEngine:
+    """Long-lived extraction engine owning an event loop thread per process"""
+
+    def __init__(self, metadata_workers: Optional[int] = None):
+        self.metadata_workers = metadata_workers or int(os.environ.get("METADATA_WORKERS", 8))
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the event loop thread if it isn't running in this process"""
+        with self._lock:
+            # Threads don't survive fork(), so a loop inherited from a
+            # preloading parent is discarded and rebuilt in the worker
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.metadata_workers,
+                thread_name_prefix="recipe-metadata",
+            )
+            loop.set_default_executor(executor)
+
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run_loop, name="recipe-engine", daemon=True)
+            thread.start()
+            ready.wait()
+
+            self._loop = loop
+            self._thread = thread
+            self._executor = executor
+            self._pid = os.getpid()
+            print(f"🚀 Recipe engine started (pid {self._pid})", file=sys.stderr)
+            self._start_services(loop)
+            return loop
+
+    def _start_services(self, loop: asyncio.AbstractEventLoop):
+        """Warm-up, job workers and Whisper: each optional, so a failure is logged
+        and the engine still serves extractions"""
+        try:
+            # Open the OpenAI connection now so the first request doesn't pay for it
+            asyncio.run_coroutine_threadsafe(get_pool().warm(recipe_app.get_client()), loop)
+        except Exception as e:
+            print(f"⚠️ Connection warming skipped: {e}", file=sys.stderr)
+        try:
+            # Pick up queued jobs, including any left over from before a restart;
+            # the /jobs endpoints retry this if the store is unavailable now
+            jobs.get_runner().start(loop)
+        except Exception as e:
+            print(f"⚠️ Job workers not started: {e}", file=sys.stderr)
+        try:
+            # Load the Whisper model in its worker processes if the fallback is usable
+            transcription.prewarm()
+        except Exception as e:
+            print(f"⚠️ Whisper prewarm failed: {e}", file=sys.stderr)
+
+    def submit(self, url: str, location: str, streaming_mode: bool = False,
+               event_sink=None, request_id: Optional[str] = None) -> concurrent.futures.Future:
+        """Schedule process_video on the engine loop and return its future"""
+        loop = self.start()
+        coro = recipe_app.process_video(url, location, streaming_mode=streaming_mode,
+                                        event_sink=event_sink, request_id=request_id)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def extract(self, url: str, location: str, timeout: Optional[float] = None,
+                request_id: Optional[str] = None) -> Dict[str, Any]:
+        """Run an extraction and block until the recipe is ready"""
+        return self.submit(url, location, request_id=request_id).result(timeout=timeout)
+
+    def stream(self, url: str, location: str, request_id: Optional[str] = None) -> Iterator[str]:
+        """Run an extraction and yield its progress/result events as SSE lines"""
+        events: "queue.Queue[Any]" = queue.Queue()
+        future = self.submit(url, location, streaming_mode=True, event_sink=events.put, request_id=request_id)
+        future.add_done_callback(lambda _: events.put(_STREAM_END))
+
+        while True:
+            event = events.get()
+            if event is _STREAM_END:
+                break
+            yield f"data: {json.dumps(event)}\n\n"
+
+        # process_video reports failures in its return value; anything raised
+        # here escaped it and is surfaced as a terminal error event
+        error = future.exception()
+        if error is not None:
+            error_data = {
+                "type": "error",
+                "message": f"Processing failed: {str(error)}"
+            }
+            yield f"data: {json.dumps(error_data)}\n\n"
+
+    def batch(self, items, default_location: Optional[str] = None) -> Iterator[str]:
+        """Run a batch and yield one NDJSON line per item as it finishes"""
+        loop = self.start()
+        records: "queue.Queue[Any]" = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            batch.run_batch(items, records.put, default_location=default_location), loop)
+        future.add_done_callback(lambda _: records.put(_STREAM_END))
+
+        while True:
+            record = records.get()
+            if record is _STREAM_END:
+                break
+            yield json.dumps(record) + "\n"
+
+        error = future.exception()
+        if error is not None:
+            yield json.dumps({"type": "error", "error": f"Batch failed: {str(error)}"}) + "\n"
+
+    def close(self):
+        """Cancel the tasks still on the loop, stop its thread and release the executor"""
+        with self._lock:
+            loop, thread, executor = self._loop, self._thread, self._executor
+            self._loop = self._thread = self._executor = None
+            self._pid = None
+        if loop is None:
+            return
+
+        async def cancel_tasks():
+            # Job workers, pollers and in-flight extractions: cancel them and
+            # let them unwind, so none is destroyed while still pending
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.shutdown_asyncgens()
+
+        if thread is not None and thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(timeout=5)
+            except Exception as e:
+                print(f"⚠️ Engine tasks not cancelled cleanly: {e}", file=sys.stderr)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        loop.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+_engine: Optional[RecipeEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RecipeEngine:
+    """Return the process-wide engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RecipeEngine()
+    return _engine
@@ -0,0 +1,53 @@
+"""
+AI TikTok Recipe Parser - Gunicorn Configuration
+Loads the app once in the master and forks workers from it
+
+Features:
+- preload_app: modules, the yt-dlp extractors and the nutrition table are set
+  up before fork (app.preload()) and shared copy-on-write by every worker
+- The garbage collector is held off while preloading, then everything loaded
+  is frozen out of its reach (gc.freeze()), so collections in workers don't
+  write to, and copy, the shared pages
+- Clients, pools, databases and threads are still made per worker, after fork
+
+Picked up automatically by gunicorn from the working directory:
+    gunicorn server:app
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+Configuration (environment):
+    GUNICORN_PRELOAD    set to 0 to import the app in each worker instead (default: 1)
+"""
+
+import gc
+import os
+import sys
+import time
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+# Everything below is a hook: gunicorn reads this file again on SIGHUP, and
+# module-level side effects would rerun without when_ready to undo them
+def on_starting(server):
+    if preload_app:
+        # Collections while preloading would only churn objects about to be frozen
+        gc.disable()
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported and before any worker is forked"""
+    if not preload_app:
+        return
+    import app as recipe_app
+
+    start = time.perf_counter()
+    recipe_app.preload()
+    gc.freeze()
+    gc.enable()
+    print(f"🚀 Preloaded in {(time.perf_counter() - start) * 1000:.0f}ms "
+          f"({gc.get_freeze_count()} objects shared with workers)", file=sys.stderr)
+
+
+def post_fork(server, worker):
+    # Workers always collect, whatever state the master was left in
+    gc.enable()
@@ -0,0 +1,60 @@
+"""
+AI TikTok Recipe Parser - Health Report
+The /health body shared by server.py and asgi.py
+
+Features:
+- Reports only the subsystems this worker has already made: a health check
+  never imports yt-dlp or opens a database just to say it's unused (null)
+- A subsystem whose stats fail is reported with its error, not a 500
+- In-memory counters and SQLite counts are separate, so the ASGI app reads
+  the counts on the storage I/O threads (cache.run_io), off the event loop
+"""
+
+from typing import Any, Dict, Optional
+
+import app as recipe_app
+import cache
+import jobs
+import library
+import metadata
+import thumbnails
+import transcription
+from connections import get_pool
+from ratelimit import get_scheduler
+
+
+def _stats(subsystem: Optional[Any]) -> Optional[Dict[str, Any]]:
+    if subsystem is None:
+        return None
+    try:
+        return subsystem.stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def runtime() -> Dict[str, Any]:
+    """Counters kept in memory; cheap enough for the event loop"""
+    # The module singletons are read directly: their get_x() would make them
+    return {
+        "status": "ok",
+        "openai_pool": get_pool().stats(),
+        "openai_scheduler": get_scheduler().stats(),
+        "ytdlp": _stats(metadata._extractor),
+        "transcription": _stats(transcription._transcriber),
+        "coalescing": {flights.name: flights.stats() for flights in recipe_app.FLIGHTS},
+    }
+
+
+def storage() -> Dict[str, Any]:
+    """Entry counts from the cache, job, thumbnail and library databases; blocking"""
+    return {
+        "cache": _stats(cache._store),
+        "jobs": _stats(jobs._runner),
+        "thumbnails": _stats(thumbnails._store),
+        "library": _stats(library._library),
+    }
+
+
+def report() -> Dict[str, Any]:
+    """The whole /health body, for callers that may block (Flask request threads)"""
+    return {**runtime(), **storage()}
@@ -0,0 +1,465 @@
+"""
+AI TikTok Recipe Parser - Background Jobs
+Extractions submitted as jobs, run by a local worker pool and kept in SQLite
+
+Features:
+- POST /jobs returns a job ID immediately; GET /jobs/<id> polls status and result
+- Every streaming event a job produces is stored with a sequence number, so
+  GET /jobs/<id>/events (SSE) can be resumed with Last-Event-ID
+- Jobs run through process_video on the server's event loop, a few at a time,
+  with their OpenAI calls queued behind interactive requests (batch priority)
+- One poller per process claims jobs as slots free up; store calls run on the
+  storage I/O threads and progress events are written in batches, so the
+  event loop never waits on the SQLite write lock
+- Results survive restarts and are served from the store; submitting the same
+  video and location again returns the existing job instead of recomputing
+- Jobs left running by a dead worker are picked up again once their heartbeat
+  goes stale (up to JOBS_MAX_ATTEMPTS runs)
+
+Configuration (environment):
+    JOBS_DB_PATH          SQLite file (default: .cache/jobs.sqlite3)
+    JOBS_WORKERS          jobs run concurrently per server process (default: 4)
+    JOBS_POLL_INTERVAL    seconds between checks for jobs queued by other processes (default: 1)
+    JOBS_STALE_AFTER      seconds without a heartbeat before a running job is retried (default: 120)
+    JOBS_MAX_ATTEMPTS     runs per job before it is marked failed (default: 3)
+    JOBS_RETENTION        seconds to keep finished jobs (default: 30 days)
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import app as recipe_app
+import metrics
+import ratelimit
+from cache import run_io
+from canonical import canonicalize_url
+
+TERMINAL = ("done", "failed")
+
+# SSE comment sent while a job is quiet, so proxies don't close the stream
+KEEPALIVE_SECONDS = 15
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def job_key(url: str, location: str) -> str:
+    """Same (video, location) identity process_video coalesces on"""
+    return f"{canonicalize_url(url).key}|{' '.join(location.split()).casefold()}"
+
+
+class JobStore:
+    """SQLite table of jobs and their event logs, shared by every worker on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                location TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, created_at);
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Per thread and per process, as in cache.SQLiteCache
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, url: str, location: str) -> Tuple[Dict[str, Any], bool]:
+        """Queue a job, or return the live/finished job for the same video and location"""
+        key = job_key(url, location)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status != 'failed' ORDER BY created_at DESC LIMIT 1",
+                (key,)).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return _job(row), False
+            job_id = metrics.new_request_id()
+            conn.execute(
+                "INSERT INTO jobs (id, key, url, location, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, key, url, location, time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row is not None else None
+
+    def status(self, job_id: str) -> Optional[str]:
+        row = self._connect().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def claim(self, owner: str, stale_after: float, max_attempts: int) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job, first reclaiming jobs whose worker stopped heartbeating"""
+        conn = self._connect()
+        now = time.time()
+        # Most polls find nothing; check without taking the write lock first
+        if conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' OR "
+                        "(status = 'running' AND heartbeat_at < ?) LIMIT 1", (now - stale_after,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Worker stopped while running this job', "
+                "finished_at = ? WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (now, now - stale_after, max_attempts))
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?", (now - stale_after,))
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE id = ?", (owner, now, now, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: str):
+        self._connect().execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def append_events(self, job_id: str, events: List[Dict[str, Any]]) -> int:
+        """Store events in order in one transaction; returns the last sequence number"""
+        # One runner owns a job at a time, so MAX(seq) + 1 can't race
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?",
+                               (job_id,)).fetchone()[0]
+            conn.executemany("INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)",
+                             [(job_id, seq + n, json.dumps(event)) for n, event in enumerate(events, 1)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return seq + len(events)
+
+    def events(self, job_id: str, after: int = 0) -> List[Tuple[int, str]]:
+        """Stored events after a sequence number, as (seq, JSON text)"""
+        return [tuple(row) for row in self._connect().execute(
+            "SELECT seq, event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after))]
+
+    def finish(self, job_id: str, recipe: Dict[str, Any]):
+        error = recipe.get("error")
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            ("failed" if error else "done", None if error else json.dumps(recipe), error, time.time(), job_id))
+
+    def prune(self, retention: float) -> int:
+        conn = self._connect()
+        cutoff = time.time() - retention
+        conn.execute("DELETE FROM job_events WHERE job_id IN "
+                     "(SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?)", (cutoff,))
+        return conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                            (cutoff,)).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in ("queued", "running") + TERMINAL}
+        for status, count in self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+
+def _job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = {
+        "id": row["id"],
+        "status": row["status"],
+        "url": row["url"],
+        "location": row["location"],
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    if row["result"] is not None:
+        job["result"] = json.loads(row["result"])
+    if row["error"] is not None:
+        job["error"] = row["error"]
+    return job
+
+
+class JobRunner:
+    """A poller on a server event loop that claims queued jobs and runs a few at a time"""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.workers = int(_env_float("JOBS_WORKERS", 4))
+        self.poll_interval = _env_float("JOBS_POLL_INTERVAL", 1.0)
+        self.stale_after = _env_float("JOBS_STALE_AFTER", 120)
+        self.max_attempts = int(_env_float("JOBS_MAX_ATTEMPTS", 3))
+        self.retention = _env_float("JOBS_RETENTION", 30 * 24 * 3600)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[], None]]] = {}
+        self._running: set = set()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Run the workers on `loop` (once per process; safe to call repeatedly)"""
+        with self._lock:
+            if self._loop is loop and self._pid == os.getpid():
+                return
+            self._loop = loop
+            self._pid = os.getpid()
+        asyncio.run_coroutine_threadsafe(self._run(), loop)
+
+    def wake(self):
+        """Tell the poller a job was queued in this process"""
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None:
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self):
+        self._wake = asyncio.Event()
+        owner = f"{os.uname().nodename}:{os.getpid()}"
+        try:
+            pruned = await run_io(self.store.prune, self.retention)
+            if pruned:
+                print(f"🧹 Pruned {pruned} finished jobs", file=sys.stderr)
+        except sqlite3.Error as e:
+            print(f"⚠️ Job pruning failed: {e}", file=sys.stderr)
+        # One poller per process: it claims a job whenever a slot is free and
+        # otherwise sleeps until woken or the poll interval passes
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            try:
+                job = await run_io(self.store.claim, owner, self.stale_after, self.max_attempts)
+            except sqlite3.Error as e:
+                print(f"⚠️ Job claim failed: {e}", file=sys.stderr)
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            task = asyncio.ensure_future(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _execute(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        print(f"📋 Running job {job_id} (attempt {job['attempts']})", file=sys.stderr)
+
+        # Events arrive synchronously from the pipeline; they are written in
+        # order, in batches, by one flush task at a time
+        pending: List[Dict[str, Any]] = []
+        flushing: Optional[asyncio.Future] = None
+
+        async def flush():
+            while pending:
+                events = pending[:]
+                del pending[:]
+                try:
+                    await run_io(self.store.append_events, job_id, events)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Could not store {len(events)} events for job {job_id}: {e}", file=sys.stderr)
+                self._notify(job_id)
+
+        def publish(event: Dict[str, Any]):
+            nonlocal flushing
+            pending.append(event)
+            if flushing is None or flushing.done():
+                flushing = asyncio.ensure_future(flush())
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.stale_after / 3)
+                try:
+                    await run_io(self.store.heartbeat, job_id)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Job heartbeat failed: {e}", file=sys.stderr)
+
+        beating = asyncio.ensure_future(heartbeat())
+        try:
+            # Jobs are background work: their OpenAI calls wait behind interactive requests
+            with ratelimit.use_priority(ratelimit.BATCH):
+                recipe = await recipe_app.process_video(job["url"], job["location"], streaming_mode=True,
+                                                        event_sink=publish, request_id=job_id)
+        except Exception as e:
+            # process_video reports failures in its result; this is the safety net
+            recipe = {"error": str(e)}
+            publish({"type": "error", "message": f"Processing failed: {str(e)}"})
+        finally:
+            beating.cancel()
+        # Every event is stored before the job is marked finished (see _poll)
+        if flushing is not None:
+            await flushing
+        try:
+            await run_io(self.store.finish, job_id, recipe)
+        except sqlite3.Error as e:
+            # The heartbeat has stopped, so another worker retries the job later
+            print(f"⚠️ Could not finish job {job_id}: {e}", file=sys.stderr)
+        self._notify(job_id)
+
+    # -- subscriptions -------------------------------------------------
+
+    def subscribe(self, job_id: str, callback: Callable[[], None]):
+        with self._lock:
+            self._listeners.setdefault(job_id, []).append(callback)
+
+    def unsubscribe(self, job_id: str, callback: Callable[[], None]):
+        with self._lock:
+            listeners = self._listeners.get(job_id, [])
+            if callback in listeners:
+                listeners.remove(callback)
+            if not listeners:
+                self._listeners.pop(job_id, None)
+
+    def _notify(self, job_id: str):
+        with self._lock:
+            listeners = list(self._listeners.get(job_id, ()))
+        for callback in listeners:
+            callback()
+
+    def _poll(self, job_id: str, after: int) -> Tuple[List[str], int, bool]:
+        """New SSE messages after `after`, the last sequence sent, and whether the job is over"""
+        # Status first: a job's events are all written before it finishes
+        status = self.store.status(job_id)
+        messages = []
+        for seq, event in self.store.events(job_id, after):
+            messages.append(f"id: {seq}\ndata: {event}\n\n")
+            after = seq
+        finished = status in TERMINAL
+        if finished:
+            messages.append(f"data: {json.dumps({'type': 'job', 'id': job_id, 'status': status})}\n\n")
+        return messages, after, finished
+
+    def subscribe_sse(self, job_id: str, last_event_id: int = 0) -> Iterator[str]:
+        """Blocking SSE stream of a job's events (Flask); other processes' jobs are polled"""
+        woken = threading.Event()
+        self.subscribe(job_id, woken.set)
+        try:
+            after, idle = last_event_id, 0.0
+            while True:
+                messages, after, finished = self._poll(job_id, after)
+                yield from messages
+                if finished:
+                    return
+                idle = 0.0 if messages else idle + self.poll_interval
+                if idle >= KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+                woken.wait(self.poll_interval)
+                woken.clear()
+        finally:
+            self.unsubscribe(job_id, woken.set)
+
+    async def subscribe_sse_async(self, job_id: str, last_event_id: int = 0) -> AsyncIterator[str]:
+        """SSE stream of a job's events for the ASGI app"""
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(woken.set)
+
+        self.subscribe(job_id, wake)
+        try:
+            after, idle = last_event_id, 0.0
+            while True:
+                messages, after, finished = await run_io(self._poll, job_id, after)
+                for message in messages:
+                    yield message
+                if finished:
+                    return
+                idle = 0.0 if messages else idle + self.poll_interval
+                if idle >= KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+                try:
+                    await asyncio.wait_for(woken.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                woken.clear()
+        finally:
+            self.unsubscribe(job_id, wake)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"workers": self.workers, "running_here": self._pid == os.getpid()}
+        try:
+            stats.update(self.store.stats())
+        except sqlite3.Error as e:
+            stats["error"] = str(e)
+        return stats
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """Last-Event-ID header (or ?last_event_id=) as a sequence number; 0 replays everything"""
+    try:
+        return max(int(value), 0) if value else 0
+    except ValueError:
+        return 0
+
+
+def job_links(job: Dict[str, Any]) -> Dict[str, Any]:
+    """A job as returned by the API, with URLs for polling and subscribing"""
+    return dict(job, links={"self": f"/jobs/{job['id']}", "events": f"/jobs/{job['id']}/events"})
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    """Return the process-wide job runner (and its store)"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(JobStore(os.environ.get("JOBS_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))))
+    return _runner
@@ -0,0 +1,370 @@
+"""
+AI TikTok Recipe Parser - Recipe Library
+Keeps every extracted recipe and makes them searchable
+
+Features:
+- Recipes stored without per-location costs, under the video's canonical key
+  (and the share-link key it was requested by), so /extract can answer a known
+  video before any yt-dlp or GPT work
+- Inverted index in SQLite over recipe and video titles, ingredients and
+  uploader: one posting per (term, recipe) with a field-weighted rank
+- Queries start from their rarest term and read its postings in rank order,
+  checking the other terms by primary key, so cost follows the result size
+  rather than the library size
+- Ingredient lookup over ingredient names without preparation words
+  ("minced garlic" is filed under "garlic"), fewest-ingredient recipes first
+- Thumbnails are kept as the video's thumbnail ID and source URL, not as
+  served image URLs: a local copy can be evicted and a signed CDN URL expires,
+  so /extract builds them again on every hit
+- One database file per host, shared by every worker (WAL mode)
+
+Configuration (environment):
+    LIBRARY_DB_PATH     SQLite file (default: .cache/library.sqlite3)
+    LIBRARY_LOOKUP      set to 0 to always extract again instead of answering from the library
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from nutrition import DESCRIPTORS
+from thumbnails import thumb_id
+
+# Rank contribution of each field a search term appears in
+TITLE_WEIGHT = 4
+INGREDIENT_WEIGHT = 2
+UPLOADER_WEIGHT = 1
+
+# Ingredient postings share the table under this prefix
+INGREDIENT_PREFIX = "i:"
+
+# Longest ingredient phrase indexed ("extra virgin olive oil" is filed
+# under each run of up to this many words)
+MAX_PHRASE = 3
+
+# Postings of the rarest term read per query before ranking; results deeper
+# than this are ordered by that term's rank alone
+RANK_WINDOW = 1000
+
+MAX_TERMS = 8
+
+# Served with a recipe, but made again from `thumb` and `thumbnail_url` each time
+IMAGE_FIELDS = ("image_url", "image_proxy_url", "image_srcset")
+
+STOPWORDS = {"a", "an", "and", "the", "of", "or", "to", "with", "in", "on", "for", "my", "your", "best", "easy",
+             "recipe", "recipes", "how", "make"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return _WORD.findall(text.encode("ascii", "ignore").decode())
+
+
+def stem(word: str) -> str:
+    """Plural to singular, enough for food words (tomatoes, berries, noodles)"""
+    if len(word) > 5 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def search_terms(text: str) -> List[str]:
+    """Index and query terms for free text, in order, without duplicates"""
+    terms = (stem(word) for word in _words(text) if word not in STOPWORDS)
+    return list(dict.fromkeys(term for term in terms if len(term) > 1 or term.isdigit()))
+
+
+def ingredient_name(name: str) -> str:
+    """An ingredient name as filed: no notes in brackets, no preparation words, singular"""
+    text = re.sub(r"\([^)]*\)", " ", name or "").split(",")[0]
+    return " ".join(stem(word) for word in _words(text) if word not in DESCRIPTORS)
+
+
+def ingredient_phrases(name: str) -> List[str]:
+    """Every run of up to MAX_PHRASE words of a filed ingredient name"""
+    words = ingredient_name(name).split()
+    return list(dict.fromkeys(
+        " ".join(words[start:start + size])
+        for size in range(1, min(MAX_PHRASE, len(words)) + 1)
+        for start in range(len(words) - size + 1)
+    ))
+
+
+def location_free(recipe: Dict[str, Any]) -> Dict[str, Any]:
+    """A served recipe without the costs for the location it was priced for (or its image URLs)"""
+    stored = {key: value for key, value in recipe.items()
+              if key not in ("total_cost_estimate", "error") + IMAGE_FIELDS}
+    stored["ingredients"] = [
+        {key: value for key, value in ingredient.items() if key != "cost"} if isinstance(ingredient, dict)
+        else ingredient
+        for ingredient in recipe.get("ingredients", [])
+    ]
+    return stored
+
+
+def _ingredient_names(recipe: Dict[str, Any]) -> List[str]:
+    return [ingredient.get("name", "") if isinstance(ingredient, dict) else str(ingredient)
+            for ingredient in recipe.get("ingredients", [])]
+
+
+def postings(recipe: Dict[str, Any], video_title: str, uploader: str) -> Dict[str, int]:
+    """term -> rank for one recipe"""
+    ranks: Dict[str, int] = {}
+    fields = [(f"{recipe.get('title', '')} {video_title}", TITLE_WEIGHT), (uploader, UPLOADER_WEIGHT)]
+    fields += [(name, INGREDIENT_WEIGHT) for name in _ingredient_names(recipe)]
+    seen = set()
+    for text, weight in fields:
+        for term in search_terms(text):
+            # Each field counts once per term, however often the term repeats in it
+            if (term, weight) not in seen:
+                seen.add((term, weight))
+                ranks[term] = ranks.get(term, 0) + weight
+    names = _ingredient_names(recipe)
+    for name in names:
+        for phrase in ingredient_phrases(name):
+            # Shorter ingredient lists rank first: they need the least else in the cupboard
+            ranks[INGREDIENT_PREFIX + phrase] = -len(names)
+    return ranks
+
+
+class StoredRecipe(NamedTuple):
+    recipe: Dict[str, Any]
+    thumb: Optional[str]
+    thumbnail_url: str
+
+
+class RecipeLibrary:
+    """Stored recipes and their inverted index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                uploader TEXT NOT NULL,
+                version TEXT NOT NULL,
+                recipe TEXT NOT NULL,
+                terms TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                thumb TEXT,
+                thumbnail_url TEXT
+            );
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                recipe_id INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                rank INTEGER NOT NULL,
+                recipe_id INTEGER NOT NULL,
+                PRIMARY KEY (term, recipe_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_ranked ON postings (term, rank, recipe_id);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Per thread and per process, as in cache.SQLiteCache
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str, version: Optional[str] = None) -> Optional[StoredRecipe]:
+        """The stored recipe for a canonical video key, if it came from this model and prompt"""
+        row = self._connect().execute(
+            "SELECT r.version, r.recipe, r.thumb, r.thumbnail_url FROM aliases a "
+            "JOIN recipes r ON r.id = a.recipe_id WHERE a.alias = ?", (key,)).fetchone()
+        if row is None or (version is not None and row[0] != version):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return StoredRecipe(json.loads(row[1]), row[2], row[3] or "")
+
+    def save(self, keys: Iterable[str], url: str, extra_info: Dict[str, Any], recipe: Dict[str, Any],
+             version: str):
+        """Store a served recipe under its canonical key plus any aliases, and index it
+
+        extra_info["thumbnail_url"] is the video's own (CDN) thumbnail, if it has one.
+        """
+        self.save_many([(list(keys), url, extra_info, recipe, version)])
+
+    def save_many(self, entries: List[Tuple[List[str], str, Dict[str, Any], Dict[str, Any], str]]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for keys, url, extra_info, recipe, version in entries:
+                self._save(conn, keys, url, extra_info, location_free(recipe), version)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.saved += len(entries)
+
+    def _save(self, conn: sqlite3.Connection, keys: List[str], url: str, extra_info: Dict[str, Any],
+              recipe: Dict[str, Any], version: str):
+        key = keys[0]
+        uploader = extra_info.get("uploader") or ""
+        ranks = postings(recipe, extra_info.get("title") or "", uploader)
+        existing = conn.execute("SELECT id, terms FROM recipes WHERE key = ?", (key,)).fetchone()
+        values = (url, recipe.get("title") or extra_info.get("title") or "", uploader, version,
+                  json.dumps(recipe), json.dumps(sorted(ranks)), time.time(),
+                  thumb_id(extra_info), extra_info.get("thumbnail_url") or "")
+        if existing is None:
+            recipe_id = conn.execute(
+                "INSERT INTO recipes (url, title, uploader, version, recipe, terms, updated_at, thumb, "
+                "thumbnail_url, key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values + (key,)).lastrowid
+        else:
+            recipe_id = existing[0]
+            conn.execute("UPDATE recipes SET url = ?, title = ?, uploader = ?, version = ?, recipe = ?, "
+                         "terms = ?, updated_at = ?, thumb = ?, thumbnail_url = ? WHERE id = ?",
+                         values + (recipe_id,))
+            old = json.loads(existing[1])
+            conn.executemany("DELETE FROM postings WHERE term = ? AND recipe_id = ?",
+                             [(term, recipe_id) for term in old])
+            conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(term,) for term in old])
+        conn.executemany("INSERT INTO postings (term, rank, recipe_id) VALUES (?, ?, ?)",
+                         [(term, rank, recipe_id) for term, rank in ranks.items()])
+        conn.executemany("INSERT INTO terms (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                         [(term,) for term in ranks])
+        conn.executemany("INSERT OR REPLACE INTO aliases (alias, recipe_id) VALUES (?, ?)",
+                         [(alias, recipe_id) for alias in dict.fromkeys(keys)])
+
+    def _query(self, terms: List[str], limit: int, offset: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Recipes with every term, best first; also whether more may follow"""
+        terms = list(dict.fromkeys(terms))[:MAX_TERMS]
+        if not terms:
+            return [], False
+        conn = self._connect()
+        placeholders = ", ".join("?" * len(terms))
+        df = dict(conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders}) AND df > 0", terms))
+        if len(df) < len(terms):
+            return [], False
+        # Read postings of the rarest term in rank order; the others are primary-key probes
+        terms.sort(key=lambda term: df[term])
+        joins = "".join(f" CROSS JOIN postings p{n}" for n in range(1, len(terms)))
+        checks = "".join(f" AND p{n}.term = ? AND p{n}.recipe_id = p0.recipe_id" for n in range(1, len(terms)))
+        score = " + ".join(f"p{n}.rank" for n in range(len(terms)))
+        window = max(RANK_WINDOW, offset + limit + 1)
+        rows = conn.execute(
+            f"SELECT recipe_id, score FROM ("
+            f"SELECT p0.recipe_id AS recipe_id, {score} AS score FROM postings p0 INDEXED BY postings_ranked{joins} "
+            f"WHERE p0.term = ?{checks} ORDER BY p0.rank DESC, p0.recipe_id DESC LIMIT ?"
+            f") ORDER BY score DESC, recipe_id DESC LIMIT ? OFFSET ?",
+            [terms[0], *terms[1:], window, limit + 1, offset]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            return [], False
+        stored = {row[0]: row[1:] for row in conn.execute(
+            f"SELECT id, key, url, title, uploader, recipe, thumb, thumbnail_url FROM recipes "
+            f"WHERE id IN ({', '.join('?' * len(rows))})",
+            [row[0] for row in rows])}
+        results = []
+        for recipe_id, score in rows:
+            if recipe_id not in stored:
+                continue
+            key, url, title, uploader, recipe, thumb, thumbnail_url = stored[recipe_id]
+            recipe = json.loads(recipe)
+            summary = {"video": key, "url": url, "title": title, "uploader": uploader,
+                       "ingredients": _ingredient_names(recipe), "score": score}
+            if thumbnail_url:
+                summary["image_url"] = thumbnail_url
+            # The signed CDN URL may have expired; opening the recipe fetches
+            # the thumbnail again if the proxy's copy was evicted
+            if thumb:
+                summary["image_proxy_url"] = f"/thumb/{thumb}"
+            results.append(summary)
+        return results, more
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """Recipes matching every word of a query across titles, ingredients and uploader"""
+        return self._query(search_terms(query), limit, offset)
+
+    def by_ingredients(self, names: List[str], limit: int = 20, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """Recipes that use every ingredient named, fewest ingredients first"""
+        filed = [ingredient_name(name) for name in names]
+        if not all(filed):
+            return [], False
+        return self._query([INGREDIENT_PREFIX + " ".join(name.split()[-MAX_PHRASE:]) for name in filed],
+                           limit, offset)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        return {
+            "recipes": conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0],
+            "terms": conn.execute("SELECT COUNT(*) FROM terms WHERE df > 0").fetchone()[0],
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved": self.saved,
+        }
+
+
+def parse_page(limit: Optional[str], offset: Optional[str], default: int = 20, most: int = 100) -> Tuple[int, int]:
+    """limit and offset query parameters, clamped"""
+    try:
+        limit_value = min(max(int(limit), 1), most) if limit else default
+    except ValueError:
+        limit_value = default
+    try:
+        offset_value = max(int(offset), 0) if offset else 0
+    except ValueError:
+        offset_value = 0
+    return limit_value, offset_value
+
+
+def parse_ingredients(values: List[str]) -> List[str]:
+    """?i=garlic&i=butter or ?ingredients=garlic,butter"""
+    return [name.strip() for value in values for name in value.split(",") if name.strip()]
+
+
+def page(results: List[Dict[str, Any]], more: bool, limit: int, offset: int, took: float,
+         **query: Any) -> Dict[str, Any]:
+    """Response body for a search endpoint"""
+    return {**query, "results": results, "next_offset": offset + limit if more else None,
+            "took_ms": round(took * 1000, 2)}
+
+
+_library: Optional[RecipeLibrary] = None
+_library_lock = threading.Lock()
+
+
+def lookup_enabled() -> bool:
+    return os.environ.get("LIBRARY_LOOKUP", "1") != "0"
+
+
+def get_library() -> RecipeLibrary:
+    """Return the process-wide recipe library"""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = RecipeLibrary(os.environ.get("LIBRARY_DB_PATH", os.path.join(".cache", "library.sqlite3")))
+    return _library
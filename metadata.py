@@ -0,0 +1,190 @@
+"""
+AI TikTok Recipe Parser - Video Metadata
+Reads the few fields the app needs (caption, thumbnail, title, uploader,
+duration) from a video page with yt-dlp
+
+Features:
+- Metadata-only profile: the info_dict is taken as the extractor returns it,
+  skipping format selection, subtitles, comments and playlist expansion
+- One long-lived YoutubeDL per worker thread, so its HTTP session and
+  keep-alive connections carry over from one video to the next
+- A single cookie jar shared by every instance (optionally seeded from a
+  cookies.txt), so consent and session cookies are fetched once
+- Instances rebuilt after a number of uses and after unexpected errors
+
+Configuration (environment):
+    YTDLP_COOKIES           Netscape cookies.txt to seed the shared jar
+    YTDLP_SOCKET_TIMEOUT    seconds per HTTP request (default: 15)
+    YTDLP_RECYCLE_AFTER     extractions before a thread's instance is rebuilt (default: 500)
+"""
+
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+# Imported on first use by _yt_dlp(): it takes a few hundred ms. Benchmarks
+# assign a stub module here instead
+yt_dlp = None
+
+# Result types that point at another page instead of describing the video
+_REFERENCE_TYPES = ("url", "url_transparent")
+
+# Short links (vm.tiktok.com, youtu.be) resolve in one hop; this only guards against loops
+MAX_HOPS = 3
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _yt_dlp():
+    global yt_dlp
+    if yt_dlp is None:
+        import yt_dlp as module
+        yt_dlp = module
+    return yt_dlp
+
+
+def lean_options(socket_timeout: float) -> Dict[str, Any]:
+    """yt-dlp options for reading metadata only"""
+    return {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'simulate': True,
+        'noplaylist': True,
+        'writesubtitles': False,
+        'writeautomaticsub': False,
+        'getcomments': False,
+        'check_formats': False,
+        'socket_timeout': socket_timeout,
+        # YouTube would otherwise fetch DASH/HLS manifests just to list formats
+        'extractor_args': {'youtube': {'skip': ['dash', 'hls', 'translated_subs']}},
+    }
+
+
+def best_thumbnail(info: Dict[str, Any]) -> str:
+    """The thumbnail yt-dlp would pick, without running its processing step"""
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    candidates = [t for t in info.get('thumbnails') or [] if t.get('url')]
+    if not candidates:
+        return ''
+    # Same ordering as YoutubeDL._sort_thumbnails; the last one wins
+    best = max(candidates, key=lambda t: (
+        t.get('preference') if t.get('preference') is not None else -1,
+        t.get('width') if t.get('width') is not None else -1,
+        t.get('height') if t.get('height') is not None else -1,
+        t.get('id') if t.get('id') is not None else '',
+        t.get('url')))
+    return best['url']
+
+
+class MetadataExtractor:
+    """Per-thread YoutubeDL instances sharing one cookie jar"""
+
+    def __init__(self):
+        self.options = lean_options(_env_float("YTDLP_SOCKET_TIMEOUT", 15))
+        self.recycle_after = int(_env_float("YTDLP_RECYCLE_AFTER", 500))
+        from yt_dlp.cookies import YoutubeDLCookieJar
+        self.cookies = YoutubeDLCookieJar(os.environ.get("YTDLP_COOKIES") or None)
+        if self.cookies.filename and os.path.exists(self.cookies.filename):
+            try:
+                self.cookies.load()
+            except Exception as e:
+                print(f"⚠️ Could not load yt-dlp cookies: {e}", file=sys.stderr)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.extractions = 0
+        self.instances = 0
+        self.recycled = 0
+        self.failures = 0
+
+    def _instance(self):
+        """This thread's YoutubeDL, built on first use and after fork"""
+        local = self._local
+        ydl = getattr(local, "ydl", None)
+        if ydl is not None and (local.pid != os.getpid() or local.uses >= self.recycle_after):
+            if local.pid == os.getpid():
+                self.recycled += 1
+            self._discard()
+            ydl = None
+        if ydl is None:
+            ydl = _yt_dlp().YoutubeDL(dict(self.options))
+            # cookiejar is a lazily computed property; setting it before the
+            # first request makes this instance's HTTP session use the shared jar
+            ydl.__dict__['cookiejar'] = self.cookies
+            local.ydl, local.pid, local.uses = ydl, os.getpid(), 0
+            with self._lock:
+                self.instances += 1
+        local.uses += 1
+        return ydl
+
+    def _discard(self):
+        ydl = getattr(self._local, "ydl", None)
+        self._local.ydl = None
+        # A connection inherited across fork belongs to the parent; leave it alone
+        if ydl is not None and self._local.pid == os.getpid():
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+    def extract(self, url: str) -> Dict[str, Any]:
+        """The extractor's info_dict for a video URL, with short links followed"""
+        from yt_dlp.utils import DownloadError
+        ydl = self._instance()
+        try:
+            info = ydl.extract_info(url, download=False, process=False)
+            for _ in range(MAX_HOPS):
+                if not info or info.get('_type') not in _REFERENCE_TYPES:
+                    break
+                target = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+                if info['_type'] == 'url_transparent' and target:
+                    # As yt-dlp does: fields set on the reference override the target's
+                    target = dict(target, **{key: value for key, value in info.items()
+                                             if value is not None and key not in ('_type', 'url', 'ie_key')})
+                info = target
+        except DownloadError:
+            # The site said no (private, removed, geo-blocked); the instance is fine
+            with self._lock:
+                self.failures += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            self._discard()
+            raise
+        with self._lock:
+            self.extractions += 1
+        info = dict(info or {})
+        info['thumbnail'] = best_thumbnail(info)
+        return info
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "extractions": self.extractions,
+            "instances": self.instances,
+            "recycled": self.recycled,
+            "failures": self.failures,
+            "cookies": len(self.cookies),
+        }
+
+
+_extractor: Optional[MetadataExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor() -> MetadataExtractor:
+    """Return the process-wide metadata extractor"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = MetadataExtractor()
+    return _extractor
@@ -0,0 +1,274 @@
+"""
+AI TikTok Recipe Parser - Instrumentation
+Per-stage latency spans, token/cost accounting and a Prometheus exporter
+
+Features:
+- RequestTrace: monotonic-clock spans per request, carried in a context variable
+- Counters and histograms rendered in the Prometheus text format for /metrics
+- One structured JSON log line per request with its request ID
+- Gauges collected at scrape time (connection pool, coalescing)
+
+Configuration (environment):
+    METRICS_JSON_LOGS        set to 0 to disable per-request JSON log lines
+    OPENAI_PROMPT_PRICE      USD per 1M prompt tokens (default: gpt-3.5-turbo list price)
+    OPENAI_COMPLETION_PRICE  USD per 1M completion tokens
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextlib
+import contextvars
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# USD per 1M tokens: (prompt, completion)
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+JSON_LOGS = os.environ.get("METRICS_JSON_LOGS", "1") != "0"
+
+INF_LABEL = 'le="+Inf"'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[Any]] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, INF_LABEL)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """collector() yields (name, help, labels, value) gauge samples at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        seen = set()
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}", file=sys.stderr)
+                continue
+            for name, help_text, labels, value in samples:
+                if value is None:
+                    continue
+                if name not in seen:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} gauge")
+                    seen.add(name)
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "recipe_stage_seconds", "Latency of each extraction pipeline stage", ("stage",))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "recipe_request_seconds", "End-to-end extraction latency", ("outcome",))
+REQUESTS = REGISTRY.counter(
+    "recipe_requests_total", "Extraction requests by outcome", ("outcome",))
+CACHE_LOOKUPS = REGISTRY.counter(
+    "recipe_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+OPENAI_TOKENS = REGISTRY.counter(
+    "openai_tokens_total", "OpenAI tokens used", ("model", "kind"))
+OPENAI_COST = REGISTRY.counter(
+    "openai_cost_usd_total", "Estimated OpenAI spend in USD", ("model",))
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "recipe_prompt_tokens_saved_total", "Estimated prompt tokens removed by caption cleaning")
+REJECTIONS = REGISTRY.counter(
+    "recipe_rejections_total", "Captions with nothing left once cleaned, rejected before the GPT call", ("reason",))
+OPENAI_QUEUE_WAIT = REGISTRY.histogram(
+    "openai_queue_wait_seconds", "Time OpenAI calls waited for rate-limit admission", ("priority",))
+OPENAI_RETRIES = REGISTRY.counter(
+    "openai_retries_total", "OpenAI calls retried after a 429, timeout or server error", ("reason",))
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of one call, using env overrides or the price table"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-3.5-turbo"])
+    prompt_price = float(os.environ.get("OPENAI_PROMPT_PRICE", prompt_price))
+    completion_price = float(os.environ.get("OPENAI_COMPLETION_PRICE", completion_price))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class RequestTrace:
+    """Spans and attributes recorded for one extraction request"""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or new_request_id()
+        self.started = time.monotonic()
+        self.spans: Dict[str, float] = {}
+        self.attributes: Dict[str, Any] = {}
+
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - start)
+
+    def record(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def cache_lookup(self, cache: str, hit: bool):
+        self.attributes[f"{cache}_cache"] = "hit" if hit else "miss"
+        CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+    def usage(self, model: str, prompt_tokens: int, completion_tokens: int):
+        cost = token_cost(model, prompt_tokens, completion_tokens)
+        tokens = self.attributes.setdefault("tokens", {"prompt": 0, "completion": 0})
+        tokens["prompt"] += prompt_tokens
+        tokens["completion"] += completion_tokens
+        self.attributes["cost_usd"] = round(self.attributes.get("cost_usd", 0.0) + cost, 6)
+        OPENAI_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        OPENAI_TOKENS.inc(completion_tokens, model=model, kind="completion")
+        OPENAI_COST.inc(cost, model=model)
+
+    def caption(self, tokens_saved: int, rejected: Optional[str] = None):
+        self.attributes["prompt_tokens_saved"] = tokens_saved
+        PROMPT_TOKENS_SAVED.inc(tokens_saved)
+        if rejected:
+            self.attributes["rejected"] = rejected
+            REJECTIONS.inc(reason=rejected)
+
+    def finish(self, outcome: str, **attributes: Any) -> float:
+        """Close the trace: observe totals and write the structured log line"""
+        total = time.monotonic() - self.started
+        REQUESTS.inc(outcome=outcome)
+        REQUEST_SECONDS.observe(total, outcome=outcome)
+        self.attributes.update(attributes)
+        if JSON_LOGS:
+            print(json.dumps({
+                "event": "extraction",
+                "request_id": self.request_id,
+                "outcome": outcome,
+                "total_ms": round(total * 1000, 2),
+                "spans_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.spans.items()},
+                **self.attributes,
+            }), file=sys.stderr)
+        return total
+
+
+class _NullTrace(RequestTrace):
+    """Stand-in when no request is being traced: keeps metrics, skips the log line"""
+
+    def finish(self, outcome: str, **attributes: Any) -> float:
+        return 0.0
+
+
+_current: "contextvars.ContextVar[Optional[RequestTrace]]" = contextvars.ContextVar("recipe_trace", default=None)
+
+
+def current_trace() -> RequestTrace:
+    """The trace of the request this coroutine is serving"""
+    trace = _current.get()
+    return trace if trace is not None else _NullTrace("-")
+
+
+@contextlib.contextmanager
+def use_trace(trace: RequestTrace):
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
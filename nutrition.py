@@ -0,0 +1,283 @@
+"""
+AI TikTok Recipe Parser - Nutrition Engine
+Computes ingredient and recipe macros locally instead of asking GPT for them
+
+Features:
+- Compact food table (data/foods.csv) held in numpy arrays, indexed by name and alias
+- Ingredient-name matcher: exact, descriptor-stripped, singular, then longest phrase
+- Amount parser: fractions, ranges, mass/volume/count units, "1 (14 oz) can"
+- Vectorized per-ingredient and total macros for a whole recipe in one pass
+
+GPT only returns ingredient names and amounts; everything numeric comes from
+here, so the numbers are consistent between recipes and cost no output tokens.
+"""
+
+import os
+import re
+import csv
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# numpy is imported where the table is built and used, so importing this
+# module for its constants (captions.py, library.py) stays cheap
+
+FOOD_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv")
+
+# Column order of NutritionTable.values (per 100 g)
+MACROS = ("protein_g", "carbs_g", "fat_g", "calories")
+
+MASS_UNITS = {
+    "g": 1.0, "gram": 1.0, "grams": 1.0, "gr": 1.0,
+    "kg": 1000.0, "kilogram": 1000.0, "kilograms": 1000.0,
+    "mg": 0.001,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35,
+    "lb": 453.6, "lbs": 453.6, "pound": 453.6, "pounds": 453.6,
+}
+
+VOLUME_UNITS = {  # millilitres
+    "ml": 1.0, "milliliter": 1.0, "milliliters": 1.0, "millilitre": 1.0, "millilitres": 1.0,
+    "cl": 10.0, "dl": 100.0,
+    "l": 1000.0, "liter": 1000.0, "liters": 1000.0, "litre": 1000.0, "litres": 1000.0,
+    "tsp": 4.93, "teaspoon": 4.93, "teaspoons": 4.93,
+    "tbsp": 14.79, "tablespoon": 14.79, "tablespoons": 14.79, "tbs": 14.79, "tbl": 14.79,
+    "cup": 236.6, "cups": 236.6, "c": 236.6,
+    "fl oz": 29.57, "fluid ounce": 29.57, "fluid ounces": 29.57,
+    "pint": 473.2, "pints": 473.2, "quart": 946.4, "quarts": 946.4,
+}
+
+# Units that mean "one of the food itself" (its unit_g weight)
+ITEM_UNITS = {
+    "clove", "cloves", "piece", "pieces", "whole", "item", "items", "slice", "slices",
+    "fillet", "fillets", "breast", "breasts", "thigh", "thighs", "stalk", "stalks",
+    "large", "medium", "small", "egg", "eggs", "head", "heads",
+}
+
+# Containers and loose measures, in grams when the food has no better figure
+CONTAINER_GRAMS = {
+    "can": 400.0, "cans": 400.0, "tin": 400.0, "tins": 400.0, "jar": 350.0, "jars": 350.0,
+    "package": 250.0, "packages": 250.0, "pack": 250.0, "packet": 250.0, "bag": 300.0,
+    "block": 400.0, "blocks": 400.0, "stick": 113.0, "sticks": 113.0,
+    "bunch": 50.0, "bunches": 50.0, "handful": 30.0, "handfuls": 30.0,
+    "sprig": 1.0, "sprigs": 1.0, "head": 500.0, "heads": 500.0,
+    "pinch": 0.4, "pinches": 0.4, "dash": 0.6, "dashes": 0.6, "drizzle": 5.0, "splash": 10.0,
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "half": 0.5, "dozen": 12, "couple": 2, "few": 3,
+}
+
+UNICODE_FRACTIONS = {"½": " 1/2", "⅓": " 1/3", "⅔": " 2/3", "¼": " 1/4", "¾": " 3/4",
+                     "⅛": " 1/8", "⅕": " 1/5", "⅙": " 1/6"}
+
+# Words that describe preparation rather than the food
+DESCRIPTORS = {
+    "fresh", "freshly", "chopped", "minced", "diced", "sliced", "grated", "shredded", "crushed",
+    "large", "small", "medium", "boneless", "skinless", "raw", "finely", "roughly", "thinly",
+    "peeled", "drained", "rinsed", "organic", "optional", "softened", "melted", "room",
+    "temperature", "cold", "warm", "hot", "packed", "heaping", "level", "cubed", "halved",
+    "quartered", "trimmed", "divided", "plus", "more", "extra", "about", "roughly", "juiced",
+    "zested", "beaten", "whisked", "toasted", "roasted", "crispy", "of", "and", "or", "for",
+    "garnish", "serving", "taste", "to", "the", "some", "your", "favorite", "favourite",
+}
+
+_QUANTITY = r"(\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+)"
+_AMOUNT = re.compile(rf"^\s*{_QUANTITY}(?:\s*(?:-|–|to)\s*{_QUANTITY})?\s*(.*)$")
+_PAREN_MEASURE = re.compile(rf"\(\s*{_QUANTITY}\s*-?\s*([a-z. ]+?)\s*\)")
+_WORD = re.compile(r"[a-z0-9%]+")
+
+
+def _number(text: str) -> float:
+    text = text.strip()
+    if " " in text:
+        whole, fraction = text.split(None, 1)
+        return float(whole) + _number(fraction)
+    if "/" in text:
+        numerator, denominator = text.split("/", 1)
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text)
+
+
+def _unit(rest: str) -> Tuple[Optional[str], str]:
+    """Split a known unit off the front of text: (unit, remainder)"""
+    rest = rest.strip().lstrip(".").strip()
+    words = rest.split()
+    if len(words) >= 2 and f"{words[0]} {words[1]}".rstrip(".") in VOLUME_UNITS:
+        return f"{words[0]} {words[1]}".rstrip("."), " ".join(words[2:])
+    if words:
+        word = words[0].rstrip(".,")
+        if word in MASS_UNITS or word in VOLUME_UNITS or word in ITEM_UNITS or word in CONTAINER_GRAMS:
+            return word, " ".join(words[1:])
+    # "200g", "2tbsp"
+    match = re.match(r"^([a-z]+)\b", rest)
+    if match and (match.group(1) in MASS_UNITS or match.group(1) in VOLUME_UNITS):
+        return match.group(1), rest[match.end():]
+    return None, rest
+
+
+def parse_amount(amount: str) -> Tuple[Optional[float], Optional[str], str]:
+    """Parse "1 1/2 cups", "2-3 cloves", "200g", "a pinch" into (quantity, unit, leftover text)"""
+    text = (amount or "").lower()
+    for symbol, replacement in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, replacement)
+    text = text.strip()
+
+    quantity: Optional[float] = None
+    match = _AMOUNT.match(text)
+    if match:
+        low = _number(match.group(1))
+        high = _number(match.group(2)) if match.group(2) else low
+        quantity = (low + high) / 2
+        text = match.group(3)
+    else:
+        words = text.split(None, 1)
+        if words and words[0] in NUMBER_WORDS:
+            quantity = float(NUMBER_WORDS[words[0]])
+            text = words[1] if len(words) > 1 else ""
+
+    # "1 (14 oz) can": the measure in brackets is the size of each item
+    inner = _PAREN_MEASURE.search(text)
+    if inner:
+        inner_unit, _ = _unit(inner.group(2))
+        if inner_unit in MASS_UNITS or inner_unit in VOLUME_UNITS:
+            size = _number(inner.group(1))
+            return (quantity or 1.0) * size, inner_unit, _PAREN_MEASURE.sub(" ", text)
+
+    unit, rest = _unit(text)
+    if quantity is None and unit is not None:
+        quantity = 1.0
+    return quantity, unit, rest
+
+
+class NutritionTable:
+    """Per-100 g macros for common foods, with a name/alias index"""
+
+    def __init__(self, path: str = FOOD_TABLE):
+        import numpy as np
+        names: List[str] = []
+        rows: List[List[float]] = []
+        unit_grams: List[float] = []
+        densities: List[float] = []
+        self.index: Dict[str, int] = {}
+        with open(path, encoding="utf-8") as f:
+            reader = csv.DictReader(line for line in f if not line.startswith("#"))
+            for row in reader:
+                position = len(names)
+                names.append(row["name"])
+                rows.append([float(row[column]) for column in ("protein_g", "carbs_g", "fat_g", "kcal")])
+                unit_grams.append(float(row["unit_g"]) if row["unit_g"] else np.nan)
+                densities.append(float(row["density"]) if row["density"] else np.nan)
+                for alias in [row["name"], *filter(None, row["aliases"].split(";"))]:
+                    self.index.setdefault(alias.strip().lower(), position)
+        self.names = names
+        self.values = np.array(rows, dtype=np.float64)
+        self.unit_grams = np.array(unit_grams, dtype=np.float64)
+        self.densities = np.array(densities, dtype=np.float64)
+        self.longest_alias = max(len(alias.split()) for alias in self.index)
+
+    def _lookup(self, phrase: str) -> Optional[int]:
+        if phrase in self.index:
+            return self.index[phrase]
+        for suffix in ("es", "s"):
+            if phrase.endswith(suffix) and phrase[:-len(suffix)] in self.index:
+                return self.index[phrase[:-len(suffix)]]
+        return None
+
+    def match(self, name: str) -> Optional[int]:
+        """Row for an ingredient name, or None when nothing plausible matches"""
+        text = re.sub(r"\([^)]*\)", " ", (name or "").lower()).split(",")[0]
+        words = _WORD.findall(text)
+        if not words:
+            return None
+        found = self._lookup(" ".join(words))
+        if found is not None:
+            return found
+        core = [word for word in words if word not in DESCRIPTORS]
+        found = self._lookup(" ".join(core))
+        if found is not None:
+            return found
+        # Longest known phrase, preferring the end of the name ("... chicken thighs")
+        for size in range(min(len(core), self.longest_alias), 0, -1):
+            for start in range(len(core) - size, -1, -1):
+                found = self._lookup(" ".join(core[start:start + size]))
+                if found is not None:
+                    return found
+        return None
+
+    def grams(self, row: int, amount: str, name: str = "") -> Optional[float]:
+        """Weight in grams of an ingredient amount, or None if it can't be resolved"""
+        quantity, unit, _ = parse_amount(amount)
+        if quantity is None and name:
+            # Amount sometimes lands in the name: "2 cloves garlic"
+            quantity, unit, _ = parse_amount(name)
+        if quantity is None:
+            # "to taste", "for garnish": negligible
+            return 0.0 if re.search(r"taste|garnish|serving|optional", (amount or "").lower()) else None
+        if unit in MASS_UNITS:
+            return quantity * MASS_UNITS[unit]
+        if unit in VOLUME_UNITS:
+            density = self.densities[row]
+            return quantity * VOLUME_UNITS[unit] * (1.0 if math.isnan(density) else density)
+        each = self.unit_grams[row]
+        if (unit is None or unit in ITEM_UNITS) and not math.isnan(each):
+            return quantity * each
+        if unit in CONTAINER_GRAMS:
+            return quantity * CONTAINER_GRAMS[unit]
+        return None
+
+    def compute(self, ingredients: List[Dict[str, Any]]) -> Tuple["np.ndarray", "np.ndarray", List[str]]:
+        """Macros per ingredient (rows in MACROS order), their totals, and unmatched names"""
+        import numpy as np
+        rows = np.full(len(ingredients), -1, dtype=np.int64)
+        grams = np.zeros(len(ingredients), dtype=np.float64)
+        unmatched = []
+        for position, ingredient in enumerate(ingredients):
+            name = str(ingredient.get("name", ""))
+            row = self.match(name)
+            weight = self.grams(row, str(ingredient.get("amount", "")), name) if row is not None else None
+            if row is None or weight is None:
+                unmatched.append(name)
+                continue
+            rows[position] = row
+            grams[position] = weight
+        known = rows >= 0
+        per_ingredient = np.zeros((len(ingredients), len(MACROS)), dtype=np.float64)
+        per_ingredient[known] = self.values[rows[known]] * (grams[known, None] / 100.0)
+        return per_ingredient, per_ingredient.sum(axis=0), unmatched
+
+
+def _macros(values: "np.ndarray") -> Dict[str, float]:
+    protein, carbs, fat, calories = (float(v) for v in values)
+    return {"protein_g": round(protein, 1), "carbs_g": round(carbs, 1), "fat_g": round(fat, 1),
+            "calories": int(round(calories))}
+
+
+def annotate(recipe: Dict[str, Any], table: Optional[NutritionTable] = None) -> Dict[str, Any]:
+    """Copy of a recipe with per-ingredient macros and total_macros filled in locally"""
+    table = table or get_table()
+    recipe = dict(recipe)
+    ingredients = [i for i in recipe.get("ingredients", []) if isinstance(i, dict)]
+    per_ingredient, totals, unmatched = table.compute(ingredients)
+    recipe["ingredients"] = [dict(ingredient, **_macros(values))
+                             for ingredient, values in zip(ingredients, per_ingredient)]
+    recipe["total_macros"] = _macros(totals)
+    if unmatched:
+        # Reported so the totals can be read as a lower bound
+        recipe["nutrition_unmatched"] = unmatched
+    return recipe
+
+
+# Process-wide table (loaded on first use)
+_table: Optional[NutritionTable] = None
+_table_lock = threading.Lock()
+
+
+def get_table() -> NutritionTable:
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = NutritionTable()
+    return _table
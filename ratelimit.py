@@ -0,0 +1,335 @@
+"""
+AI TikTok Recipe Parser - OpenAI Rate-Limit Scheduler
+Admits every OpenAI call through request and token budgets, with priorities and retries
+
+Features:
+- Requests-per-minute and tokens-per-minute token buckets, re-synced from the
+  x-ratelimit-limit/remaining-* response headers (read by the connection
+  pool's response hook)
+- Priority admission: interactive requests are dispatched ahead of batch work
+- Jittered exponential backoff on 429s, timeouts and 5xx, honouring Retry-After;
+  a 429 pauses admission for everyone until the retry
+- Queue depth, wait time, retries and remaining budgets exported as metrics
+
+Configuration (environment):
+    OPENAI_RPM            request budget until headers report the real one (default: 3500)
+    OPENAI_TPM            token budget until headers report the real one (default: 200000)
+    OPENAI_MAX_RETRIES    retries per call after the first attempt (default: 4)
+    OPENAI_BACKOFF_BASE   first backoff step in seconds (default: 0.5)
+    OPENAI_BACKOFF_MAX    backoff ceiling in seconds (default: 20)
+
+Each call is scheduled on the event loop that makes it; all state lives on
+that loop, so no thread locking is needed.
+"""
+
+import os
+import re
+import sys
+import time
+import heapq
+import random
+import asyncio
+import threading
+import contextlib
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_priority: "contextvars.ContextVar[int]" = contextvars.ContextVar("openai_priority", default=INTERACTIVE)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After or x-ratelimit-reset-* value such as "6m0s", "1.5s" or "20ms\""""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts) if parts else None
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """What OpenAI counts against the TPM budget at admission: prompt estimate plus max_tokens"""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+
+@contextlib.contextmanager
+def use_priority(priority: int):
+    """Run OpenAI calls made in this context (and tasks it starts) at a priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Continuously refilling budget of `limit` units per minute"""
+
+    def __init__(self, per_minute: float):
+        self.limit = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (oversized requests wait for a full bucket)"""
+        self.refill(now)
+        needed = min(amount, self.limit)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60.0 / self.limit
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the server's view of the budget"""
+        self.refill(now)
+        if limit:
+            self.limit = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining, self.limit)
+
+
+class RateLimitScheduler:
+    """Priority admission queue in front of the OpenAI client"""
+
+    def __init__(self):
+        self.requests = TokenBucket(_env_float("OPENAI_RPM", 3500))
+        self.tokens = TokenBucket(_env_float("OPENAI_TPM", 200000))
+        self.max_retries = int(_env_float("OPENAI_MAX_RETRIES", 4))
+        self.backoff_base = _env_float("OPENAI_BACKOFF_BASE", 0.5)
+        self.backoff_max = _env_float("OPENAI_BACKOFF_MAX", 20)
+
+        self.blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, int, int, "asyncio.Future[float]"]] = []
+        self._sequence = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.admitted = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.headers_seen = 0
+
+    # -- admission -----------------------------------------------------
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # New loop (fork, or a fresh asyncio.run): waiters on the old one are gone
+            self._loop = loop
+            self._waiters = []
+            self._timer = None
+        return loop
+
+    def _delay(self, requests: int, tokens: int, now: float) -> float:
+        return max(self.blocked_until - now,
+                   self.requests.wait_time(requests, now),
+                   self.tokens.wait_time(tokens, now))
+
+    def _take(self, requests: int, tokens: int):
+        self.requests.level -= requests
+        self.tokens.level -= min(tokens, self.tokens.limit)
+        self.admitted += 1
+
+    async def acquire(self, requests: int, tokens: int, priority: int) -> float:
+        """Wait for budget; returns the seconds spent queued"""
+        loop = self._bind()
+        if not self._waiters and self._delay(requests, tokens, time.monotonic()) <= 0:
+            self._take(requests, tokens)
+            return 0.0
+        start = time.monotonic()
+        future: "asyncio.Future[float]" = loop.create_future()
+        self._sequence += 1
+        heapq.heappush(self._waiters, (priority, self._sequence, requests, tokens, future))
+        self._dispatch()
+        await future
+        return time.monotonic() - start
+
+    def _dispatch(self):
+        self._timer = None
+        while self._waiters:
+            priority, _, requests, tokens, future = self._waiters[0]
+            if future.done():  # caller went away
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._delay(requests, tokens, time.monotonic())
+            if delay > 0:
+                # Strict priority: nothing overtakes the head of the queue
+                self._timer = self._loop.call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._take(requests, tokens)
+            future.set_result(0.0)
+
+    def _wake(self):
+        if self._loop is not None and self._waiters:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._loop.call_soon_threadsafe(self._dispatch)
+
+    # -- calls ---------------------------------------------------------
+
+    async def call(self, make_request: Callable[[], Awaitable[Any]], tokens: int = 0,
+                   priority: Optional[int] = None, retries: Optional[int] = None,
+                   requests: int = 1) -> Any:
+        """Admit, run and (on 429/timeout/5xx) retry one OpenAI request
+
+        requests=0 admits a call that doesn't count against the completion
+        budget (warm-ups) but still waits out queues and 429 pauses.
+        """
+        priority = _priority.get() if priority is None else priority
+        retries = self.max_retries if retries is None else retries
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        trace = metrics.current_trace()
+        for attempt in range(retries + 1):
+            waited = await self.acquire(requests, tokens, priority)
+            self.wait_seconds += waited
+            metrics.OPENAI_QUEUE_WAIT.observe(waited, priority=label)
+            if waited:
+                trace.record("openai_queue_wait", waited)
+            try:
+                return await make_request()
+            except Exception as e:
+                reason = _reason(e)
+                if reason is None or attempt >= retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self.retries += 1
+                metrics.OPENAI_RETRIES.inc(reason=reason)
+                print(f"⏳ OpenAI {reason}, retry {attempt + 1}/{retries} in {delay:.2f}s", file=sys.stderr)
+                if reason == "rate_limited":
+                    # Everyone waits out a 429, not just this caller
+                    self.throttled += 1
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+                    self._wake()
+                await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        # Full jitter keeps workers that were throttled together from retrying together
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    # -- feedback from responses ---------------------------------------
+
+    def observe(self, headers):
+        """Update budgets from x-ratelimit-* response headers"""
+        if "x-ratelimit-limit-requests" not in headers and "x-ratelimit-remaining-requests" not in headers:
+            return
+        self.headers_seen += 1
+        now = time.monotonic()
+        self.requests.sync(_number(headers.get("x-ratelimit-limit-requests")),
+                           _number(headers.get("x-ratelimit-remaining-requests")), now)
+        self.tokens.sync(_number(headers.get("x-ratelimit-limit-tokens")),
+                         _number(headers.get("x-ratelimit-remaining-tokens")), now)
+        # x-ratelimit-reset-* is the time until the budget is full again, which
+        # the buckets' own refill already models, so it isn't used as a pause
+        self._wake()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, _, future in list(self._waiters):
+            if not future.done():
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                depth[name] = depth.get(name, 0) + 1
+        return {
+            "rpm_limit": self.requests.limit,
+            "rpm_remaining": round(self.requests.level, 1),
+            "tpm_limit": self.tokens.limit,
+            "tpm_remaining": round(self.tokens.level),
+            "queue_depth": depth,
+            "admitted": self.admitted,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self.wait_seconds * 1000 / self.admitted, 2) if self.admitted else 0.0,
+            "paused_for_s": round(max(self.blocked_until - now, 0.0), 2),
+            "headers_seen": self.headers_seen,
+        }
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _reason(error: Exception) -> Optional[str]:
+    """Why a failed call is worth retrying, or None if it isn't"""
+    # Imported here rather than at the top: openai takes a few hundred ms to
+    # import, and it is always loaded by the time one of its calls fails
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection_error"
+    if isinstance(error, openai.InternalServerError):
+        return "server_error"
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    milliseconds = _number(headers.get("retry-after-ms"))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    return parse_duration(headers.get("retry-after"))
+
+
+def _scheduler_gauges():
+    """Point-in-time gauges for /metrics"""
+    if _scheduler is None:
+        return
+    stats = _scheduler.stats()
+    for name, depth in stats["queue_depth"].items():
+        yield ("openai_queue_depth", "OpenAI calls waiting for admission", {"priority": name}, depth)
+    yield ("openai_budget_remaining", "Remaining OpenAI budget this minute", {"kind": "requests"}, stats["rpm_remaining"])
+    yield ("openai_budget_remaining", "Remaining OpenAI budget this minute", {"kind": "tokens"}, stats["tpm_remaining"])
+    yield ("openai_budget_limit", "OpenAI per-minute budget", {"kind": "requests"}, stats["rpm_limit"])
+    yield ("openai_budget_limit", "OpenAI per-minute budget", {"kind": "tokens"}, stats["tpm_limit"])
+
+metrics.REGISTRY.register_collector(_scheduler_gauges)
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Return the process-wide OpenAI scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler()
+    return _scheduler
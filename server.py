@@ -1,8 +1,15 @@
 import os
 import json
-import subprocess
+import time
 from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
+import app as recipe_app
+import metrics
+import jobs
+import health
+import library
+import thumbnails
+from engine import get_engine
 
 # Try to load environment variables from .env file
 try:
@@ -15,7 +22,10 @@ except ImportError:
 def create_app(test_config=None):
     app = Flask(__name__, static_folder='web/dist', static_url_path='/')
     CORS(app)
-    app.config.from_mapping(SECRET_KEY='dev')
+    app.config.from_mapping(
+        SECRET_KEY='dev',
+        BATCH_MAX_ITEMS=int(os.environ.get('BATCH_MAX_ITEMS', 1000)),
+    )
 
     if test_config is not None:
         app.config.update(test_config)
@@ -32,42 +42,16 @@ def create_app(test_config=None):
             print("DEBUG: No location provided")
             return jsonify({"error": "No location provided"}), 400
 
+        request_id = request.headers.get('X-Request-ID') or metrics.new_request_id()
         print(f"DEBUG: Received URL: {url}")
         print(f"DEBUG: Received location: {location}")
 
         try:
-            # Run the consolidated app script and capture output
-            result = subprocess.run(
-                ['python3', 'app.py', url, location],
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
-
-            print("DEBUG: Completed subprocess call.")
-            print("DEBUG: STDOUT from app.py:\n", result.stdout)
-            print("DEBUG: STDERR from app.py:\n", result.stderr)
-            print("DEBUG: Return code:", result.returncode)
-
-            if result.returncode != 0:
-                # The command failed
-                print("ERROR: subprocess returned a non-zero exit code.")
-                return jsonify({"error": f"Failed to process video. Return code: {result.returncode}. STDERR: {result.stderr}"}), 500
-
-            # Attempt to parse JSON from stdout
-            recipe_data = json.loads(result.stdout)
-            print("DEBUG: JSON parsing successful.")
-            return jsonify(recipe_data), 200
-
-        except subprocess.CalledProcessError as e:
-            print("ERROR: subprocess.CalledProcessError encountered.")
-            print("STDOUT:", e.stdout)
-            print("STDERR:", e.stderr)
-            return jsonify({"error": f"Failed to process video: {str(e)}"}), 500
-        except json.JSONDecodeError as je:
-            print("ERROR: JSONDecodeError encountered.")
-            print("RAW output that caused error:", result.stdout)
-            return jsonify({"error": "Invalid JSON output from app.py"}), 500
+            # Run the extraction on the shared in-process engine
+            recipe_data = get_engine().extract(url, location, request_id=request_id)
+            print("DEBUG: Extraction completed.")
+            return jsonify(recipe_data), 200, {'X-Request-ID': request_id}
+
         except Exception as ex:
             print("ERROR: Unexpected exception encountered.")
             print("Exception details:", ex)
@@ -85,37 +69,14 @@ def create_app(test_config=None):
         if not location:
             return jsonify({"error": "No location provided"}), 400
 
+        request_id = request.headers.get('X-Request-ID') or metrics.new_request_id()
         print(f"DEBUG: Starting streaming extraction for URL: {url}")
         print(f"DEBUG: Location: {location}")
 
         def generate_stream():
             """Generate Server-Sent Events"""
             try:
-                # Run the streaming version of the app
-                import subprocess
-                process = subprocess.Popen(
-                    ['python3', 'app.py', url, location, '--stream'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8'
-                )
-                
-                # Read the output line by line
-                for line in iter(process.stdout.readline, ''):
-                    if line.strip():
-                        yield line
-                
-                # Wait for process to complete
-                process.wait()
-                
-                if process.returncode != 0:
-                    error_data = {
-                        "type": "error",
-                        "message": f"Processing failed with return code {process.returncode}"
-                    }
-                    yield f"data: {json.dumps(error_data)}\n\n"
-                    
+                yield from get_engine().stream(url, location, request_id=request_id)
             except Exception as e:
                 error_data = {
                     "type": "error",
@@ -130,14 +91,129 @@ def create_app(test_config=None):
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Cache-Control'
+                'Access-Control-Allow-Headers': 'Cache-Control',
+                'X-Request-ID': request_id
             }
         )
 
+    @app.route('/extract-batch', methods=['POST'])
+    def extract_batch():
+        """Batch endpoint streaming one NDJSON record per URL as each finishes"""
+        data = request.get_json() or {}
+        items = data.get('items')
+        if items is None and data.get('urls') is not None:
+            items = [{"url": url} for url in data['urls']]
+        default_location = data.get('zipcode') or data.get('location')
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No items provided"}), 400
+        if len(items) > app.config['BATCH_MAX_ITEMS']:
+            return jsonify({"error": f"Too many items (max {app.config['BATCH_MAX_ITEMS']})"}), 400
+        if not all(isinstance(item, dict) for item in items):
+            return jsonify({"error": "Each item must be an object"}), 400
+
+        print(f"DEBUG: Starting batch extraction for {len(items)} items")
+
+        return Response(
+            get_engine().batch(items, default_location=default_location),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache'}
+        )
+
+    @app.route('/jobs', methods=['POST'])
+    def create_job():
+        """Queue an extraction and return its job ID without waiting for it"""
+        data = request.get_json(silent=True) or {}
+        url = data.get('url')
+        location = data.get('zipcode')
+        if not url:
+            return jsonify({"error": "No URL provided"}), 400
+        if not location:
+            return jsonify({"error": "No location provided"}), 400
+
+        runner = jobs.get_runner()
+        runner.start(get_engine().start())
+        job, created = runner.store.create(url, location)
+        if created:
+            runner.wake()
+        return jsonify(jobs.job_links(job)), 202 if job['status'] not in jobs.TERMINAL else 200
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = jobs.get_runner().store.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(jobs.job_links(job)), 200
+
+    @app.route('/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        """SSE stream of a job's events; resumable with Last-Event-ID"""
+        runner = jobs.get_runner()
+        if runner.store.status(job_id) is None:
+            return jsonify({"error": "Job not found"}), 404
+        runner.start(get_engine().start())
+        last_event_id = jobs.parse_last_event_id(
+            request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+        return Response(
+            runner.subscribe_sse(job_id, last_event_id),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'Connection': 'keep-alive',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Cache-Control, Last-Event-ID'
+            }
+        )
+
+    @app.route('/thumb/<video_id>', methods=['GET'])
+    def thumbnail(video_id):
+        """Resized thumbnail from the local store (?w= width, ?format=webp|jpeg)"""
+        store = thumbnails.get_store()
+        fmt = thumbnails.negotiate_format(request.headers.get('Accept', ''), request.args.get('format'))
+        thumb = store.get(video_id, thumbnails.parse_width(request.args.get('w')), fmt)
+        if thumb is None:
+            return jsonify({"error": "Thumbnail not found"}), 404
+        headers = {
+            'ETag': thumb.etag,
+            'Cache-Control': f'public, max-age={store.max_age}',
+            'Vary': 'Accept',
+        }
+        if thumb.etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        return Response(thumb.data, mimetype=thumb.mimetype, headers=headers)
+
+    @app.route('/recipes/search', methods=['GET'])
+    def search_recipes():
+        """Full-text search over stored recipes: ?q=garlic noodles[&limit=&offset=]"""
+        query = (request.args.get('q') or '').strip()
+        if not query:
+            return jsonify({"error": "No query provided"}), 400
+        limit, offset = library.parse_page(request.args.get('limit'), request.args.get('offset'))
+        start = time.perf_counter()
+        results, more = library.get_library().search(query, limit, offset)
+        return jsonify(library.page(results, more, limit, offset, time.perf_counter() - start, query=query)), 200
+
+    @app.route('/recipes/by-ingredient', methods=['GET'])
+    def recipes_by_ingredient():
+        """Stored recipes using every ingredient given: ?i=garlic&i=butter or ?ingredients=garlic,butter"""
+        names = library.parse_ingredients(request.args.getlist('i') + request.args.getlist('ingredients'))
+        if not names:
+            return jsonify({"error": "No ingredients provided"}), 400
+        limit, offset = library.parse_page(request.args.get('limit'), request.args.get('offset'))
+        start = time.perf_counter()
+        results, more = library.get_library().by_ingredients(names, limit, offset)
+        return jsonify(library.page(results, more, limit, offset, time.perf_counter() - start,
+                                    ingredients=names)), 200
+
     @app.route('/health', methods=['GET'])
     def health_check():
         # Optional: a simple health check route for Render
-        return jsonify({"status": "ok"}), 200
+        return jsonify(health.report()), 200
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus scrape endpoint (per worker process)"""
+        return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
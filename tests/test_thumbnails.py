@@ -0,0 +1,82 @@
+import io
+
+import httpx
+import pytest
+
+import thumbnails
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.delenv("THUMB_HOSTS", raising=False)
+    return thumbnails.ThumbnailStore(str(tmp_path))
+
+
+def _serve(monkeypatch, handler):
+    """Route the store's httpx client through an in-memory handler"""
+    client = httpx.Client
+    monkeypatch.setattr(httpx, "Client", lambda **kwargs: client(transport=httpx.MockTransport(handler), **kwargs))
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("url", [
+    "https://p16-sign-va.tiktokcdn.com/obj/abc.jpeg?x-expires=1",
+    "https://scontent.cdninstagram.com/v/t51/abc.jpg",
+    "https://i.ytimg.com/vi/abc/hqdefault.jpg",
+])
+def test_cdn_urls_are_allowed(store, url):
+    assert store.allowed(url)
+
+
+@pytest.mark.parametrize("url", [
+    "http://p16-sign-va.tiktokcdn.com/obj/abc.jpeg",
+    "https://169.254.169.254/latest/meta-data/",
+    "https://localhost/thumb.jpg",
+    "https://tiktokcdn.com.attacker.example/thumb.jpg",
+    "https://eviltiktokcdn.com/thumb.jpg",
+    "https://i.ytimg.com:8443/vi/abc/hqdefault.jpg",
+    "file:///etc/passwd",
+])
+def test_other_urls_are_refused(store, url):
+    assert not store.allowed(url)
+    assert not store.ingest("tiktok-1", url)
+
+
+def test_redirects_are_checked_on_every_hop(store, monkeypatch):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.host)
+        return httpx.Response(302, headers={"location": "http://10.0.0.1/internal"})
+
+    _serve(monkeypatch, handler)
+    assert not store.ingest("tiktok-1", "https://p16.tiktokcdn.com/a.jpeg")
+    assert requested == ["p16.tiktokcdn.com"]
+
+
+def test_redirects_between_cdn_hosts_are_followed(store, monkeypatch):
+    image = _jpeg(200, 300)
+
+    def handler(request):
+        if request.url.host == "p16.tiktokcdn.com":
+            return httpx.Response(302, headers={"location": "https://p19.tiktokcdn-us.com/a.jpeg"})
+        return httpx.Response(200, content=image)
+
+    _serve(monkeypatch, handler)
+    assert store.ingest("tiktok-1", "https://p16.tiktokcdn.com/a.jpeg")
+    assert store.has("tiktok-1")
+
+
+def test_oversized_images_are_not_decoded(store, monkeypatch):
+    monkeypatch.setattr(thumbnails, "MAX_SOURCE_PIXELS", 100 * 100)
+    image = _jpeg(200, 200)
+    _serve(monkeypatch, lambda request: httpx.Response(200, content=image))
+    assert not store.ingest("tiktok-1", "https://p16.tiktokcdn.com/a.jpeg")
+    assert not store.has("tiktok-1")
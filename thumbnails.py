@@ -0,0 +1,334 @@
+"""
+AI TikTok Recipe Parser - Thumbnail Proxy
+Fetches each video's thumbnail once and serves resized copies from disk
+
+Features:
+- Thumbnail downloaded during extraction, while the CDN URL is still valid
+- A few widths in WebP and JPEG, made with Pillow
+- Content-addressed files (named by SHA-256), so identical images are stored once
+  and the digest doubles as a strong ETag
+- Fetched only over https from the CDNs of the supported sites, checked again
+  on every redirect: a page read by yt-dlp's generic extractor can name any
+  URL, including internal addresses
+- Size-bounded disk cache with least-recently-used eviction, indexed in SQLite
+  so every worker on the host shares it
+
+Configuration (environment):
+    THUMB_CACHE_DIR        directory for images and index (default: .cache/thumbs)
+    THUMB_CACHE_BYTES      disk budget (default: 256 MiB)
+    THUMB_WIDTHS           comma-separated widths to produce (default: 160,480,960)
+    THUMB_MAX_AGE          Cache-Control max-age in seconds (default: 30 days)
+    THUMB_FETCH_TIMEOUT    seconds to wait for the CDN (default: 10)
+    THUMB_HOSTS            comma-separated domains thumbnails may be fetched from
+                           (default: the TikTok, Instagram and YouTube image CDNs)
+    THUMB_WAIT             seconds a finished recipe waits for its thumbnail before
+                           answering with the CDN URL (default: 1)
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+# Largest source image accepted from the CDN, in bytes and in decoded pixels
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+MAX_SOURCE_PIXELS = 25_000_000
+
+# Image CDNs of the supported extractors (subdomains included)
+DEFAULT_HOSTS = ("tiktokcdn.com", "tiktokcdn-us.com", "tiktokcdn-eu.com", "ibyteimg.com", "byteimg.com",
+                 "cdninstagram.com", "fbcdn.net", "ytimg.com", "ggpht.com", "googleusercontent.com")
+
+MAX_REDIRECTS = 3
+
+# How stale accessed_at may get before a hit writes it again
+_TOUCH_INTERVAL = 60
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# The download overlaps the GPT call; past this the recipe goes out with the
+# CDN URL and the download finishes in the background
+WAIT_SECONDS = _env_float("THUMB_WAIT", 1.0)
+
+
+def thumb_id(extra_info: Dict[str, Any]) -> Optional[str]:
+    """URL-safe ID for a video's thumbnail, e.g. "tiktok-7312345678901234567\""""
+    video_id = extra_info.get("video_id")
+    if not video_id:
+        return None
+    return _UNSAFE.sub("_", f"{extra_info.get('extractor') or 'video'}-{video_id}")
+
+
+class Thumbnail(NamedTuple):
+    data: bytes
+    mimetype: str
+    etag: str
+
+
+class ThumbnailStore:
+    """Resized thumbnails on disk, looked up by (video, width, format)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.max_bytes = _env_int("THUMB_CACHE_BYTES", 256 * 1024 * 1024)
+        self.max_age = _env_int("THUMB_MAX_AGE", 30 * 24 * 3600)
+        self.timeout = float(_env_int("THUMB_FETCH_TIMEOUT", 10))
+        self.hosts = tuple(host.strip().lower() for host in
+                           os.environ.get("THUMB_HOSTS", ",".join(DEFAULT_HOSTS)).split(",") if host.strip())
+        self.widths = sorted({int(w) for w in os.environ.get("THUMB_WIDTHS", "160,480,960").split(",") if w.strip()})
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS thumbs (
+                id TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                format TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (id, width, format)
+            );
+            CREATE INDEX IF NOT EXISTS thumbs_accessed ON thumbs (accessed_at);
+            CREATE INDEX IF NOT EXISTS thumbs_digest ON thumbs (digest);
+        """)
+        self.fetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Per thread and per process, as in cache.SQLiteCache
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _path(self, digest: str, fmt: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{fmt}")
+
+    def allowed(self, url: str) -> bool:
+        """Whether a thumbnail (or redirect) URL is https on one of the allowed CDN hosts"""
+        parts = urlsplit(url)
+        host = (parts.hostname or "").rstrip(".")
+        try:
+            port = parts.port
+        except ValueError:
+            return False
+        return parts.scheme == "https" and port in (None, 443) and \
+            any(host == allowed or host.endswith(f".{allowed}") for allowed in self.hosts)
+
+    def has(self, video: str) -> bool:
+        return self._connect().execute("SELECT 1 FROM thumbs WHERE id = ? LIMIT 1", (video,)).fetchone() is not None
+
+    def ingest(self, video: str, source_url: str) -> bool:
+        """Fetch a thumbnail and store every size; blocking, so run it in an executor
+
+        Never raises: a thumbnail is optional, and the recipe it belongs to has
+        usually been paid for by the time this fails.
+        """
+        try:
+            return self._ingest(video, source_url)
+        except Exception as e:
+            print(f"⚠️ Could not store thumbnail for {video}: {e}", file=sys.stderr)
+            return False
+
+    def _ingest(self, video: str, source_url: str) -> bool:
+        if self.has(video):
+            return True
+        if not self.allowed(source_url):
+            print(f"⚠️ Not fetching thumbnail for {video} from {urlsplit(source_url).hostname}", file=sys.stderr)
+            return False
+        try:
+            source = self._download(source_url)
+            self.fetches += 1
+            variants = self._resize(source)
+        except Exception as e:
+            print(f"⚠️ Thumbnail fetch failed for {video}: {e}", file=sys.stderr)
+            return False
+
+        conn = self._connect()
+        now = time.time()
+        for (width, fmt), data in variants.items():
+            digest = hashlib.sha256(data).hexdigest()
+            path = self._path(digest, fmt)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename, so readers never see half a file
+                partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(partial, "wb") as f:
+                    f.write(data)
+                os.replace(partial, path)
+            conn.execute("INSERT OR REPLACE INTO thumbs (id, width, format, digest, size, accessed_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (video, width, fmt, digest, len(data), now))
+        self._evict(conn)
+        return True
+
+    def _download(self, url: str) -> bytes:
+        import httpx
+
+        with httpx.Client(timeout=self.timeout, follow_redirects=False) as client:
+            # Redirects are followed by hand so every hop is checked against the allowed hosts
+            for _ in range(MAX_REDIRECTS + 1):
+                if not self.allowed(url):
+                    raise ValueError(f"redirected to {urlsplit(url).hostname}, which is not an allowed host")
+                with client.stream("GET", url) as response:
+                    if response.is_redirect:
+                        url = str(response.url.join(response.headers["location"]))
+                        continue
+                    response.raise_for_status()
+                    chunks, total = [], 0
+                    for chunk in response.iter_bytes():
+                        total += len(chunk)
+                        if total > MAX_SOURCE_BYTES:
+                            raise ValueError("thumbnail larger than 10 MiB")
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+        raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+    def _resize(self, source: bytes) -> Dict[tuple, bytes]:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(source)) as image:
+            # From the header, before decoding: a small file can decode to gigabytes,
+            # and app.py silences Pillow's DecompressionBombWarning with the rest
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise ValueError(f"thumbnail is {image.width}x{image.height} pixels")
+            image.load()
+            image = image.convert("RGB")
+        # Never upscale: widths past the original collapse to the original
+        widths = sorted({min(width, image.width) for width in self.widths})
+        variants = {}
+        for width in widths:
+            height = max(round(image.height * width / image.width), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in FORMATS:
+                buffer = io.BytesIO()
+                if fmt == "webp":
+                    resized.save(buffer, "WEBP", quality=80, method=4)
+                else:
+                    resized.save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+                variants[(width, fmt)] = buffer.getvalue()
+        return variants
+
+    def get(self, video: str, width: Optional[int] = None, fmt: str = "webp") -> Optional[Thumbnail]:
+        """The smallest stored size at least `width` wide (the largest if none is)"""
+        conn = self._connect()
+        rows = conn.execute("SELECT width, digest, accessed_at FROM thumbs WHERE id = ? AND format = ? "
+                            "ORDER BY width", (video, fmt)).fetchall()
+        if not rows:
+            self.misses += 1
+            return None
+        chosen = rows[-1]
+        if width:
+            chosen = next((row for row in rows if row[0] >= width), rows[-1])
+        stored_width, digest, accessed_at = chosen
+        try:
+            with open(self._path(digest, fmt), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Evicted by another worker between the lookup and the read
+            conn.execute("DELETE FROM thumbs WHERE digest = ?", (digest,))
+            self.misses += 1
+            return None
+        now = time.time()
+        if now - accessed_at > _TOUCH_INTERVAL:
+            conn.execute("UPDATE thumbs SET accessed_at = ? WHERE id = ?", (now, video))
+        self.hits += 1
+        return Thumbnail(data, FORMATS[fmt], f'"{digest}"')
+
+    def _evict(self, conn: sqlite3.Connection):
+        # Bytes on disk count each digest once, however many videos share it
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                             "(SELECT DISTINCT digest, format, size FROM thumbs)").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Whole videos go at once, least recently used first
+        for (video,) in conn.execute("SELECT id FROM thumbs GROUP BY id ORDER BY MAX(accessed_at)").fetchall():
+            if total <= self.max_bytes:
+                break
+            rows = conn.execute("SELECT digest, format, size FROM thumbs WHERE id = ?", (video,)).fetchall()
+            conn.execute("DELETE FROM thumbs WHERE id = ?", (video,))
+            for digest, fmt, size in rows:
+                if conn.execute("SELECT 1 FROM thumbs WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                    try:
+                        os.remove(self._path(digest, fmt))
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+            self.evictions += 1
+
+    def urls(self, video: str) -> Dict[str, str]:
+        """image_proxy_url and a srcset of the widths actually stored for the recipe response"""
+        widths: List[int] = [row[0] for row in self._connect().execute(
+            "SELECT width FROM thumbs WHERE id = ? AND format = 'webp' ORDER BY width", (video,))]
+        base = f"/thumb/{video}"
+        if not widths:
+            return {"image_proxy_url": base}
+        return {
+            "image_proxy_url": f"{base}?w={widths[len(widths) // 2]}",
+            "image_srcset": ", ".join(f"{base}?w={width} {width}w" for width in widths),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(DISTINCT id) FROM thumbs").fetchone()[0]
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                             "(SELECT DISTINCT digest, format, size FROM thumbs)").fetchone()[0]
+        return {"videos": count, "bytes": total, "max_bytes": self.max_bytes, "fetches": self.fetches,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def negotiate_format(accept: str, requested: Optional[str] = None) -> str:
+    """?format= wins; otherwise WebP for clients that accept it, else JPEG"""
+    if requested in FORMATS:
+        return requested
+    if requested == "jpg":
+        return "jpeg"
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+def parse_width(value: Optional[str]) -> Optional[int]:
+    try:
+        return max(int(value), 1) if value else None
+    except ValueError:
+        return None
+
+
+_store: Optional[ThumbnailStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ThumbnailStore:
+    """Return the process-wide thumbnail store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ThumbnailStore(os.environ.get("THUMB_CACHE_DIR", os.path.join(".cache", "thumbs")))
+    return _store
@@ -0,0 +1,220 @@
+"""
+AI TikTok Recipe Parser - Audio Transcription Fallback
+Turns a video's narration into text when its caption is empty
+
+Features:
+- Audio-only download through yt-dlp, written straight to a temp directory
+- Long clips fetched in fixed-length sections; each section is handed to a
+  transcription worker as soon as it lands, so download and transcription overlap
+- Process pool whose workers load the Whisper model once and keep it resident
+- Optional: needs openai-whisper and ffmpeg, and is skipped without them
+  (caching by video ID lives with the other caches in app.py)
+
+Configuration (environment):
+    TRANSCRIBE_FALLBACK      set to 0 to disable the fallback
+    WHISPER_MODEL            Whisper model name (default: base)
+    WHISPER_DEVICE           cpu | cuda (default: cuda when available)
+    WHISPER_LANGUAGE         force a language code instead of detecting it
+    WHISPER_WORKERS          transcription processes per server process (default: 1)
+    WHISPER_CHUNK_SECONDS    audio section length (default: 30)
+    WHISPER_MAX_DURATION     longest video transcribed, in seconds (default: 600)
+    WHISPER_PREWARM          set to 0 to load the model on first use instead of at startup
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import importlib.util
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def available() -> bool:
+    """Whether the fallback can run: enabled, whisper importable and ffmpeg on PATH"""
+    if os.environ.get("TRANSCRIBE_FALLBACK", "1") == "0":
+        return False
+    # find_spec only looks for the package; importing whisper pulls in torch
+    return importlib.util.find_spec("whisper") is not None and shutil.which("ffmpeg") is not None
+
+
+# -- worker process side ---------------------------------------------------
+
+_model = None
+_fp16 = False
+
+
+def _load_model(name: str, device: Optional[str]):
+    """Pool initializer: load the model once per worker process"""
+    global _model, _fp16
+    import torch
+    import whisper
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    start = time.perf_counter()
+    _model = whisper.load_model(name, device=device)
+    _fp16 = device == "cuda"
+    print(f"🎙️ Whisper {name} loaded on {device} in {time.perf_counter() - start:.1f}s (pid {os.getpid()})",
+          file=sys.stderr)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _transcribe_file(path: str, language: Optional[str]) -> str:
+    result = _model.transcribe(path, language=language, fp16=_fp16, condition_on_previous_text=False)
+    return (result.get("text") or "").strip()
+
+
+# -- server process side ---------------------------------------------------
+
+class Transcriber:
+    """Downloads audio and fans its sections out to a warm Whisper process pool"""
+
+    def __init__(self):
+        self.model = os.environ.get("WHISPER_MODEL", "base")
+        self.device = os.environ.get("WHISPER_DEVICE") or None
+        self.language = os.environ.get("WHISPER_LANGUAGE") or None
+        self.workers = int(_env_float("WHISPER_WORKERS", 1))
+        self.chunk_seconds = _env_float("WHISPER_CHUNK_SECONDS", 30)
+        self.max_duration = _env_float("WHISPER_MAX_DURATION", 600)
+
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.transcriptions = 0
+        self.chunks = 0
+        self.audio_seconds = 0.0
+
+    @property
+    def pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """The worker pool, rebuilt after fork or after a worker crashed"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # spawn, not fork: the server process has threads, and torch
+                # must not inherit their locks
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_load_model,
+                    initargs=(self.model, self.device),
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self) -> List[concurrent.futures.Future]:
+        """Start the workers now so the model is resident before the first request"""
+        return [self.pool.submit(_ready) for _ in range(self.workers)]
+
+    def sections(self, duration: float) -> List[Tuple[float, float]]:
+        """(start, end) seconds of each section to download; one piece when the length is unknown"""
+        if not duration or duration <= self.chunk_seconds * 1.5:
+            return []
+        starts = range(0, int(duration + 0.999), int(self.chunk_seconds))
+        return [(float(start), min(float(start + self.chunk_seconds), float(duration))) for start in starts]
+
+    async def transcribe(self, url: str, duration: float = 0) -> str:
+        """Download a video's audio and return its transcript"""
+        if duration and duration > self.max_duration:
+            raise ValueError(f"Video is too long to transcribe ({duration:.0f}s > {self.max_duration:.0f}s)")
+
+        loop = asyncio.get_running_loop()
+        workdir = tempfile.mkdtemp(prefix="recipe-audio-")
+        pieces: Dict[str, Tuple[float, concurrent.futures.Future]] = {}
+        pool = self.pool
+
+        def on_progress(status: Dict[str, Any]):
+            # Runs in the download thread as each section file is complete
+            path = status.get("filename")
+            if status.get("status") != "finished" or not path or path in pieces:
+                return
+            start = (status.get("info_dict") or {}).get("section_start") or 0.0
+            pieces[path] = (start, pool.submit(_transcribe_file, path, self.language))
+
+        sections = self.sections(duration)
+        options = {
+            'quiet': True,
+            'no_warnings': True,
+            'format': 'bestaudio/worstaudio/worst',
+            'outtmpl': os.path.join(workdir, '%(id)s.%(section_start|0)s.%(ext)s'),
+            'progress_hooks': [on_progress],
+            'noplaylist': True,
+        }
+        if sections:
+            # Each range is cut by ffmpeg into its own file, in order
+            options['download_ranges'] = lambda info, ydl: [
+                {"start_time": start, "end_time": end} for start, end in sections]
+
+        def download():
+            import yt_dlp
+            with yt_dlp.YoutubeDL(options) as ydl:
+                ydl.download([url])
+
+        try:
+            await loop.run_in_executor(None, download)
+            if not pieces:
+                raise ValueError("Audio download produced no file")
+            ordered = [future for _, future in sorted(pieces.values(), key=lambda piece: piece[0])]
+            texts = await asyncio.gather(*(asyncio.wrap_future(future) for future in ordered))
+        except BrokenProcessPool:
+            # A worker died (usually out of memory); start clean next time
+            self._reset_pool()
+            raise ValueError("Transcription worker crashed")
+        finally:
+            for _, future in pieces.values():
+                future.cancel()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        self.transcriptions += 1
+        self.chunks += len(ordered)
+        self.audio_seconds += duration or 0
+        return " ".join(text for text in texts if text).strip()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "workers": self.workers,
+            "pool_started": self._pool is not None and self._pid == os.getpid(),
+            "transcriptions": self.transcriptions,
+            "chunks": self.chunks,
+            "audio_seconds": round(self.audio_seconds, 1),
+        }
+
+
+_transcriber: Optional[Transcriber] = None
+_transcriber_lock = threading.Lock()
+
+
+def get_transcriber() -> Transcriber:
+    """Return the process-wide transcriber"""
+    global _transcriber
+    if _transcriber is None:
+        with _transcriber_lock:
+            if _transcriber is None:
+                _transcriber = Transcriber()
+    return _transcriber
+
+
+def prewarm():
+    """Load the model in the background at server start, when the fallback is usable"""
+    if available() and os.environ.get("WHISPER_PREWARM", "1") != "0":
+        get_transcriber().warm()
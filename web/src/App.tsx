@@ -38,6 +38,8 @@ interface Recipe {
   ingredients?: Ingredient[];
   instructions?: string[];
   image_url?: string;
+  image_proxy_url?: string;
+  image_srcset?: string;
   notes?: string;
   total_cost_estimate?: string;
   total_macros?: TotalMacros;
@@ -50,10 +52,16 @@ interface Recipe {
 }
 
 interface ProgressUpdate {
-  type: 'progress' | 'result' | 'error';
+  type: 'progress' | 'result' | 'error' | 'title' | 'ingredient' | 'instruction';
   message?: string;
   recipe?: Recipe;
   data?: any;
+
+  // Partial recipe pieces streamed while the AI is still generating
+  title?: string;
+  index?: number;
+  ingredient?: Ingredient;
+  instruction?: string;
 }
 
 interface StreamingStep {
@@ -256,6 +264,7 @@ function App() {
       const decoder = new TextDecoder();
 
       const readStream = async () => {
+        let buffer = '';
         try {
           while (true) {
             const { done, value } = await reader.read();
@@ -265,8 +274,10 @@ function App() {
               break;
             }
 
-            const chunk = decoder.decode(value);
-            const lines = chunk.split('\n');
+            // Events can be split across reads; keep the trailing partial line
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() || '';
 
             lines.forEach(line => {
               if (line.startsWith('data: ')) {
@@ -278,6 +289,22 @@ function App() {
                     setProgress(prev => [...prev, message]);
                     updateStepFromMessage(message);
                     updateTimeEstimate();
+                  } else if (data.type === 'title') {
+                    setRecipe(prev => ({ ...(prev || {}), title: data.title }));
+                  } else if (data.type === 'ingredient' && data.ingredient) {
+                    const ingredient = data.ingredient;
+                    setRecipe(prev => {
+                      const ingredients = [...(prev?.ingredients || [])];
+                      ingredients[data.index ?? ingredients.length] = ingredient;
+                      return { ...(prev || {}), ingredients };
+                    });
+                  } else if (data.type === 'instruction' && data.instruction) {
+                    const instruction = data.instruction;
+                    setRecipe(prev => {
+                      const instructions = [...(prev?.instructions || [])];
+                      instructions[data.index ?? instructions.length] = instruction;
+                      return { ...(prev || {}), instructions };
+                    });
                   } else if (data.type === 'result') {
                     setRecipe(data.recipe || null);
                     setEstimatedTimeRemaining(0);
@@ -687,10 +714,12 @@ function App() {
         {recipe && (
           <div className="bg-white rounded-2xl shadow-xl overflow-hidden animate-in slide-in-from-bottom-4 duration-500">
             {/* Recipe Image with improved styling */}
-            {recipe.image_url && !imageError && (
+            {(recipe.image_proxy_url || recipe.image_url) && !imageError && (
               <div className="relative w-full h-80 bg-gradient-to-br from-purple-50 to-pink-50 flex items-center justify-center">
                 <img
-                  src={recipe.image_url}
+                  src={recipe.image_proxy_url ?? recipe.image_url}
+                  srcSet={recipe.image_proxy_url ? recipe.image_srcset : undefined}
+                  sizes="(max-width: 640px) 90vw, 480px"
                   alt="Recipe"
                   className="max-w-full max-h-full object-contain rounded-lg shadow-lg"
                   onError={() => setImageError(true)}
@@ -12,6 +12,10 @@ export default defineConfig({
       '/extract': {
         target: 'http://127.0.0.1:3000',  // use 127.0.0.1 or localhost
         changeOrigin: true
+      },
+      '/thumb': {
+        target: 'http://127.0.0.1:3000',
+        changeOrigin: true
       }
     }
   }